@@ -0,0 +1,134 @@
+"""Consultas e agregações do dashboard de análises.
+
+Os fatos de vendas são lidos uma única vez das tabelas de rollup (por oferta
+e por dia) e todos os indicadores da página são derivados deles com operações
+vetorizadas de pandas/NumPy, sem uma consulta por categoria ou por KPI.
+"""
+import math
+from typing import Dict, Any, Optional
+
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+
+from database import Database
+
+# Mínimo de ofertas para uma categoria entrar na ANOVA
+MIN_OFERTAS_POR_CATEGORIA = 3
+
+
+def carregar_fatos(db: Database) -> Dict[str, Any]:
+    """Lê os fatos de vendas por oferta, a série diária e os totais gerais.
+
+    Tudo vem das tabelas de rollup e de KPIs: o custo depende do número de
+    ofertas, dias e estabelecimentos, não do total de pedidos. Só leitura:
+    quem chama drena a fila antes (``db.atualizar_rollups()``).
+    """
+    conn = db.get_connection()
+
+    # Um registro por oferta com os totais acumulados das suas vendas
+    ofertas = pd.read_sql('''
+        SELECT
+            o.id,
+            o.titulo,
+            o.categoria,
+            o.preco_venda,
+            o.preco_original,
+            o.estoque_inicial,
+            COALESCE(v.pedidos, 0) AS retirados,
+            COALESCE(v.vendidos, 0) AS vendidos,
+            COALESCE(v.vendidos_quadrados, 0) AS vendidos_quadrados,
+            COALESCE(v.receita, 0) AS receita,
+            COALESCE(v.receita_quadrados, 0) AS receita_quadrados,
+            v.ticket_min,
+            v.ticket_max
+        FROM ofertas o
+        LEFT JOIN vendas_acumuladas_oferta v ON v.oferta_id = o.id
+        ORDER BY o.id
+    ''', conn)
+
+    tempo = pd.read_sql('''
+        SELECT dia as data, SUM(vendidos) as vendidos
+        FROM vendas_diarias_categoria
+        GROUP BY dia
+        HAVING SUM(pedidos) > 0
+        ORDER BY dia
+    ''', conn)
+
+    total_pedidos = conn.execute('SELECT COALESCE(SUM(total_pedidos), 0) FROM kpis_estabelecimento').fetchone()[0]
+    consumidores = conn.execute("SELECT COUNT(*) FROM usuarios WHERE tipo = 'consumidor'").fetchone()[0]
+    conn.close()
+
+    return {'ofertas': ofertas, 'tempo': tempo, 'total_pedidos': total_pedidos, 'consumidores': consumidores}
+
+
+def _anova_por_somas(n: pd.Series, soma: pd.Series, soma_quadrados: pd.Series) -> Optional[Dict[str, float]]:
+    """ANOVA de um fator a partir de contagem, soma e soma dos quadrados de cada grupo"""
+    k, total = len(n), float(n.sum())
+    if k < 2 or total <= k:
+        return None
+    entre_grupos = (soma ** 2 / n).sum() - soma.sum() ** 2 / total
+    dentro_grupos = (soma_quadrados - soma ** 2 / n).sum()
+    with np.errstate(all='ignore'):
+        f_valor = (entre_grupos / (k - 1)) / (dentro_grupos / (total - k))
+        p_valor = stats.f.sf(f_valor, k - 1, total - k)
+    if not (np.isfinite(f_valor) and np.isfinite(p_valor)):
+        return None
+    return {'f': float(f_valor), 'p': float(p_valor)}
+
+
+def calcular_pacote(fatos: Dict[str, Any]) -> Dict[str, Any]:
+    """Deriva KPIs, ticket médio, correlação e ANOVA a partir dos fatos"""
+    ofertas: pd.DataFrame = fatos['ofertas']
+
+    kpis = {
+        'total_ofertas': int(len(ofertas)),
+        'total_pedidos': int(fatos['total_pedidos']),
+        'total_retirados': int(ofertas['retirados'].sum()),
+        'total_consumidores': int(fatos['consumidores']),
+    }
+
+    # Ticket: média e desvio padrão amostral a partir de somas (sem ler cada pedido)
+    n = kpis['total_retirados']
+    ticket = None
+    if n > 0:
+        soma = float(ofertas['receita'].sum())
+        soma_quadrados = float(ofertas['receita_quadrados'].sum())
+        media = soma / n
+        variancia = (soma_quadrados - n * media ** 2) / (n - 1) if n > 1 else float('nan')
+        ticket = {
+            'medio': media,
+            'min': float(ofertas['ticket_min'].min()),
+            'max': float(ofertas['ticket_max'].max()),
+            'std': math.sqrt(max(variancia, 0.0)) if n > 1 else float('nan'),
+        }
+
+    desempenho = ofertas[['id', 'titulo', 'categoria', 'preco_venda', 'preco_original',
+                          'estoque_inicial', 'vendidos']]
+
+    correlacao = None
+    if len(ofertas) > 2 and ofertas['vendidos'].std() > 0:
+        correlacao = float(ofertas['preco_venda'].corr(ofertas['vendidos']))
+
+    # ANOVA: quantidade por pedido retirado entre categorias (categorias com 3+ ofertas).
+    # Oferta sem retirada conta como uma observação 0; as somas dos rollups bastam.
+    tamanhos = ofertas.groupby('categoria')['id'].transform('size')
+    elegiveis = ofertas[tamanhos >= MIN_OFERTAS_POR_CATEGORIA]
+    grupos = elegiveis.assign(n=elegiveis['retirados'].clip(lower=1)).groupby('categoria')[
+        ['n', 'vendidos', 'vendidos_quadrados']].sum().astype(float)
+    anova = _anova_por_somas(grupos['n'], grupos['vendidos'], grupos['vendidos_quadrados'])
+
+    return {
+        'kpis': kpis,
+        'ticket': ticket,
+        'desempenho': desempenho,
+        'correlacao': correlacao,
+        'categorias_anova': list(grupos.index),
+        'anova': anova,
+        'tempo': fatos['tempo'],
+    }
+
+
+def carregar_pacote(db: Database) -> Dict[str, Any]:
+    """Lê os fatos e calcula o pacote completo do dashboard"""
+    return calcular_pacote(carregar_fatos(db))
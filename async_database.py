@@ -0,0 +1,223 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple, Callable, TypeVar, AsyncIterator
+
+from database import Database
+
+T = TypeVar('T')
+
+
+class AsyncDatabase:
+    """Fachada asyncio para ``Database``.
+
+    Leituras rodam em um pool limitado de threads leitoras e por isso seguem
+    em paralelo; escritas vão para uma única thread escritora, que as executa
+    em série. O pool de conexões é dimensionado para uma conexão por thread
+    leitora, uma para a escritora e uma por exportação aberta: ninguém espera
+    conexão, e a afinidade por thread do pool faz cada thread reutilizar a
+    mesma (não há conexão reservada; só com ``db`` informado o tamanho do
+    pool fica por conta de quem o criou).
+
+    ``max_concorrencia`` limita quantas chamadas podem estar em execução ao
+    mesmo tempo: a vaga só é devolvida quando a função termina na thread,
+    mesmo que a corrotina tenha sido cancelada antes. ``max_exportacoes``
+    limita as exportações abertas, que seguram uma conexão enquanto o
+    iterador existir.
+
+    Cancelar uma corrotina de escrita não interrompe a transação: ela já foi
+    entregue à thread escritora e termina (commit ou rollback) por inteiro;
+    quem cancelou apenas deixa de esperar o resultado.
+    """
+
+    def __init__(self, db_name: str = 'pega_ai.db', leitores: int = 4, max_concorrencia: int = 64,
+                 db: Optional[Database] = None, max_exportacoes: int = 2):
+        # Uma conexão por thread leitora, uma para a escritora e uma por exportação
+        self.db = db if db is not None else Database(db_name, tamanho_pool=leitores + 1 + max_exportacoes)
+        self._leitores = ThreadPoolExecutor(max_workers=leitores, thread_name_prefix='pega-ai-leitor')
+        self._escritor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pega-ai-escritor')
+        self._limite = asyncio.Semaphore(max_concorrencia)
+        self._exportacoes = asyncio.Semaphore(max_exportacoes)
+
+    async def _executar(self, executor: ThreadPoolExecutor, funcao: Callable[..., T], *args: Any,
+                        **kwargs: Any) -> T:
+        """Roda a função no executor; a vaga de ``_limite`` volta só quando ela termina"""
+        await self._limite.acquire()
+        try:
+            futuro = asyncio.get_running_loop().run_in_executor(executor, functools.partial(funcao, *args, **kwargs))
+        except BaseException:
+            self._limite.release()
+            raise
+        futuro.add_done_callback(lambda _: self._limite.release())
+        # shield: cancelar a corrotina não marca o futuro como pronto antes da hora
+        return await asyncio.shield(futuro)
+
+    async def _ler(self, funcao: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Executa uma leitura em uma thread leitora"""
+        return await self._executar(self._leitores, funcao, *args, **kwargs)
+
+    async def _escrever(self, funcao: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Executa uma escrita na thread escritora, protegida contra cancelamento"""
+        return await self._executar(self._escritor, funcao, *args, **kwargs)
+
+    async def close(self) -> None:
+        """Aguarda as operações pendentes e fecha executores e conexões"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._escritor.shutdown)
+        await loop.run_in_executor(None, self._leitores.shutdown)
+        self.db.close()
+
+    async def __aenter__(self) -> 'AsyncDatabase':
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    # ---------- Usuários ----------
+    async def criar_usuario(self, nome: str, email: str, senha: str, tipo: str,
+                            telefone: Optional[str] = None) -> Optional[int]:
+        return await self._escrever(self.db.criar_usuario, nome, email, senha, tipo, telefone)
+
+    async def autenticar_usuario(self, email: str, senha: str) -> Optional[Dict[str, Any]]:
+        # A conferência (KDF) roda nos leitores; só o rehash vai para a thread escritora
+        user, refazer = await self._ler(self.db._conferir_credenciais, email, senha)
+        if refazer:
+            await self._escrever(self.db._executar_escrita, refazer, versionar=False, metodo='autenticar_usuario')
+        return user
+
+    async def criar_sessao(self, usuario_id: int) -> str:
+        return await self._escrever(self.db.criar_sessao, usuario_id)
+
+    async def validar_sessao(self, token: str) -> Optional[Dict[str, Any]]:
+        return await self._ler(self.db.validar_sessao, token)
+
+    async def encerrar_sessao(self, token: str) -> None:
+        return await self._escrever(self.db.encerrar_sessao, token)
+
+    # ---------- Estabelecimentos ----------
+    async def criar_estabelecimento(self, usuario_id: int, nome_fantasia: str, cnpj: str, endereco: str,
+                                    latitude: float, longitude: float) -> Optional[int]:
+        return await self._escrever(self.db.criar_estabelecimento, usuario_id, nome_fantasia, cnpj,
+                                    endereco, latitude, longitude)
+
+    async def get_estabelecimento_id(self, usuario_id: int) -> Optional[int]:
+        return await self._ler(self.db.get_estabelecimento_id, usuario_id)
+
+    # ---------- Ofertas ----------
+    async def criar_oferta(self, estabelecimento_id: int, titulo: str, descricao: str, categoria: str,
+                           preco_original: float, preco_venda: float, estoque: int,
+                           horario_inicio: str, horario_fim: str) -> int:
+        return await self._escrever(self.db.criar_oferta, estabelecimento_id, titulo, descricao, categoria,
+                                    preco_original, preco_venda, estoque, horario_inicio, horario_fim)
+
+    async def listar_ofertas_ativas(self, formato: str = 'dict') -> Any:
+        return await self._ler(self.db.listar_ofertas_ativas, formato)
+
+    async def buscar_ofertas(self, categoria: Optional[str] = None, preco_max: Optional[float] = None,
+                             ordenacao: str = 'recentes', cursor: Optional[Tuple[Any, int]] = None,
+                             limite: int = 20) -> Dict[str, Any]:
+        return await self._ler(self.db.buscar_ofertas, categoria, preco_max, ordenacao, cursor, limite)
+
+    async def listar_ofertas_proximas(self, lat: float, lon: float, raio_km: float,
+                                      categoria: Optional[str] = None, preco_max: Optional[float] = None,
+                                      limite: Optional[int] = None) -> List[Dict[str, Any]]:
+        return await self._ler(self.db.listar_ofertas_proximas, lat, lon, raio_km, categoria, preco_max, limite)
+
+    async def pesquisar_ofertas(self, termo: str, categoria: Optional[str] = None,
+                                preco_max: Optional[float] = None, limite: int = 20) -> List[Dict[str, Any]]:
+        return await self._ler(self.db.pesquisar_ofertas, termo, categoria, preco_max, limite)
+
+    # ---------- Pedidos ----------
+    async def criar_pedido(self, consumidor_id: int, oferta_id: int, quantidade: int = 1) -> Optional[Dict[str, Any]]:
+        return await self._escrever(self.db.criar_pedido, consumidor_id, oferta_id, quantidade)
+
+    async def criar_pedidos_lote(self, consumidor_id: int, itens: List[Tuple[int, int]],
+                                 metodo: str = 'pix') -> Dict[str, Any]:
+        return await self._escrever(self.db.criar_pedidos_lote, consumidor_id, itens, metodo)
+
+    async def validar_retirada(self, codigo_retirada: str, estabelecimento_id: Optional[int]) -> Dict[str, Any]:
+        return await self._escrever(self.db.validar_retirada, codigo_retirada, estabelecimento_id)
+
+    async def validar_retiradas_lote(self, codigos: List[str],
+                                     estabelecimento_id: Optional[int]) -> List[Dict[str, Any]]:
+        return await self._escrever(self.db.validar_retiradas_lote, codigos, estabelecimento_id)
+
+    async def cancelar_pedido(self, pedido_id: int, motivo: str = 'Cancelado pelo estabelecimento') -> Dict[str, Any]:
+        return await self._escrever(self.db.cancelar_pedido, pedido_id, motivo)
+
+    async def expirar_reservas(self, tolerancia_minutos: int = 30, tamanho_lote: int = 500) -> Dict[str, Any]:
+        return await self._escrever(self.db.expirar_reservas, tolerancia_minutos, tamanho_lote)
+
+    async def listar_pedidos_consumidor(self, consumidor_id: int, status: Optional[List[str]] = None,
+                                        inicio: Optional[str] = None, fim: Optional[str] = None,
+                                        cursor: Optional[Tuple[str, int]] = None,
+                                        limite: Optional[int] = None, formato: str = 'dict') -> Any:
+        return await self._ler(self.db.listar_pedidos_consumidor, consumidor_id, status, inicio, fim, cursor,
+                               limite, formato)
+
+    async def listar_pedidos_estabelecimento(self, estabelecimento_id: int, status: Optional[List[str]] = None,
+                                             inicio: Optional[str] = None, fim: Optional[str] = None,
+                                             cursor: Optional[Tuple[str, int]] = None,
+                                             limite: Optional[int] = None, formato: str = 'dict') -> Any:
+        return await self._ler(self.db.listar_pedidos_estabelecimento, estabelecimento_id, status, inicio, fim,
+                               cursor, limite, formato)
+
+    async def ultimo_evento_pedido(self, estabelecimento_id: Optional[int] = None) -> int:
+        return await self._ler(self.db.ultimo_evento_pedido, estabelecimento_id)
+
+    async def listar_eventos_pedido(self, estabelecimento_id: Optional[int] = None, apos_id: int = 0,
+                                    limite: int = 500) -> List[Dict[str, Any]]:
+        return await self._ler(self.db.listar_eventos_pedido, estabelecimento_id, apos_id, limite)
+
+    async def podar_eventos_pedido(self, dias: int = 7) -> int:
+        return await self._escrever(self.db.podar_eventos_pedido, dias)
+
+    async def exportar_pedidos_estabelecimento(self, estabelecimento_id: int, formato: str = 'csv',
+                                               inicio: Optional[str] = None, fim: Optional[str] = None,
+                                               status: Optional[List[str]] = None,
+                                               tamanho_bloco: int = 1000) -> AsyncIterator[str]:
+        """Retorna um iterador assíncrono dos blocos (cada bloco é lido em uma thread leitora).
+
+        A conexão fica presa enquanto o iterador estiver aberto; acima de
+        ``max_exportacoes`` simultâneas, as próximas aguardam a vez.
+        """
+        blocos = self.db.exportar_pedidos_estabelecimento(estabelecimento_id, formato, inicio, fim, status,
+                                                          tamanho_bloco)
+
+        async def iterar() -> AsyncIterator[str]:
+            async with self._exportacoes:
+                try:
+                    while True:
+                        bloco = await self._ler(next, blocos, None)
+                        if bloco is None:
+                            break
+                        yield bloco
+                finally:
+                    await self._ler(blocos.close)
+
+        return iterar()
+
+    async def obter_kpis_estabelecimento(self, estabelecimento_id: int) -> Dict[str, Any]:
+        return await self._ler(self.db.obter_kpis_estabelecimento, estabelecimento_id)
+
+    async def reconstruir_kpis(self) -> int:
+        return await self._escrever(self.db.reconstruir_kpis)
+
+    async def atualizar_rollups(self) -> int:
+        return await self._escrever(self.db.atualizar_rollups)
+
+    async def reconstruir_rollups(self) -> int:
+        return await self._escrever(self.db.reconstruir_rollups)
+
+    # ---------- Cache e diagnóstico ----------
+    async def obter_versao_dados(self) -> int:
+        return await self._ler(self.db.obter_versao_dados)
+
+    async def invalidar_cache(self) -> None:
+        return await self._escrever(self.db.invalidar_cache)
+
+    async def estatisticas_pool(self) -> Dict[str, int]:
+        return self.db.estatisticas_pool()
+
+    async def estatisticas_cache(self) -> Dict[str, int]:
+        return self.db.estatisticas_cache()
@@ -0,0 +1 @@
+"""Benchmarks de desempenho do Pega Aí (executar com ``python -m benchmarks.<nome>``)"""
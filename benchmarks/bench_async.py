@@ -0,0 +1,86 @@
+"""Benchmark da fachada AsyncDatabase (100 corrotinas concorrentes) vs API síncrona.
+
+Uso: python -m benchmarks.bench_async [--corrotinas 100] [--requisicoes 20] [--leitores 4]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from async_database import AsyncDatabase
+from database import Database
+
+CATEGORIAS = ['Padaria', 'Restaurante', 'Hortifrúti', 'Confeitaria', 'Mercado', 'Pizzaria']
+
+
+def preparar(db: Database, total_ofertas: int = 2000) -> tuple:
+    """Cria consumidores, 20 estabelecimentos e ofertas com bastante estoque"""
+    rng = random.Random(1)
+    consumidores = [db.criar_usuario(f"C{i}", f"c{i}@bench", "x", "consumidor") for i in range(100)]
+    lojas = []
+    for i in range(20):
+        user_id = db.criar_usuario(f"L{i}", f"l{i}@bench", "x", "estabelecimento")
+        lojas.append(db.criar_estabelecimento(user_id, f"Loja {i}", str(i), "Rua", -23.55, -46.63))
+    ofertas = [
+        db.criar_oferta(rng.choice(lojas), f"Caixa {i}", "Pães e doces", rng.choice(CATEGORIAS),
+                        40.0, rng.uniform(5, 35), 10000, "18:00", "19:00")
+        for i in range(total_ofertas)
+    ]
+    return consumidores, ofertas
+
+
+def requisicao(rng: random.Random, consumidores: list, ofertas: list) -> tuple:
+    """Sorteia uma requisição: 90% leituras da vitrine, 10% reservas"""
+    if rng.random() < 0.1:
+        return ('criar_pedido', (rng.choice(consumidores), rng.choice(ofertas)))
+    return ('buscar_ofertas', (rng.choice(CATEGORIAS), 30.0, 'desconto'))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corrotinas', type=int, default=100)
+    parser.add_argument('--requisicoes', type=int, default=20, help='requisições por corrotina')
+    parser.add_argument('--leitores', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'bench_async.db')
+        db = Database(caminho)
+        consumidores, ofertas = preparar(db)
+        rng = random.Random(2)
+        carga = [
+            [requisicao(rng, consumidores, ofertas) for _ in range(args.requisicoes)]
+            for _ in range(args.corrotinas)
+        ]
+        total = args.corrotinas * args.requisicoes
+
+        # API síncrona: uma requisição de cada vez
+        inicio = time.perf_counter()
+        for fila in carga:
+            for metodo, params in fila:
+                getattr(db, metodo)(*params)
+        t_sync = time.perf_counter() - inicio
+        db.close()
+
+        # Fachada assíncrona: todas as corrotinas ao mesmo tempo
+        async def cliente(adb: AsyncDatabase, fila: list) -> None:
+            for metodo, params in fila:
+                await getattr(adb, metodo)(*params)
+
+        async def rodar() -> float:
+            async with AsyncDatabase(caminho, leitores=args.leitores, max_concorrencia=args.corrotinas) as adb:
+                inicio = time.perf_counter()
+                await asyncio.gather(*(cliente(adb, fila) for fila in carga))
+                return time.perf_counter() - inicio
+
+        t_async = asyncio.run(rodar())
+
+    print(f"requisições: {total} ({args.corrotinas} corrotinas, {args.leitores} leitores)")
+    print(f"síncrono:   {total / t_sync:>8.0f} req/s")
+    print(f"assíncrono: {total / t_async:>8.0f} req/s ({t_sync / t_async:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Benchmark do checkout em lote vs N chamadas sequenciais de criar_pedido.
+
+Uso: python -m benchmarks.bench_checkout [--itens 3 10 50] [--rodadas 50]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from database import Database
+
+
+def preparar(db: Database, total_ofertas: int, estoque: int) -> tuple:
+    """Cria um consumidor, um estabelecimento e ``total_ofertas`` ofertas"""
+    cons_id = db.criar_usuario("Bench", "bench@cons", "x", "consumidor")
+    user_id = db.criar_usuario("Loja", "bench@loja", "x", "estabelecimento")
+    est_id = db.criar_estabelecimento(user_id, "Loja Bench", "0", "Rua", -23.55, -46.63)
+    ofertas = [
+        db.criar_oferta(est_id, f"Oferta {i}", "", "Padaria", 30.0, 10.0, estoque, "18:00", "19:00")
+        for i in range(total_ofertas)
+    ]
+    return cons_id, ofertas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--itens', type=int, nargs='+', default=[3, 10, 50])
+    parser.add_argument('--rodadas', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'itens':>5} | {'sequencial (pedidos/s)':>22} | {'lote (pedidos/s)':>16} | {'ganho':>6}")
+    for n in args.itens:
+        with tempfile.TemporaryDirectory() as pasta:
+            db = Database(os.path.join(pasta, 'bench_checkout.db'))
+            cons_id, ofertas = preparar(db, n, estoque=2 * args.rodadas)
+
+            inicio = time.perf_counter()
+            for _ in range(args.rodadas):
+                for oferta_id in ofertas:
+                    assert db.criar_pedido(cons_id, oferta_id, 1)
+            t_seq = time.perf_counter() - inicio
+
+            itens = [(oferta_id, 1) for oferta_id in ofertas]
+            inicio = time.perf_counter()
+            for _ in range(args.rodadas):
+                assert db.criar_pedidos_lote(cons_id, itens)['sucesso']
+            t_lote = time.perf_counter() - inicio
+            db.close()
+
+        total = n * args.rodadas
+        print(f"{n:>5} | {total / t_seq:>22.0f} | {total / t_lote:>16.0f} | {t_seq / t_lote:>5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
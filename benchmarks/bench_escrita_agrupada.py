@@ -0,0 +1,112 @@
+"""Benchmark de vazão de escritas concorrentes: um commit por chamada vs escrita agrupada (group commit).
+
+Cada uma das ``--threads`` threads cria pedidos e, em parte deles, valida a
+retirada ou cancela, como no pico de reservas do fim da tarde. Mede
+operações/s e latência (p50/p99) por chamada nos dois modos do Database.
+
+Uso: python -m benchmarks.bench_escrita_agrupada [--threads 50] [--operacoes 40] [--lote 64] [--espera-ms 2]
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from database import Database
+from senhas import HasherSenhas
+
+from benchmarks.bench_checkout import preparar
+
+
+def rodar(db: Database, cons_id: int, ofertas: List[int], est_id: int, threads: int,
+          operacoes: int) -> Dict[str, Any]:
+    """Dispara as threads ao mesmo tempo e retorna vazão e latências"""
+    latencias: List[float] = []
+    erros: List[BaseException] = []
+    lock = threading.Lock()
+    largada = threading.Barrier(threads + 1)
+
+    def trabalhador(indice: int) -> None:
+        minhas = []
+        largada.wait()
+        try:
+            for i in range(operacoes):
+                oferta_id = ofertas[(indice + i) % len(ofertas)]
+                inicio = time.perf_counter()
+                pedido = db.criar_pedido(cons_id, oferta_id, 1)
+                minhas.append(time.perf_counter() - inicio)
+                assert pedido, "sem estoque"
+                inicio = time.perf_counter()
+                if i % 3 == 0:
+                    assert db.validar_retirada(pedido['codigo_retirada'], est_id)['sucesso']
+                elif i % 5 == 0:
+                    assert db.cancelar_pedido(pedido['id'])['sucesso']
+                else:
+                    continue
+                minhas.append(time.perf_counter() - inicio)
+        except BaseException as e:
+            with lock:
+                erros.append(e)
+        with lock:
+            latencias.extend(minhas)
+
+    trabalhadores = [threading.Thread(target=trabalhador, args=(i,)) for i in range(threads)]
+    for t in trabalhadores:
+        t.start()
+    largada.wait()
+    inicio = time.perf_counter()
+    for t in trabalhadores:
+        t.join()
+    duracao = time.perf_counter() - inicio
+    if erros:
+        raise erros[0]
+
+    ms = np.array(latencias) * 1000
+    return {
+        'operacoes': len(latencias),
+        'ops_s': len(latencias) / duracao,
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p99_ms': float(np.percentile(ms, 99)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=50)
+    parser.add_argument('--operacoes', type=int, default=40, help='pedidos criados por thread')
+    parser.add_argument('--lote', type=int, default=64, help='máximo de operações por transação')
+    parser.add_argument('--espera-ms', type=float, default=2.0, help='espera máxima para completar um lote')
+    args = parser.parse_args()
+
+    print(f"{'modo':<10} | {'operações':>9} | {'ops/s':>7} | {'p50 (ms)':>8} | {'p99 (ms)':>8} | lotes")
+    base = None
+    for modo, agrupada in (('individual', False), ('agrupada', True)):
+        with tempfile.TemporaryDirectory() as pasta:
+            senhas = HasherSenhas(custo=1000)
+            with contextlib.redirect_stdout(io.StringIO()):
+                db = Database(os.path.join(pasta, 'bench_escrita.db'), senhas=senhas, escrita_agrupada=agrupada,
+                              tamanho_lote_escrita=args.lote, espera_lote_ms=args.espera_ms,
+                              max_tentativas_escrita=50)
+            cons_id, ofertas = preparar(db, 50, estoque=args.threads * args.operacoes)
+            est_id = db.get_estabelecimento_id(db.autenticar_usuario("bench@loja", "x")['id'])
+
+            r = rodar(db, cons_id, ofertas, est_id, args.threads, args.operacoes)
+            lotes = ''
+            if db.escritor is not None:
+                stats = db.escritor.estatisticas()
+                lotes = f"{stats['lotes']} (média {stats['media_lote']:.1f}, maior {stats['maior_lote']})"
+            db.close()
+            senhas.close()
+
+        base = base or r['ops_s']
+        print(f"{modo:<10} | {r['operacoes']:>9} | {r['ops_s']:>7.0f} | {r['p50_ms']:>8.2f} | "
+              f"{r['p99_ms']:>8.2f} | {lotes}  ({r['ops_s'] / base:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark dos formatos de resultado (dict, tupla, colunas, dataframe) em listagens grandes.
+
+Gera (uma vez) um banco com uma única loja dona de ~100 mil ofertas e 100
+mil pedidos e mede, para listar_ofertas_ativas (caminho sem cache) e
+listar_pedidos_estabelecimento, o tempo de cada formato e a memória retida
+pelo resultado. A memória é medida igual para todos os formatos: heap do
+Python (tracemalloc) mais o que foi alocado no pool do Arrow, onde o pandas
+guarda as colunas de texto quando o pyarrow está instalado. A linha
+'dict+DataFrame' é o caminho antigo do analytics: lista de dicts convertida
+depois em DataFrame.
+
+Uso: python -m benchmarks.bench_formatos [--itens 100000] [--rodadas 5]
+"""
+import argparse
+import contextlib
+import gc
+import io
+import os
+import sqlite3
+import time
+import tracemalloc
+from typing import Any, Callable, Tuple
+
+import pandas as pd
+
+from database import Database
+from popular_dados import Escala, popular_banco_dados
+from resultados import FORMATOS_RESULTADO
+
+from benchmarks.suite import PASTA_PADRAO
+
+try:
+    import pyarrow
+except ImportError:   # sem pyarrow o pandas guarda texto em objetos Python, vistos pelo tracemalloc
+    pyarrow = None
+
+
+def _bytes_arrow() -> int:
+    return pyarrow.total_allocated_bytes() if pyarrow is not None else 0
+
+
+def contar_linhas(resultado: Any) -> int:
+    """Linhas do resultado em qualquer formato ('colunas' é um dict coluna -> array)"""
+    if isinstance(resultado, dict):
+        return len(next(iter(resultado.values()))) if resultado else 0
+    return len(resultado)
+
+
+def preparar_banco(itens: int, pasta: str) -> str:
+    """Banco-base com uma loja, ``itens`` ofertas e ``itens`` pedidos (reaproveita se já existir)"""
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, f'base_formatos_{itens}.db')
+    if not os.path.exists(caminho):
+        print(f"  gerando banco com {itens} ofertas/pedidos...")
+        escala = Escala(estabelecimentos=1, consumidores=1_000, ofertas_min=itens, ofertas_max=itens,
+                        pedidos=itens, dias=90, avaliacoes=0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            popular_banco_dados(caminho + '.gerando', escala)
+        conn = sqlite3.connect(caminho + '.gerando')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.close()
+        os.replace(caminho + '.gerando', caminho)
+    return caminho
+
+
+def medir(funcao: Callable[[], Any], rodadas: int) -> Tuple[float, float, int]:
+    """Melhor tempo (ms), memória retida pelo resultado (MB) e número de linhas"""
+    melhor = float('inf')
+    for _ in range(rodadas):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+        del resultado
+
+    gc.collect()
+    tracemalloc.start()
+    antes, arrow_antes = tracemalloc.get_traced_memory()[0], _bytes_arrow()
+    resultado = funcao()
+    retida = tracemalloc.get_traced_memory()[0] - antes + _bytes_arrow() - arrow_antes
+    tracemalloc.stop()
+    return melhor * 1000, retida / 2 ** 20, contar_linhas(resultado)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--itens', type=int, default=100_000)
+    parser.add_argument('--rodadas', type=int, default=5)
+    parser.add_argument('--pasta', default=PASTA_PADRAO, help='onde guardar o banco-base gerado')
+    args = parser.parse_args()
+
+    caminho = preparar_banco(args.itens, args.pasta)
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = Database(caminho)
+    est_id = db.get_connection().execute('SELECT MIN(id) FROM estabelecimentos').fetchone()[0]
+
+    listagens = {
+        # Caminho sem cache: mede a consulta e a montagem, não o cache nem uma escrita
+        'listar_ofertas_ativas': db._listar_ofertas_ativas,
+        'listar_pedidos_estabelecimento': lambda formato: db.listar_pedidos_estabelecimento(est_id, formato=formato),
+    }
+
+    print(f"{'listagem':<31} | {'formato':<14} | {'linhas':>7} | {'tempo (ms)':>10} | {'memória (MB)':>12}")
+    for nome, listar in listagens.items():
+        casos = [(formato, lambda formato=formato: listar(formato)) for formato in FORMATOS_RESULTADO]
+        casos.append(('dict+DataFrame', lambda: pd.DataFrame(listar('dict'))))
+        for formato, funcao in casos:
+            tempo, memoria, linhas = medir(funcao, args.rodadas)
+            print(f"{nome:<31} | {formato:<14} | {linhas:>7} | {tempo:>10.1f} | {memoria:>12.1f}")
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Benchmark da busca "ofertas perto de mim": R-tree + haversine vs varredura completa.
+
+Uso: python -m benchmarks.bench_geo [--tamanhos 5000 20000 80000] [--raio 1.0]
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from database import Database, RAIO_TERRA_KM
+
+# Região metropolitana de São Paulo (aprox.)
+LAT_MIN, LAT_MAX = -23.80, -23.40
+LON_MIN, LON_MAX = -46.85, -46.40
+
+
+def popular(db: Database, total: int, seed: int = 42) -> None:
+    """Insere ``total`` estabelecimentos aleatórios, cada um com uma oferta ativa"""
+    rng = random.Random(seed)
+    conn = db.get_connection()
+    conn.execute('BEGIN')
+    conn.executemany(
+        "INSERT INTO usuarios (id, nome, email, senha, tipo) VALUES (?, ?, ?, 'x', 'estabelecimento')",
+        ((i, f'Loja {i}', f'loja{i}@bench') for i in range(1, total + 1))
+    )
+    conn.executemany(
+        'INSERT INTO estabelecimentos (id, usuario_id, nome_fantasia, endereco, latitude, longitude) VALUES (?, ?, ?, ?, ?, ?)',
+        ((i, i, f'Loja {i}', 'Rua', rng.uniform(LAT_MIN, LAT_MAX), rng.uniform(LON_MIN, LON_MAX))
+         for i in range(1, total + 1))
+    )
+    conn.executemany(
+        '''INSERT INTO ofertas (estabelecimento_id, titulo, categoria, preco_original, preco_venda,
+                                estoque_inicial, estoque_atual, horario_retirada_inicio, horario_retirada_fim)
+           VALUES (?, 'Caixa', 'Padaria', 30, 10, 5, 5, '18:00', '19:00')''',
+        ((i,) for i in range(1, total + 1))
+    )
+    conn.commit()
+    conn.close()
+
+
+def varredura_completa(db: Database, lat: float, lon: float, raio_km: float) -> int:
+    """Linha de base: carrega todas as ofertas ativas e filtra por distância"""
+    ofertas = db.listar_ofertas_ativas()
+    lats = np.radians([o['latitude'] for o in ofertas])
+    lons = np.radians([o['longitude'] for o in ofertas])
+    lat0, lon0 = math.radians(lat), math.radians(lon)
+    a = np.sin((lats - lat0) / 2) ** 2 + math.cos(lat0) * np.cos(lats) * np.sin((lons - lon0) / 2) ** 2
+    distancias = 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(a))
+    return int((distancias <= raio_km).sum())
+
+
+def medir(funcao, pontos, repeticoes: int = 3) -> float:
+    """Mediana (ms) de ``funcao(lat, lon)`` sobre os pontos de consulta"""
+    tempos = []
+    for _ in range(repeticoes):
+        for lat, lon in pontos:
+            inicio = time.perf_counter()
+            funcao(lat, lon)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=[5000, 20000, 80000])
+    parser.add_argument('--raio', type=float, default=1.0)
+    parser.add_argument('--consultas', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    pontos = [(rng.uniform(LAT_MIN, LAT_MAX), rng.uniform(LON_MIN, LON_MAX)) for _ in range(args.consultas)]
+
+    print(f"{'estabelecimentos':>16} | {'R-tree (ms)':>11} | {'varredura (ms)':>14} | {'ganho':>6}")
+    for total in args.tamanhos:
+        with tempfile.TemporaryDirectory() as pasta:
+            db = Database(os.path.join(pasta, 'bench_geo.db'))
+            popular(db, total)
+
+            # Sanidade: as duas abordagens encontram o mesmo número de ofertas
+            lat, lon = pontos[0]
+            assert len(db.listar_ofertas_proximas(lat, lon, args.raio)) == varredura_completa(db, lat, lon, args.raio)
+
+            t_rtree = medir(lambda la, lo: db.listar_ofertas_proximas(la, lo, args.raio), pontos)
+            t_full = medir(lambda la, lo: varredura_completa(db, la, lo, args.raio), pontos)
+            db.close()
+
+        print(f"{total:>16} | {t_rtree:>11.3f} | {t_full:>14.3f} | {t_full / t_rtree:>5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
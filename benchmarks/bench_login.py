@@ -0,0 +1,70 @@
+"""Benchmark de login concorrente: verificação de senha (KDF) vs token de sessão.
+
+Uso: python -m benchmarks.bench_login [--tentativas 64] [--threads 16] [--trabalhadores 1 2 4]
+                                      [--algoritmo pbkdf2_sha256] [--custo 200000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from database import Database
+from senhas import HasherSenhas
+
+USUARIOS = 20
+
+
+def rodar(funcao, argumentos: list, threads: int) -> tuple:
+    """Executa ``funcao`` para cada argumento com ``threads`` clientes; retorna (ops/s, p50, p99 em ms)"""
+    def medir(argumento):
+        inicio = time.perf_counter()
+        assert funcao(argumento)
+        return time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencias = np.array(list(pool.map(medir, argumentos))) * 1000
+    duracao = time.perf_counter() - inicio
+    p50, p99 = np.percentile(latencias, [50, 99])
+    return len(argumentos) / duracao, p50, p99
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tentativas', type=int, default=64, help='logins por cenário')
+    parser.add_argument('--threads', type=int, default=16, help='clientes simultâneos')
+    parser.add_argument('--trabalhadores', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--algoritmo', default='pbkdf2_sha256', choices=['pbkdf2_sha256', 'scrypt'])
+    parser.add_argument('--custo', type=int, default=None)
+    args = parser.parse_args()
+
+    emails = [f"u{i % USUARIOS}@bench" for i in range(args.tentativas)]
+    print(f"{args.tentativas} logins, {args.threads} clientes simultâneos, {os.cpu_count()} CPUs")
+    print(f"{'cenário':<34} | {'logins/s':>9} | {'p50 (ms)':>9} | {'p99 (ms)':>9}")
+
+    with tempfile.TemporaryDirectory() as pasta:
+        for trabalhadores in args.trabalhadores:
+            senhas = HasherSenhas(args.algoritmo, args.custo, trabalhadores=trabalhadores)
+            with contextlib.redirect_stdout(io.StringIO()):
+                db = Database(os.path.join(pasta, f'bench_login_{trabalhadores}.db'), senhas=senhas)
+            ids = [db.criar_usuario(f"U{i}", f"u{i}@bench", "senha123", "consumidor") for i in range(USUARIOS)]
+
+            vazao, p50, p99 = rodar(lambda email: db.autenticar_usuario(email, "senha123"), emails, args.threads)
+            cenario = f"senha ({senhas.algoritmo}, {trabalhadores} trab.)"
+            print(f"{cenario:<34} | {vazao:>9.1f} | {p50:>9.1f} | {p99:>9.1f}")
+
+            if trabalhadores == args.trabalhadores[-1]:
+                tokens = [db.criar_sessao(ids[i % USUARIOS]) for i in range(args.tentativas)]
+                vazao, p50, p99 = rodar(db.validar_sessao, tokens, args.threads)
+                print(f"{'token de sessão':<34} | {vazao:>9.1f} | {p50:>9.3f} | {p99:>9.3f}")
+            db.close()
+            senhas.close()
+
+
+if __name__ == '__main__':
+    main()
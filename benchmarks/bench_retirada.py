@@ -0,0 +1,66 @@
+"""Benchmark da validação de retiradas em lote vs N chamadas sequenciais de validar_retirada.
+
+Uso: python -m benchmarks.bench_retirada [--codigos 10 100] [--rodadas 5]
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from database import Database
+from senhas import HasherSenhas
+
+from benchmarks.bench_checkout import preparar
+
+
+def criar_pedidos(db: Database, cons_id: int, ofertas: list, total: int) -> list:
+    """Cria ``total`` pedidos pagos (em lotes) e retorna os códigos de retirada"""
+    codigos = []
+    while len(codigos) < total:
+        itens = [(ofertas[i % len(ofertas)], 1) for i in range(min(50, total - len(codigos)))]
+        resultado = db.criar_pedidos_lote(cons_id, itens)
+        assert resultado['sucesso'], resultado['mensagem']
+        codigos += [item['pedido']['codigo_retirada'] for item in resultado['itens']]
+    return codigos
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--codigos', type=int, nargs='+', default=[10, 100])
+    parser.add_argument('--rodadas', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'códigos':>7} | {'sequencial (ms)':>15} | {'lote (ms)':>9} | {'ganho':>6}")
+    for n in args.codigos:
+        with tempfile.TemporaryDirectory() as pasta:
+            senhas = HasherSenhas(custo=1000)
+            with contextlib.redirect_stdout(io.StringIO()):
+                db = Database(os.path.join(pasta, 'bench_retirada.db'), senhas=senhas)
+            cons_id, ofertas = preparar(db, 20, estoque=n * args.rodadas)
+            est_id = db.get_estabelecimento_id(db.autenticar_usuario("bench@loja", "x")['id'])
+            codigos = criar_pedidos(db, cons_id, ofertas, 2 * n * args.rodadas)
+
+            t_seq = t_lote = 0.0
+            for rodada in range(args.rodadas):
+                sequenciais = codigos[2 * n * rodada:2 * n * rodada + n]
+                lote = codigos[2 * n * rodada + n:2 * n * (rodada + 1)]
+
+                inicio = time.perf_counter()
+                for codigo in sequenciais:
+                    assert db.validar_retirada(codigo, est_id)['sucesso']
+                t_seq += time.perf_counter() - inicio
+
+                inicio = time.perf_counter()
+                assert all(r['sucesso'] for r in db.validar_retiradas_lote(lote, est_id))
+                t_lote += time.perf_counter() - inicio
+            db.close()
+            senhas.close()
+
+        t_seq, t_lote = t_seq / args.rodadas * 1000, t_lote / args.rodadas * 1000
+        print(f"{n:>7} | {t_seq:>15.1f} | {t_lote:>9.1f} | {t_seq / t_lote:>5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
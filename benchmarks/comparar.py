@@ -0,0 +1,65 @@
+"""Compara dois resultados da suíte de benchmarks e aponta regressões.
+
+Uma operação regrediu quando o p50 ou o p99 subiu, ou a vazão caiu, mais
+do que o limite (padrão 10%). Sai com código 1 se houver regressão.
+
+Uso: python -m benchmarks.comparar base.json novo.json [--limite 0.10]
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Tuple
+
+# Métrica -> True se valores maiores são piores
+METRICAS = {'p50_ms': True, 'p99_ms': True, 'vazao_ops_s': False}
+
+
+def _indexar(caminho: str) -> Dict[Tuple[str, str, int], Dict[str, Any]]:
+    """Lê um arquivo de resultados indexado por (escala, operação, threads)"""
+    with open(caminho, encoding='utf-8') as arquivo:
+        resultados = json.load(arquivo)['resultados']
+    return {(r['escala'], r['operacao'], r['threads']): r for r in resultados}
+
+
+def comparar(base: Dict, novo: Dict, limite: float) -> List[Dict[str, Any]]:
+    """Variação relativa de cada métrica nas combinações presentes nos dois arquivos"""
+    linhas = []
+    for chave in sorted(base.keys() & novo.keys()):
+        for metrica, maior_pior in METRICAS.items():
+            antes, depois = base[chave][metrica], novo[chave][metrica]
+            if not antes:
+                continue
+            variacao = (depois - antes) / antes
+            piora = variacao if maior_pior else -variacao
+            linhas.append({
+                'escala': chave[0], 'operacao': chave[1], 'threads': chave[2], 'metrica': metrica,
+                'antes': antes, 'depois': depois, 'variacao': variacao, 'regressao': piora > limite,
+            })
+    return linhas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('base')
+    parser.add_argument('novo')
+    parser.add_argument('--limite', type=float, default=0.10, help='piora relativa tolerada (0.10 = 10%%)')
+    args = parser.parse_args()
+
+    base, novo = _indexar(args.base), _indexar(args.novo)
+    linhas = comparar(base, novo, args.limite)
+
+    for chave in sorted(base.keys() ^ novo.keys()):
+        print(f"  (só em um dos arquivos) {chave[0]} {chave[1]} {chave[2]}t")
+    for linha in linhas:
+        marca = '❌' if linha['regressao'] else '  '
+        print(f"{marca} {linha['escala']:<8} {linha['operacao']:<32} {linha['threads']:>2}t "
+              f"{linha['metrica']:<12} {linha['antes']:>11.3f} -> {linha['depois']:>11.3f} "
+              f"({linha['variacao']:+.1%})")
+
+    regressoes = sum(linha['regressao'] for linha in linhas)
+    print(f"\n{regressoes} regressões acima de {args.limite:.0%}")
+    sys.exit(1 if regressoes else 0)
+
+
+if __name__ == '__main__':
+    main()
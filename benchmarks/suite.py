@@ -0,0 +1,209 @@
+"""Suíte de benchmarks dos caminhos quentes do Database em várias escalas de dados.
+
+Gera (uma vez, com semente fixa) bancos pequeno/médio/grande com o
+popular_dados e mede, para cada operação, latência (p50/p90/p99) e vazão
+com 1 e N threads. Cada rodada usa uma cópia do banco-base, então as
+escritas não contaminam as rodadas seguintes.
+
+Uso:
+    python -m benchmarks.suite [--escalas pequena media] [--threads 1 8] [--saida resultados.json]
+    python -m benchmarks.comparar base.json novo.json    # aponta regressões
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from analytics_queries import carregar_pacote
+from database import Database
+from popular_dados import ESCALAS, Escala, popular_banco_dados
+
+ESCALAS_BENCH = {
+    'pequena': Escala(estabelecimentos=50, consumidores=1_000, pedidos=10_000, dias=60, avaliacoes=500),
+    'media': ESCALAS['media'],
+    'grande': ESCALAS['grande'],
+}
+
+PASTA_PADRAO = os.path.join(tempfile.gettempdir(), 'pega_ai_bench')
+
+
+@dataclass
+class Contexto:
+    """IDs sorteáveis do banco e a fila de códigos ainda não retirados"""
+    consumidores: List[int]
+    estabelecimentos: List[int]
+    ofertas: List[int]
+    codigos_pagos: deque
+
+
+def _op_criar_pedido(db: Database, ctx: Contexto, rng: random.Random) -> Any:
+    return db.criar_pedido(rng.choice(ctx.consumidores), rng.choice(ctx.ofertas), 1)
+
+
+def _op_validar_retirada(db: Database, ctx: Contexto, rng: random.Random) -> Any:
+    return db.validar_retirada(ctx.codigos_pagos.pop(), None)   # deque.pop é thread-safe; códigos de várias lojas
+
+
+# Operação -> função (db, contexto, rng) executada a cada medição
+OPERACOES: Dict[str, Callable[[Database, Contexto, random.Random], Any]] = {
+    'listar_ofertas_ativas': lambda db, ctx, rng: db.listar_ofertas_ativas(),
+    'buscar_ofertas': lambda db, ctx, rng: db.buscar_ofertas(ordenacao=rng.choice(['recentes', 'preco', 'desconto'])),
+    'criar_pedido': _op_criar_pedido,
+    'validar_retirada': _op_validar_retirada,
+    'listar_pedidos_consumidor': lambda db, ctx, rng: db.listar_pedidos_consumidor(rng.choice(ctx.consumidores)),
+    'listar_pedidos_estabelecimento':
+        lambda db, ctx, rng: db.listar_pedidos_estabelecimento(rng.choice(ctx.estabelecimentos)),
+    'pagina_pedidos_estabelecimento':   # O que a tela de pedidos da loja carrega de fato
+        lambda db, ctx, rng: db.listar_pedidos_estabelecimento(rng.choice(ctx.estabelecimentos),
+                                                               ['reservado', 'pago'], limite=20),
+    'analytics': lambda db, ctx, rng: (db.atualizar_rollups(), carregar_pacote(db)),   # como a página
+}
+
+# Operações caras por chamada rodam menos vezes
+REPETICOES_MAXIMAS = {'analytics': 20, 'listar_pedidos_estabelecimento': 200}
+
+
+def preparar_banco(escala: str, seed: int, pasta: str) -> str:
+    """Gera o banco-base da escala (reaproveita se já existir) e retorna o caminho"""
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, f'base_{escala}_{seed}.db')
+    if not os.path.exists(caminho):
+        temporario = caminho + '.gerando'
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(temporario + sufixo):
+                os.remove(temporario + sufixo)
+        print(f"  gerando banco {escala} (seed {seed})...")
+        with contextlib.redirect_stdout(io.StringIO()):
+            popular_banco_dados(temporario, ESCALAS_BENCH[escala], seed=seed)
+        # Consolida o WAL no arquivo principal antes de renomear
+        conn = sqlite3.connect(temporario)
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.close()
+        os.replace(temporario, caminho)
+    return caminho
+
+
+def carregar_contexto(db: Database) -> Contexto:
+    """Lê os IDs usados para sortear os parâmetros das operações"""
+    conn = db.get_connection()
+    contexto = Contexto(
+        consumidores=[r[0] for r in conn.execute("SELECT id FROM usuarios WHERE tipo = 'consumidor'")],
+        estabelecimentos=[r[0] for r in conn.execute('SELECT id FROM estabelecimentos')],
+        ofertas=[r[0] for r in conn.execute("SELECT id FROM ofertas WHERE status = 'ativa' AND estoque_atual > 0")],
+        codigos_pagos=deque(r[0] for r in conn.execute(
+            "SELECT codigo_retirada FROM pedidos WHERE status = 'pago' ORDER BY id")),
+    )
+    conn.close()
+    return contexto
+
+
+def medir(db: Database, ctx: Contexto, operacao: str, repeticoes: int, threads: int, seed: int) -> Dict[str, Any]:
+    """Executa a operação ``repeticoes`` vezes divididas entre ``threads`` e resume as latências"""
+    funcao = OPERACOES[operacao]
+    por_thread = [repeticoes // threads + (i < repeticoes % threads) for i in range(threads)]
+    latencias: List[float] = []
+    lock = threading.Lock()
+
+    def trabalhador(indice: int) -> None:
+        rng = random.Random(seed * 1000 + indice)
+        locais = []
+        for _ in range(por_thread[indice]):
+            inicio = time.perf_counter()
+            funcao(db, ctx, rng)
+            locais.append(time.perf_counter() - inicio)
+        with lock:
+            latencias.extend(locais)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(trabalhador, range(threads)))
+    duracao = time.perf_counter() - inicio
+
+    ms = np.array(latencias) * 1000
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    return {
+        'operacao': operacao,
+        'threads': threads,
+        'repeticoes': len(latencias),
+        'p50_ms': round(float(p50), 4),
+        'p90_ms': round(float(p90), 4),
+        'p99_ms': round(float(p99), 4),
+        'media_ms': round(float(ms.mean()), 4),
+        'vazao_ops_s': round(len(latencias) / duracao, 2),
+    }
+
+
+def rodar_escala(escala: str, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Mede todas as operações pedidas na escala, cada combinação numa cópia nova do banco"""
+    base = preparar_banco(escala, args.seed, args.pasta)
+    resultados = []
+    for threads in args.threads:
+        for operacao in args.operacoes:
+            repeticoes = min(args.repeticoes, REPETICOES_MAXIMAS.get(operacao, args.repeticoes))
+            with tempfile.TemporaryDirectory() as pasta:
+                copia = os.path.join(pasta, 'bench.db')
+                shutil.copyfile(base, copia)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    # Sem cache de leituras: mede o caminho até o SQLite
+                    db = Database(copia, tamanho_pool=max(threads, 1) + 1, cache_max_entradas=0)
+                ctx = carregar_contexto(db)
+                medir(db, ctx, operacao, min(repeticoes, 10), threads, args.seed + 1)   # Aquecimento
+                if operacao == 'validar_retirada':
+                    repeticoes = min(repeticoes, len(ctx.codigos_pagos))
+                resultado = medir(db, ctx, operacao, repeticoes, threads, args.seed)
+                db.close()
+            resultado['escala'] = escala
+            resultados.append(resultado)
+            print(f"  {escala:<8} {operacao:<32} {threads:>2}t  p50 {resultado['p50_ms']:>9.3f} ms  "
+                  f"p99 {resultado['p99_ms']:>9.3f} ms  {resultado['vazao_ops_s']:>10.1f} ops/s")
+    return resultados
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--escalas', nargs='+', choices=ESCALAS_BENCH, default=['pequena', 'media'])
+    parser.add_argument('--operacoes', nargs='+', choices=OPERACOES, default=list(OPERACOES))
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--repeticoes', type=int, default=500, help='chamadas medidas por operação')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--pasta', default=PASTA_PADRAO, help='onde guardar os bancos-base gerados')
+    parser.add_argument('--saida', default='resultados_benchmark.json', help='arquivo JSON de resultados')
+    args = parser.parse_args()
+
+    resultados = []
+    for escala in args.escalas:
+        resultados.extend(rodar_escala(escala, args))
+
+    relatorio = {
+        'meta': {
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'plataforma': platform.platform(),
+            'seed': args.seed,
+            'repeticoes': args.repeticoes,
+        },
+        'resultados': resultados,
+    }
+    with open(args.saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+    print(f"\nResultados gravados em {args.saida}")
+
+
+if __name__ == '__main__':
+    main()
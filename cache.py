@@ -0,0 +1,65 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+
+
+class CacheVersionado:
+    """Cache LRU em memória cujas entradas valem para uma versão dos dados.
+
+    A versão vem de um contador gravado no próprio banco e incrementado por
+    toda escrita; ao observar uma versão nova, o cache descarta tudo o que
+    foi calculado com a anterior. ``max_entradas = 0`` desativa o cache.
+    """
+
+    def __init__(self, max_entradas: int = 256):
+        self.max_entradas = max_entradas
+        self._entradas: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._versao = -1
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidacoes': 0}
+
+    def _observar_versao(self, versao: int) -> None:
+        """Descarta as entradas se a versão dos dados avançou (chamar com lock)"""
+        if versao > self._versao:
+            if self._entradas:
+                self._stats['invalidacoes'] += 1
+            self._entradas.clear()
+            self._versao = versao
+
+    def obter(self, chave: Hashable, versao: int) -> Tuple[bool, Any]:
+        """Retorna (encontrado, valor) para a chave na versão informada"""
+        with self._lock:
+            self._observar_versao(versao)
+            if versao == self._versao and chave in self._entradas:
+                self._entradas.move_to_end(chave)
+                self._stats['hits'] += 1
+                return True, self._entradas[chave]
+            self._stats['misses'] += 1
+            return False, None
+
+    def guardar(self, chave: Hashable, versao: int, valor: Any) -> None:
+        """Armazena o valor calculado com a versão informada"""
+        if self.max_entradas <= 0:
+            return
+        with self._lock:
+            self._observar_versao(versao)
+            if versao != self._versao:
+                return  # Calculado com dados que já mudaram
+            self._entradas[chave] = valor
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def limpar(self) -> None:
+        """Remove todas as entradas"""
+        with self._lock:
+            self._entradas.clear()
+
+    def estatisticas(self) -> Dict[str, int]:
+        """Contadores de hits, misses, evictions e invalidações"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entradas'] = len(self._entradas)
+            stats['versao'] = self._versao
+            return stats
@@ -0,0 +1,123 @@
+"""Alocação de códigos de retirada.
+
+Códigos aleatórios (``secrets``) de um alfabeto sem caracteres ambíguos na
+leitura em voz alta ou na tela do celular (sem 0/O, 1/I/L). Com 8
+caracteres são 31^8 ≈ 8,5 × 10^11 combinações; a unicidade é garantida pelo
+índice UNIQUE do banco, e quem insere refaz o sorteio se houver colisão.
+"""
+import secrets
+import sqlite3
+import threading
+from collections import deque
+from typing import Deque, Iterable, List, Optional
+
+ALFABETO_CODIGOS = '23456789ABCDEFGHJKMNPQRSTUVWXYZ'
+TAMANHO_CODIGO = 8
+
+# Bytes aleatórios acima deste valor são descartados para não enviesar o módulo
+_LIMITE_BYTE = 256 - 256 % len(ALFABETO_CODIGOS)
+
+
+def normalizar_codigo(codigo: str) -> str:
+    """Código como digitado pelo usuário -> formato armazenado"""
+    return ''.join(codigo.split()).replace('-', '').upper()
+
+
+def codificar_inteiro(valor: int, tamanho: int = TAMANHO_CODIGO) -> str:
+    """Representa um inteiro no alfabeto de códigos com tamanho fixo (injetivo até 31^tamanho)"""
+    base = len(ALFABETO_CODIGOS)
+    caracteres = []
+    for _ in range(tamanho):
+        valor, resto = divmod(valor, base)
+        caracteres.append(ALFABETO_CODIGOS[resto])
+    return ''.join(reversed(caracteres))
+
+
+def _colisao_de_codigo(erro: sqlite3.IntegrityError) -> bool:
+    return 'codigo_retirada' in str(erro)
+
+
+class AlocadorCodigos:
+    """Sorteia códigos de retirada, opcionalmente a partir de um estoque pré-gerado.
+
+    Com ``tamanho_estoque > 0`` os códigos são gerados em lote; cada reposição
+    já descarta, com uma única consulta, os que existem no banco.
+    """
+
+    def __init__(self, tamanho: int = TAMANHO_CODIGO, max_tentativas: int = 5, tamanho_estoque: int = 0):
+        self.tamanho = tamanho
+        self.max_tentativas = max_tentativas
+        self.tamanho_estoque = tamanho_estoque
+        self._estoque: Deque[str] = deque()
+        self._lock = threading.Lock()
+        self.colisoes = 0
+
+    def gerar(self, quantidade: int = 1) -> List[str]:
+        """Sorteia ``quantidade`` códigos (sem consultar o banco)"""
+        codigos = []
+        caracteres: List[str] = []
+        while len(codigos) < quantidade:
+            for byte in secrets.token_bytes((quantidade - len(codigos)) * self.tamanho * 2):
+                if byte < _LIMITE_BYTE:
+                    caracteres.append(ALFABETO_CODIGOS[byte % len(ALFABETO_CODIGOS)])
+                    if len(caracteres) == self.tamanho:
+                        codigos.append(''.join(caracteres))
+                        caracteres = []
+                        if len(codigos) == quantidade:
+                            break
+        return codigos
+
+    def _existentes(self, cursor: sqlite3.Cursor, codigos: List[str]) -> set:
+        """Quais dos códigos já estão em uso (em blocos, pelo índice UNIQUE)"""
+        existentes = set()
+        for inicio in range(0, len(codigos), 500):
+            bloco = codigos[inicio:inicio + 500]
+            cursor.execute(
+                f"SELECT codigo_retirada FROM pedidos WHERE codigo_retirada IN ({','.join('?' * len(bloco))})",
+                bloco)
+            existentes.update(linha[0] for linha in cursor.fetchall())
+        return existentes
+
+    def _candidatos(self, cursor: sqlite3.Cursor, quantidade: int) -> List[str]:
+        """Próximos códigos: do estoque pré-gerado se houver, senão sorteados na hora"""
+        if not self.tamanho_estoque:
+            return self.gerar(quantidade)
+        with self._lock:
+            if len(self._estoque) < quantidade:
+                novos = list(dict.fromkeys(self.gerar(max(self.tamanho_estoque, quantidade))))
+                existentes = self._existentes(cursor, novos)
+                self._estoque.extend(c for c in novos if c not in existentes)
+            return [self._estoque.popleft() for _ in range(min(quantidade, len(self._estoque)))]
+
+    def alocar_lote(self, cursor: sqlite3.Cursor, quantidade: int) -> List[str]:
+        """Códigos distintos e livres no banco para ``quantidade`` pedidos (na transação do cursor)"""
+        codigos: List[str] = []
+        for _ in range(self.max_tentativas):
+            candidatos = [c for c in dict.fromkeys(self._candidatos(cursor, quantidade - len(codigos)))
+                          if c not in codigos]
+            existentes = self._existentes(cursor, candidatos)
+            self.colisoes += len(existentes)
+            codigos.extend(c for c in candidatos if c not in existentes)
+            if len(codigos) >= quantidade:
+                return codigos[:quantidade]
+        raise sqlite3.IntegrityError('Não foi possível alocar códigos de retirada livres')
+
+    def inserir_com_codigo(self, cursor: sqlite3.Cursor, sql: str, parametros: Iterable) -> str:
+        """Executa o INSERT do pedido com um código novo, sorteando outro em caso de colisão.
+
+        O ``sql`` recebe o código como último parâmetro. Um INSERT que viola
+        o UNIQUE desfaz só o próprio statement, então a transação segue.
+        """
+        parametros = tuple(parametros)
+        ultimo_erro: Optional[sqlite3.IntegrityError] = None
+        for _ in range(self.max_tentativas):
+            codigo = self._candidatos(cursor, 1)[0]
+            try:
+                cursor.execute(sql, parametros + (codigo,))
+                return codigo
+            except sqlite3.IntegrityError as e:
+                if not _colisao_de_codigo(e):
+                    raise
+                self.colisoes += 1
+                ultimo_erro = e
+        raise ultimo_erro
@@ -0,0 +1,187 @@
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict, Any, List
+
+from perfilador import CursorPerfilado, PerfiladorConsultas
+
+
+# Pragmas aplicados em toda conexão nova do pool
+PRAGMAS_PADRAO = {
+    'synchronous': 'NORMAL',        # Seguro em WAL e evita fsync a cada commit
+    'cache_size': -20000,           # ~20 MB de page cache por conexão
+    'mmap_size': 268435456,         # 256 MB de leitura via mmap
+    'temp_store': 'MEMORY',
+}
+
+
+def banco_bloqueado(erro: sqlite3.OperationalError) -> bool:
+    """Indica se o erro é SQLITE_BUSY/SQLITE_LOCKED (banco em uso por outro escritor)"""
+    codigo = getattr(erro, 'sqlite_errorcode', None)
+    if codigo is not None:
+        return (codigo & 0xFF) in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    mensagem = str(erro).lower()
+    return 'locked' in mensagem or 'busy' in mensagem
+
+
+class PooledConnection(sqlite3.Connection):
+    """Conexão SQLite que volta para o pool ao ser fechada"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool: Optional['ConnectionPool'] = None
+        self._perfilador = None
+
+    def cursor(self, factory=None) -> sqlite3.Cursor:
+        """Cursor instrumentado quando o pool tem um perfilador ativo"""
+        if factory is None:
+            factory = CursorPerfilado if self._perfilador is not None else sqlite3.Cursor
+        return super().cursor(factory)
+
+    def execute(self, sql: str, parameters=()) -> sqlite3.Cursor:
+        if self._perfilador is None:
+            return super().execute(sql, parameters)
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, parameters) -> sqlite3.Cursor:
+        if self._perfilador is None:
+            return super().executemany(sql, parameters)
+        return self.cursor().executemany(sql, parameters)
+
+    def close(self) -> None:
+        """Devolve a conexão ao pool em vez de encerrá-la"""
+        if self._pool is not None:
+            self._pool.release(self)
+        else:
+            super().close()
+
+    def fechar_definitivamente(self) -> None:
+        """Encerra a conexão de fato (usado pelo próprio pool)"""
+        self._pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """Pool de conexões SQLite reutilizáveis com afinidade por thread.
+
+    Cada thread tende a receber de volta a mesma conexão que usou antes, o
+    que mantém o cache de páginas e de statements quente. O número total de
+    conexões é limitado por ``tamanho_maximo``; quando todas estão em uso,
+    quem pede uma conexão espera até ``timeout_espera`` segundos.
+    """
+
+    def __init__(self, db_name: str, tamanho_maximo: int = 8, busy_timeout_ms: int = 5000,
+                 timeout_espera: float = 30.0, pragmas: Optional[Dict[str, Any]] = None,
+                 perfilador: Optional[PerfiladorConsultas] = None):
+        self.db_name = db_name
+        self.tamanho_maximo = tamanho_maximo
+        self.busy_timeout_ms = busy_timeout_ms
+        self.timeout_espera = timeout_espera
+        self.pragmas = dict(PRAGMAS_PADRAO if pragmas is None else pragmas)
+        self.perfilador = perfilador   # Aplicado às conexões a cada acquire
+
+        self._cond = threading.Condition()
+        self._ociosas: List[PooledConnection] = []
+        self._todas: List[PooledConnection] = []
+        self._local = threading.local()
+        self._fechado = False
+        self._stats = {'hits': 0, 'misses': 0, 'waits': 0, 'lock_retries': 0}
+
+        # WAL é persistente no arquivo: basta ativar uma vez
+        conn = self._nova_conexao()
+        conn.execute('PRAGMA journal_mode=WAL')
+        self._todas.append(conn)
+        self._ociosas.append(conn)
+
+    def _nova_conexao(self) -> PooledConnection:
+        """Abre uma conexão já configurada com os pragmas do pool"""
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            factory=PooledConnection,
+            cached_statements=256,
+        )
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        for nome, valor in self.pragmas.items():
+            conn.execute(f'PRAGMA {nome} = {valor}')
+        conn._pool = self
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        """Obtém uma conexão, preferindo a última usada por esta thread"""
+        with self._cond:
+            if self._fechado:
+                raise sqlite3.ProgrammingError('Pool de conexões já foi fechado')
+
+            inicio_espera = None
+            while True:
+                preferida = getattr(self._local, 'conexao', None)
+                if preferida is not None and preferida in self._ociosas:
+                    self._ociosas.remove(preferida)
+                    self._stats['hits'] += 1
+                    return self._entregar(preferida)
+
+                if self._ociosas:
+                    conn = self._ociosas.pop()
+                    self._stats['hits'] += 1
+                    return self._entregar(conn)
+
+                if len(self._todas) < self.tamanho_maximo:
+                    conn = self._nova_conexao()
+                    self._todas.append(conn)
+                    self._stats['misses'] += 1
+                    return self._entregar(conn)
+
+                # Pool cheio: aguardar uma conexão ser devolvida
+                if inicio_espera is None:
+                    inicio_espera = time.monotonic()
+                    self._stats['waits'] += 1
+                restante = self.timeout_espera - (time.monotonic() - inicio_espera)
+                if restante <= 0 or not self._cond.wait(restante):
+                    raise sqlite3.OperationalError('Tempo esgotado aguardando conexão do pool')
+                if self._fechado:
+                    raise sqlite3.ProgrammingError('Pool de conexões já foi fechado')
+
+    def _entregar(self, conn: PooledConnection) -> PooledConnection:
+        """Associa a conexão à thread atual e ao perfilador vigente (chamar com lock)"""
+        self._local.conexao = conn
+        conn._perfilador = self.perfilador
+        return conn
+
+    def release(self, conn: PooledConnection) -> None:
+        """Devolve a conexão ao pool, descartando transação pendente"""
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = None
+
+        with self._cond:
+            if self._fechado:
+                conn.fechar_definitivamente()
+                return
+            if conn not in self._ociosas:
+                self._ociosas.append(conn)
+            self._cond.notify()
+
+    def registrar_retentativa(self) -> None:
+        """Contabiliza uma retentativa por banco bloqueado"""
+        with self._cond:
+            self._stats['lock_retries'] += 1
+
+    def estatisticas(self) -> Dict[str, int]:
+        """Retorna contadores do pool"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['abertas'] = len(self._todas)
+            stats['ociosas'] = len(self._ociosas)
+            return stats
+
+    def close_all(self) -> None:
+        """Fecha todas as conexões ociosas e impede novas aquisições"""
+        with self._cond:
+            self._fechado = True
+            for conn in self._ociosas:
+                conn.fechar_definitivamente()
+            self._ociosas.clear()
+            self._todas.clear()
+            self._cond.notify_all()
@@ -1,17 +1,257 @@
 import sqlite3
-from datetime import datetime
+import csv
 import hashlib
+import io
+import json
+import random
+import re
 import secrets
-from typing import Optional, Dict, Any, List, Union
+import math
+import threading
+import time
+from typing import Optional, Dict, Any, List, Union, Callable, TypeVar, Tuple, Iterator
+
+import numpy as np
+
+from cache import CacheVersionado
+from codigos import AlocadorCodigos, normalizar_codigo
+from connection_pool import ConnectionPool, banco_bloqueado
+from escritor import EscritorAgrupado
+from perfilador import PerfiladorConsultas, atribuir_metodo
+from resultados import EsquemaResultado, validar_formato
+from senhas import HasherSenhas
+
+T = TypeVar('T')
+
+# Raio médio da Terra e comprimento de um grau de latitude (km)
+RAIO_TERRA_KM = 6371.0088
+KM_POR_GRAU = 111.32
+
+# Predicado das ofertas visíveis para o consumidor (o mesmo dos índices parciais).
+# Os triggers de status garantem que oferta 'ativa' tem estoque: ao zerar ela
+# passa a 'esgotada' e sai dos índices, então a vitrine só percorre ofertas vivas.
+FILTRO_OFERTAS_ATIVAS = "status = 'ativa'"
+
+# Fim da janela de retirada de um pedido ``p`` da oferta ``o`` (hora local): o
+# horário de fim no dia do pedido, ou no dia seguinte se o pedido veio depois dele
+PRAZO_RETIRADA = """datetime(
+    date(p.criado_em, 'localtime') || ' ' || o.horario_retirada_fim,
+    CASE WHEN o.horario_retirada_fim < time(p.criado_em, 'localtime') THEN '+1 day' ELSE '+0 days' END
+)"""
+
+# Colunas da exportação do histórico de pedidos (cabeçalho do CSV / chaves do JSONL)
+COLUNAS_EXPORTACAO = ('pedido_id', 'codigo_retirada', 'status', 'quantidade', 'valor_total', 'criado_em',
+                      'retirado_em', 'oferta', 'categoria', 'cliente', 'pagamento_metodo', 'pagamento_status')
+FORMATOS_EXPORTACAO = ('csv', 'jsonl')
+
+# Colunas das listagens (na ordem do SELECT) para os formatos 'tupla', 'colunas' e 'dataframe'
+ESQUEMA_OFERTA = EsquemaResultado('Oferta', (
+    ('id', np.int64), ('titulo', object), ('descricao', object), ('categoria', object),
+    ('preco_original', np.float64), ('preco_venda', np.float64), ('estoque', np.int64),
+    ('horario_inicio', object), ('horario_fim', object), ('estabelecimento', object), ('endereco', object),
+    ('latitude', np.float64), ('longitude', np.float64),
+))
+ESQUEMA_PEDIDO_CONSUMIDOR = EsquemaResultado('PedidoConsumidor', (
+    ('id', np.int64), ('codigo', object), ('valor', np.float64), ('status', object), ('data', object),
+    ('oferta', object), ('estabelecimento', object), ('endereco', object),
+    ('horario_inicio', object), ('horario_fim', object),
+))
+ESQUEMA_PEDIDO_ESTABELECIMENTO = EsquemaResultado('PedidoEstabelecimento', (
+    ('id', np.int64), ('codigo', object), ('valor', np.float64), ('status', object), ('data', object),
+    ('oferta', object), ('cliente', object), ('telefone', object),
+))
+
+# Rollups de vendas (pedidos retirados): tabela diária -> (coluna, tipo, expressão de agrupamento).
+# Cada origem entrega linhas (dia, oferta_id, sinal, quantidade, valor_total).
+ROLLUPS_DIARIOS = {
+    'vendas_diarias_oferta': ('oferta_id', 'INTEGER', 'f.oferta_id'),
+    'vendas_diarias_categoria': ('categoria', 'TEXT', 'o.categoria'),
+    'vendas_diarias_estabelecimento': ('estabelecimento_id', 'INTEGER', 'o.estabelecimento_id'),
+}
+
+# Chave de ordenação e direção de cada modo de listagem de ofertas
+ORDENACOES_OFERTAS = {
+    'recentes': ('o.criado_em', 'DESC'),
+    'preco': ('o.preco_venda', 'ASC'),
+    'desconto': ('(1.0 - o.preco_venda / o.preco_original)', 'DESC'),
+}
+
 
 class Database:
-    def __init__(self, db_name: str = 'pega_ai.db'):
+    def __init__(self, db_name: str = 'pega_ai.db', tamanho_pool: int = 8, busy_timeout_ms: int = 5000,
+                 max_tentativas_escrita: int = 5, backoff_base: float = 0.01, backoff_maximo: float = 0.5,
+                 cache_max_entradas: int = 256, perfilador: Optional[PerfiladorConsultas] = None,
+                 senhas: Optional[HasherSenhas] = None, validade_sessao_horas: float = 24 * 7,
+                 codigos: Optional[AlocadorCodigos] = None, escrita_agrupada: bool = False,
+                 tamanho_lote_escrita: int = 64, espera_lote_ms: float = 2.0, ttl_versao_ms: float = 0.0):
         self.db_name = db_name
+        self.max_tentativas_escrita = max_tentativas_escrita
+        self.backoff_base = backoff_base
+        self.backoff_maximo = backoff_maximo
+        self.pool = ConnectionPool(db_name, tamanho_maximo=tamanho_pool, busy_timeout_ms=busy_timeout_ms,
+                                   perfilador=perfilador)
+        self.cache = CacheVersionado(max_entradas=cache_max_entradas)
+        # Padrão (0): toda leitura em cache confere a versão no banco (uma linha pela PK),
+        # então nunca sai estoque mais velho que um incremento de versão. Com
+        # ttl_versao_ms > 0 a versão lida é reaproveitada por esse tempo: escritas deste
+        # processo a descartam na hora, mas as de outros processos só aparecem após o TTL
+        self.ttl_versao_s = ttl_versao_ms / 1000
+        self._versao_lock = threading.Lock()
+        self._versao_conhecida: Optional[Tuple[int, float]] = None   # (versão, válida até)
+        self._geracao_versao = 0
+        self._senhas_proprio = senhas is None
+        self.senhas = senhas or HasherSenhas()
+        self.validade_sessao_horas = validade_sessao_horas
+        self.codigos = codigos or AlocadorCodigos()
+        self.escritor: Optional[EscritorAgrupado] = None
         self.init_database()
+        # Group commit opcional: depois da criação do schema, as escritas passam pela thread do escritor
+        if escrita_agrupada:
+            self.escritor = EscritorAgrupado(
+                self.get_connection, tamanho_lote=tamanho_lote_escrita, espera_ms=espera_lote_ms,
+                max_tentativas=max_tentativas_escrita, backoff_base=backoff_base, backoff_maximo=backoff_maximo,
+                antes_do_commit=lambda cursor: cursor.execute('UPDATE versao_dados SET versao = versao + 1 WHERE id = 1'),
+                ao_retentar=self.pool.registrar_retentativa,
+            )
     
     def get_connection(self) -> sqlite3.Connection:
-        """Cria conexão com o banco"""
-        return sqlite3.connect(self.db_name, check_same_thread=False)
+        """Obtém conexão do pool (close() devolve ao pool)"""
+        return self.pool.acquire()
+    
+    def close(self) -> None:
+        """Fecha todas as conexões do pool (e o pool de hashing, se for deste Database).
+
+        Com escrita agrupada, as escritas já enfileiradas são aplicadas antes.
+        """
+        if self.escritor is not None:
+            self.escritor.close()
+        self.pool.close_all()
+        if self._senhas_proprio:
+            self.senhas.close()
+    
+    @property
+    def perfilador(self) -> Optional[PerfiladorConsultas]:
+        """Perfilador de consultas ativo (None quando desligado)"""
+        return self.pool.perfilador
+    
+    @perfilador.setter
+    def perfilador(self, perfilador: Optional[PerfiladorConsultas]) -> None:
+        # Vale para as conexões entregues pelo pool daqui em diante
+        self.pool.perfilador = perfilador
+    
+    def estatisticas_pool(self) -> Dict[str, int]:
+        """Retorna estatísticas do pool (hits, misses, waits, lock_retries)"""
+        return self.pool.estatisticas()
+    
+    def estatisticas_cache(self) -> Dict[str, int]:
+        """Retorna estatísticas do cache de leituras (hits, misses, evictions)"""
+        return self.cache.estatisticas()
+    
+    def obter_versao_dados(self) -> int:
+        """Versão atual dos dados (compartilhada entre processos via banco)"""
+        conn = self.get_connection()
+        versao = conn.execute('SELECT versao FROM versao_dados WHERE id = 1').fetchone()[0]
+        conn.close()
+        return versao
+    
+    def invalidar_cache(self) -> None:
+        """Incrementa a versão dos dados após escritas feitas por fora da API"""
+        def operacao(cursor: sqlite3.Cursor) -> None:
+            cursor.execute('UPDATE versao_dados SET versao = versao + 1 WHERE id = 1')
+        
+        self._executar_escrita(operacao, versionar=False, metodo='invalidar_cache')
+        self._versao_alterada()
+    
+    def _versao_para_cache(self) -> int:
+        """Versão dos dados para o cache de leituras.
+
+        Com ``ttl_versao_ms=0`` (padrão) consulta o banco a cada leitura. Com
+        TTL > 0 evita essa consulta: escritas deste Database continuam
+        aparecendo na hora, mas as de outros processos (CLI de manutenção,
+        outra instância do app) podem levar até ``ttl_versao_ms`` para
+        aparecer, período em que o cache serve estoque de versões anteriores.
+        """
+        if self.ttl_versao_s <= 0:
+            return self.obter_versao_dados()
+        with self._versao_lock:
+            conhecida, geracao = self._versao_conhecida, self._geracao_versao
+        if conhecida is not None and time.monotonic() < conhecida[1]:
+            return conhecida[0]
+        versao = self.obter_versao_dados()
+        with self._versao_lock:
+            # Se uma escrita terminou durante a leitura, o valor lido pode ser velho
+            if self._geracao_versao == geracao:
+                self._versao_conhecida = (versao, time.monotonic() + self.ttl_versao_s)
+        return versao
+    
+    def _versao_alterada(self) -> None:
+        """Descarta a versão conhecida (chamar depois do COMMIT de uma escrita versionada)"""
+        with self._versao_lock:
+            self._geracao_versao += 1
+            self._versao_conhecida = None
+    
+    def _consultar_com_cache(self, chave: Tuple[Any, ...], consulta: Callable[[], T]) -> T:
+        """Executa a consulta ou reaproveita o resultado da mesma versão dos dados"""
+        versao = self._versao_para_cache()
+        encontrado, valor = self.cache.obter(chave, versao)
+        if not encontrado:
+            valor = consulta()
+            self.cache.guardar(chave, versao, valor)
+        return valor
+    
+    def _executar_escrita(self, operacao: Callable[[sqlite3.Cursor], T], versionar: bool = True, *,
+                          metodo: str) -> T:
+        """Executa uma operação de escrita em transação BEGIN IMMEDIATE.
+
+        Se o banco estiver bloqueado por outro escritor, a transação inteira é
+        desfeita e refeita com backoff exponencial, até ``max_tentativas_escrita``
+        vezes. Outras exceções fazem rollback e são propagadas. Transações que
+        alteraram alguma linha incrementam a versão dos dados (invalida caches),
+        exceto com ``versionar=False`` (escritas que nenhuma leitura em cache usa).
+        
+        Com ``escrita_agrupada``, a operação vai para o EscritorAgrupado e roda
+        num SAVEPOINT dentro da transação do lote, com o mesmo contrato.
+        ``metodo`` é o método público que fez a escrita, usado pelo perfilador
+        de consultas em qualquer thread que execute a operação.
+        """
+        def atribuida(cursor: sqlite3.Cursor) -> T:
+            with atribuir_metodo(metodo):
+                return operacao(cursor)
+        
+        if self.escritor is not None:
+            resultado = self.escritor.executar(atribuida, versionar)
+            if versionar:
+                self._versao_alterada()
+            return resultado
+        
+        tentativa = 0
+        while True:
+            conn = self.get_connection()
+            try:
+                alteracoes_antes = conn.total_changes
+                conn.execute('BEGIN IMMEDIATE')
+                resultado = atribuida(conn.cursor())
+                versionou = versionar and conn.total_changes != alteracoes_antes
+                if versionou:
+                    conn.execute('UPDATE versao_dados SET versao = versao + 1 WHERE id = 1')
+                conn.commit()
+                if versionou:
+                    self._versao_alterada()
+                return resultado
+            except sqlite3.OperationalError as e:
+                conn.rollback()
+                if not banco_bloqueado(e) or tentativa >= self.max_tentativas_escrita:
+                    raise
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+            
+            self.pool.registrar_retentativa()
+            espera = min(self.backoff_maximo, self.backoff_base * (2 ** tentativa))
+            time.sleep(espera + random.uniform(0, espera))
+            tentativa += 1
     
     def init_database(self) -> None:
         """Cria estrutura do banco de dados"""
@@ -76,13 +316,16 @@ class Database:
                 quantidade INTEGER DEFAULT 1,
                 valor_total REAL NOT NULL,
                 codigo_retirada TEXT UNIQUE NOT NULL,
+                estabelecimento_id INTEGER,
                 status TEXT DEFAULT 'reservado' CHECK(status IN ('reservado', 'pago', 'retirado', 'cancelado')),
                 criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 retirado_em TIMESTAMP,
                 FOREIGN KEY (consumidor_id) REFERENCES usuarios(id),
-                FOREIGN KEY (oferta_id) REFERENCES ofertas(id)
+                FOREIGN KEY (oferta_id) REFERENCES ofertas(id),
+                FOREIGN KEY (estabelecimento_id) REFERENCES estabelecimentos(id)
             )
         ''')
+        self._migrar_pedidos_estabelecimento(cursor)
         
         # Tabela de pagamentos
         cursor.execute('''
@@ -98,6 +341,26 @@ class Database:
             )
         ''')
         
+        # Versão dos dados: incrementada a cada escrita, invalida caches de leitura
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS versao_dados (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                versao INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO versao_dados (id, versao) VALUES (1, 0)')
+        
+        # Sessões de login: guarda só o SHA-256 do token entregue ao navegador
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sessoes (
+                token_hash TEXT PRIMARY KEY,
+                usuario_id INTEGER NOT NULL,
+                criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expira_em TIMESTAMP NOT NULL,
+                FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        ''')
+        
         # Tabela de avaliações
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS avaliacoes (
@@ -112,42 +375,635 @@ class Database:
         
         # Índices de Performance
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_ofertas_estabelecimento ON ofertas(estabelecimento_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pedidos_consumidor ON pedidos(consumidor_id)')
+        # Histórico do consumidor por data (substitui o antigo índice só em consumidor_id)
+        cursor.execute('DROP INDEX IF EXISTS idx_pedidos_consumidor')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pedidos_consumidor_criado ON pedidos(consumidor_id, criado_em, id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_pedidos_oferta ON pedidos(oferta_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_pedidos_status ON pedidos(status)')
+        # Histórico da loja por data (exportação e listagens)
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_pedidos_estabelecimento_criado
+            ON pedidos(estabelecimento_id, criado_em, id)
+        ''')
+        # Validação de retirada: código procurado só entre os pedidos da loja
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_pedidos_estabelecimento_codigo
+            ON pedidos(estabelecimento_id, codigo_retirada)
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessoes_expira ON sessoes(expira_em)')
+        
+        # Índices parciais da vitrine: só contêm ofertas ativas com estoque e
+        # já estão na ordem de cada modo de listagem (paginação por keyset)
+        indices_vitrine = {
+            'idx_ofertas_ativas_recentes': 'criado_em, id',
+            'idx_ofertas_ativas_preco': 'preco_venda, id',
+            'idx_ofertas_ativas_desconto': '(1.0 - preco_venda / preco_original), id',
+            'idx_ofertas_ativas_cat_recentes': 'categoria, criado_em, id',
+            'idx_ofertas_ativas_cat_preco': 'categoria, preco_venda, id',
+            'idx_ofertas_ativas_cat_desconto': 'categoria, (1.0 - preco_venda / preco_original), id',
+        }
+        for nome, colunas in indices_vitrine.items():
+            # Índice criado com outro predicado (versões anteriores) é refeito
+            existente = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?",
+                                       (nome,)).fetchone()
+            if existente and not existente[0].endswith(f'WHERE {FILTRO_OFERTAS_ATIVAS}'):
+                cursor.execute(f'DROP INDEX {nome}')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {nome} ON ofertas({colunas}) WHERE {FILTRO_OFERTAS_ATIVAS}')
+        self._criar_transicoes_status_oferta(cursor)
+        self._criar_eventos_pedido(cursor)
+        
+        self.indice_espacial = self._criar_indice_espacial(cursor)
+        self.busca_textual = self._criar_indice_textual(cursor)
+        kpis_novos = self._criar_kpis_estabelecimento(cursor)
+        rollups_novos = self._criar_rollups(cursor)
 
         conn.commit()
         conn.close()
+        
+        if kpis_novos:
+            self.reconstruir_kpis()
+        if rollups_novos:
+            self.reconstruir_rollups()
         print("✅ Banco de dados inicializado com sucesso!")
+
+    def _criar_transicoes_status_oferta(self, cursor: sqlite3.Cursor) -> None:
+        """Triggers que mantêm ofertas.status em dia com o estoque.
+
+        Estoque zerado leva 'ativa' -> 'esgotada'; estoque devolvido (cancelamento,
+        expiração de reserva) leva 'esgotada' -> 'ativa'. 'pausada' não muda.
+        """
+        novos = cursor.execute(
+            "SELECT COUNT(*) = 0 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_ofertas_esgotar'"
+        ).fetchone()[0]
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_ofertas_esgotar
+            AFTER UPDATE OF estoque_atual ON ofertas
+            WHEN NEW.estoque_atual = 0 AND NEW.status = 'ativa'
+            BEGIN
+                UPDATE ofertas SET status = 'esgotada' WHERE id = NEW.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_ofertas_reativar
+            AFTER UPDATE OF estoque_atual ON ofertas
+            WHEN NEW.estoque_atual > 0 AND NEW.status = 'esgotada'
+            BEGIN
+                UPDATE ofertas SET status = 'ativa' WHERE id = NEW.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_ofertas_esgotada_insert
+            AFTER INSERT ON ofertas
+            WHEN NEW.estoque_atual = 0 AND NEW.status = 'ativa'
+            BEGIN
+                UPDATE ofertas SET status = 'esgotada' WHERE id = NEW.id;
+            END
+        ''')
+        if novos:
+            # Ofertas que já estavam sem estoque antes dos triggers existirem
+            cursor.execute("UPDATE ofertas SET status = 'esgotada' WHERE status = 'ativa' AND estoque_atual = 0")
+
+    def _migrar_pedidos_estabelecimento(self, cursor: sqlite3.Cursor) -> None:
+        """Garante a coluna pedidos.estabelecimento_id (cópia de ofertas.estabelecimento_id).
+
+        Bancos antigos ganham a coluna e são preenchidos aqui; o trigger cobre
+        INSERTs que não informam a loja (a API informa e não paga o UPDATE).
+        """
+        colunas = {linha[1] for linha in cursor.execute('PRAGMA table_info(pedidos)')}
+        if 'estabelecimento_id' not in colunas:
+            cursor.execute('ALTER TABLE pedidos ADD COLUMN estabelecimento_id INTEGER REFERENCES estabelecimentos(id)')
+            cursor.execute('''
+                UPDATE pedidos
+                SET estabelecimento_id = (SELECT estabelecimento_id FROM ofertas WHERE id = pedidos.oferta_id)
+            ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_pedidos_estabelecimento
+            AFTER INSERT ON pedidos
+            WHEN NEW.estabelecimento_id IS NULL
+            BEGIN
+                UPDATE pedidos
+                SET estabelecimento_id = (SELECT estabelecimento_id FROM ofertas WHERE id = NEW.oferta_id)
+                WHERE id = NEW.id;
+            END
+        ''')
+
+    def _criar_eventos_pedido(self, cursor: sqlite3.Cursor) -> None:
+        """Log append-only de eventos de pedidos (criação e mudanças de status).
+
+        Os triggers gravam o evento no mesmo statement (e transação) da escrita
+        em pedidos, cobrindo criar_pedido, validar_retirada, cancelar_pedido e
+        as versões em lote. Como o SQLite tem um único escritor, os ids saem na
+        ordem de commit: quem lê "eventos com id > cursor" nunca pula um evento.
+        AUTOINCREMENT impede que ids sejam reaproveitados após a poda.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS eventos_pedido (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pedido_id INTEGER NOT NULL,
+                estabelecimento_id INTEGER,
+                status_anterior TEXT,
+                status TEXT NOT NULL,
+                criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_eventos_pedido_estabelecimento
+            ON eventos_pedido(estabelecimento_id, id)
+        ''')
+        triggers = {
+            # A loja pode ainda não estar preenchida (trg_pedidos_estabelecimento)
+            'trg_eventos_pedido_insert': '''
+                AFTER INSERT ON pedidos
+                BEGIN
+                    INSERT INTO eventos_pedido (pedido_id, estabelecimento_id, status)
+                    VALUES (NEW.id, COALESCE(NEW.estabelecimento_id,
+                                             (SELECT estabelecimento_id FROM ofertas WHERE id = NEW.oferta_id)),
+                            NEW.status);
+                END''',
+            'trg_eventos_pedido_status': '''
+                AFTER UPDATE OF status ON pedidos
+                WHEN NEW.status != OLD.status
+                BEGIN
+                    INSERT INTO eventos_pedido (pedido_id, estabelecimento_id, status_anterior, status)
+                    VALUES (NEW.id, NEW.estabelecimento_id, OLD.status, NEW.status);
+                END''',
+        }
+        for nome, corpo in triggers.items():
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {nome} {corpo}')
+
+    def _criar_indice_espacial(self, cursor: sqlite3.Cursor) -> str:
+        """Cria a R-tree de estabelecimentos e os triggers que a mantêm em dia.
+
+        Retorna 'rtree' ou, se o SQLite não tiver o módulo R-tree, 'btree'
+        (índice composto em latitude/longitude usado no mesmo pré-filtro).
+        """
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS estabelecimentos_rtree
+                USING rtree(id, min_lat, max_lat, min_lon, max_lon)
+            ''')
+        except sqlite3.OperationalError:
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_estabelecimentos_lat_lon ON estabelecimentos(latitude, longitude)')
+            return 'btree'
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_estabelecimentos_rtree_insert
+            AFTER INSERT ON estabelecimentos
+            WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+            BEGIN
+                INSERT OR REPLACE INTO estabelecimentos_rtree
+                VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_estabelecimentos_rtree_update
+            AFTER UPDATE OF latitude, longitude ON estabelecimentos
+            BEGIN
+                DELETE FROM estabelecimentos_rtree WHERE id = OLD.id;
+                INSERT INTO estabelecimentos_rtree
+                SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+                WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_estabelecimentos_rtree_delete
+            AFTER DELETE ON estabelecimentos
+            BEGIN
+                DELETE FROM estabelecimentos_rtree WHERE id = OLD.id;
+            END
+        ''')
+        
+        # Estabelecimentos criados antes da R-tree existir
+        cursor.execute('''
+            INSERT INTO estabelecimentos_rtree
+            SELECT id, latitude, latitude, longitude, longitude
+            FROM estabelecimentos
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+              AND id NOT IN (SELECT id FROM estabelecimentos_rtree)
+        ''')
+        return 'rtree'
+    
+    def _criar_indice_textual(self, cursor: sqlite3.Cursor) -> str:
+        """Cria o índice FTS5 de ofertas e os triggers que o mantêm em dia.
+
+        O tokenizador unicode61 com remove_diacritics torna a busca insensível
+        a acentos ("pao" encontra "pão"). Retorna 'fts5' ou 'like' quando o
+        SQLite não tem FTS5 (busca por LIKE, sem ranking).
+        """
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS ofertas_fts
+                USING fts5(titulo, descricao, estabelecimento, tokenize = 'unicode61 remove_diacritics 2')
+            ''')
+        except sqlite3.OperationalError:
+            return 'like'
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_ofertas_fts_insert
+            AFTER INSERT ON ofertas
+            BEGIN
+                INSERT INTO ofertas_fts (rowid, titulo, descricao, estabelecimento)
+                VALUES (NEW.id, NEW.titulo, COALESCE(NEW.descricao, ''),
+                        (SELECT nome_fantasia FROM estabelecimentos WHERE id = NEW.estabelecimento_id));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_ofertas_fts_update
+            AFTER UPDATE OF titulo, descricao, estabelecimento_id ON ofertas
+            BEGIN
+                DELETE FROM ofertas_fts WHERE rowid = OLD.id;
+                INSERT INTO ofertas_fts (rowid, titulo, descricao, estabelecimento)
+                VALUES (NEW.id, NEW.titulo, COALESCE(NEW.descricao, ''),
+                        (SELECT nome_fantasia FROM estabelecimentos WHERE id = NEW.estabelecimento_id));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_ofertas_fts_delete
+            AFTER DELETE ON ofertas
+            BEGIN
+                DELETE FROM ofertas_fts WHERE rowid = OLD.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_estabelecimentos_fts_update
+            AFTER UPDATE OF nome_fantasia ON estabelecimentos
+            BEGIN
+                UPDATE ofertas_fts SET estabelecimento = NEW.nome_fantasia
+                WHERE rowid IN (SELECT id FROM ofertas WHERE estabelecimento_id = NEW.id);
+            END
+        ''')
+        
+        # Ofertas criadas antes do índice existir
+        cursor.execute('''
+            INSERT INTO ofertas_fts (rowid, titulo, descricao, estabelecimento)
+            SELECT o.id, o.titulo, COALESCE(o.descricao, ''), e.nome_fantasia
+            FROM ofertas o
+            LEFT JOIN estabelecimentos e ON o.estabelecimento_id = e.id
+            WHERE o.id NOT IN (SELECT rowid FROM ofertas_fts)
+        ''')
+        return 'fts5'
+    
+    def _criar_kpis_estabelecimento(self, cursor: sqlite3.Cursor) -> bool:
+        """Cria a tabela de KPIs por estabelecimento e os triggers que a mantêm.
+
+        Os contadores são ajustados por delta a cada escrita em pedidos e
+        ofertas, no mesmo statement. Retorna True se a tabela acabou de ser
+        criada (e precisa ser preenchida com ``reconstruir_kpis``).
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'kpis_estabelecimento'")
+        ja_existia = cursor.fetchone() is not None
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS kpis_estabelecimento (
+                estabelecimento_id INTEGER PRIMARY KEY,
+                total_pedidos INTEGER NOT NULL DEFAULT 0,
+                receita_retirada REAL NOT NULL DEFAULT 0,
+                ofertas_ativas INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (estabelecimento_id) REFERENCES estabelecimentos(id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # Oferta "ativa" para o dashboard: mesmo critério da vitrine
+        ativa_new = "(NEW.status = 'ativa' AND NEW.estoque_atual > 0)"
+        ativa_old = "(OLD.status = 'ativa' AND OLD.estoque_atual > 0)"
+        est_do_pedido = "(SELECT estabelecimento_id FROM ofertas WHERE id = {}.oferta_id)"
+        
+        triggers = {
+            'trg_kpis_estabelecimento_insert': '''
+                AFTER INSERT ON estabelecimentos
+                BEGIN
+                    INSERT OR IGNORE INTO kpis_estabelecimento (estabelecimento_id) VALUES (NEW.id);
+                END''',
+            'trg_kpis_pedido_insert': f'''
+                AFTER INSERT ON pedidos
+                BEGIN
+                    UPDATE kpis_estabelecimento
+                    SET total_pedidos = total_pedidos + 1,
+                        receita_retirada = receita_retirada
+                            + CASE WHEN NEW.status = 'retirado' THEN NEW.valor_total ELSE 0 END
+                    WHERE estabelecimento_id = {est_do_pedido.format('NEW')};
+                END''',
+            'trg_kpis_pedido_status': f'''
+                AFTER UPDATE OF status ON pedidos
+                WHEN (NEW.status = 'retirado') != (OLD.status = 'retirado')
+                BEGIN
+                    UPDATE kpis_estabelecimento
+                    SET receita_retirada = receita_retirada
+                        + CASE WHEN NEW.status = 'retirado' THEN NEW.valor_total ELSE -OLD.valor_total END
+                    WHERE estabelecimento_id = {est_do_pedido.format('NEW')};
+                END''',
+            'trg_kpis_pedido_delete': f'''
+                AFTER DELETE ON pedidos
+                BEGIN
+                    UPDATE kpis_estabelecimento
+                    SET total_pedidos = total_pedidos - 1,
+                        receita_retirada = receita_retirada
+                            - CASE WHEN OLD.status = 'retirado' THEN OLD.valor_total ELSE 0 END
+                    WHERE estabelecimento_id = {est_do_pedido.format('OLD')};
+                END''',
+            'trg_kpis_oferta_insert': f'''
+                AFTER INSERT ON ofertas
+                WHEN {ativa_new}
+                BEGIN
+                    UPDATE kpis_estabelecimento SET ofertas_ativas = ofertas_ativas + 1
+                    WHERE estabelecimento_id = NEW.estabelecimento_id;
+                END''',
+            'trg_kpis_oferta_update': f'''
+                AFTER UPDATE OF status, estoque_atual, estabelecimento_id ON ofertas
+                WHEN {ativa_new} != {ativa_old} OR NEW.estabelecimento_id != OLD.estabelecimento_id
+                BEGIN
+                    UPDATE kpis_estabelecimento SET ofertas_ativas = ofertas_ativas - {ativa_old}
+                    WHERE estabelecimento_id = OLD.estabelecimento_id;
+                    UPDATE kpis_estabelecimento SET ofertas_ativas = ofertas_ativas + {ativa_new}
+                    WHERE estabelecimento_id = NEW.estabelecimento_id;
+                END''',
+            'trg_kpis_oferta_delete': f'''
+                AFTER DELETE ON ofertas
+                WHEN {ativa_old}
+                BEGIN
+                    UPDATE kpis_estabelecimento SET ofertas_ativas = ofertas_ativas - 1
+                    WHERE estabelecimento_id = OLD.estabelecimento_id;
+                END''',
+        }
+        for nome, corpo in triggers.items():
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {nome} {corpo}')
+        
+        return not ja_existia
+    
+    def reconstruir_kpis(self) -> int:
+        """Recalcula kpis_estabelecimento do zero a partir de pedidos e ofertas.
+
+        Retorna o número de estabelecimentos recalculados.
+        """
+        def operacao(cursor: sqlite3.Cursor) -> int:
+            cursor.execute('DELETE FROM kpis_estabelecimento')
+            cursor.execute('''
+                INSERT INTO kpis_estabelecimento (estabelecimento_id, total_pedidos, receita_retirada, ofertas_ativas)
+                SELECT e.id,
+                       COALESCE(p.total_pedidos, 0),
+                       COALESCE(p.receita_retirada, 0),
+                       COALESCE(o.ofertas_ativas, 0)
+                FROM estabelecimentos e
+                LEFT JOIN (
+                    SELECT o.estabelecimento_id,
+                           COUNT(*) AS total_pedidos,
+                           SUM(CASE WHEN p.status = 'retirado' THEN p.valor_total ELSE 0 END) AS receita_retirada
+                    FROM pedidos p
+                    JOIN ofertas o ON p.oferta_id = o.id
+                    GROUP BY o.estabelecimento_id
+                ) p ON p.estabelecimento_id = e.id
+                LEFT JOIN (
+                    SELECT estabelecimento_id, COUNT(*) AS ofertas_ativas
+                    FROM ofertas
+                    WHERE status = 'ativa' AND estoque_atual > 0
+                    GROUP BY estabelecimento_id
+                ) o ON o.estabelecimento_id = e.id
+            ''')
+            return cursor.rowcount
+        
+        return self._executar_escrita(operacao, metodo='reconstruir_kpis')
+    
+    def _criar_rollups(self, cursor: sqlite3.Cursor) -> bool:
+        """Cria as tabelas de rollup de vendas e a fila que as alimenta.
+
+        Triggers em pedidos registram em ``fila_rollup`` cada pedido que passa
+        a (ou deixa de) contar como retirado; ``atualizar_rollups`` consome a
+        fila a partir da marca d'água em ``controle_rollup``. Retorna True se
+        as tabelas acabaram de ser criadas ou ganharam colunas (e precisam de
+        ``reconstruir_rollups``).
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'controle_rollup'")
+        ja_existia = cursor.fetchone() is not None
+        
+        for tabela, (coluna, tipo, _) in ROLLUPS_DIARIOS.items():
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {tabela} (
+                    dia TEXT NOT NULL,
+                    {coluna} {tipo} NOT NULL,
+                    pedidos INTEGER NOT NULL DEFAULT 0,
+                    vendidos INTEGER NOT NULL DEFAULT 0,
+                    receita REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (dia, {coluna})
+                ) WITHOUT ROWID
+            ''')
+        
+        # Totais acumulados por oferta (somas dos quadrados para desvio padrão e ANOVA)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS vendas_acumuladas_oferta (
+                oferta_id INTEGER PRIMARY KEY,
+                pedidos INTEGER NOT NULL DEFAULT 0,
+                vendidos INTEGER NOT NULL DEFAULT 0,
+                receita REAL NOT NULL DEFAULT 0,
+                receita_quadrados REAL NOT NULL DEFAULT 0,
+                ticket_min REAL,
+                ticket_max REAL,
+                vendidos_quadrados INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        colunas = {linha[1] for linha in cursor.execute('PRAGMA table_info(vendas_acumuladas_oferta)')}
+        migrou = 'vendidos_quadrados' not in colunas
+        if migrou:
+            cursor.execute('ALTER TABLE vendas_acumuladas_oferta ADD COLUMN vendidos_quadrados INTEGER NOT NULL DEFAULT 0')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS fila_rollup (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pedido_id INTEGER NOT NULL,
+                oferta_id INTEGER NOT NULL,
+                dia TEXT NOT NULL,
+                sinal INTEGER NOT NULL,
+                quantidade INTEGER NOT NULL,
+                valor_total REAL NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS controle_rollup (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                ultimo_evento INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO controle_rollup (id, ultimo_evento) VALUES (1, 0)')
+        
+        evento = '''
+            INSERT INTO fila_rollup (pedido_id, oferta_id, dia, sinal, quantidade, valor_total)
+            VALUES ({p}.id, {p}.oferta_id, DATE({p}.criado_em), {sinal}, COALESCE({p}.quantidade, 1), {p}.valor_total);
+        '''
+        triggers = {
+            'trg_rollup_pedido_insert': f'''
+                AFTER INSERT ON pedidos
+                WHEN NEW.status = 'retirado'
+                BEGIN
+                    {evento.format(p='NEW', sinal=1)}
+                END''',
+            'trg_rollup_pedido_retirado': f'''
+                AFTER UPDATE OF status ON pedidos
+                WHEN NEW.status = 'retirado' AND OLD.status != 'retirado'
+                BEGIN
+                    {evento.format(p='NEW', sinal=1)}
+                END''',
+            'trg_rollup_pedido_estorno': f'''
+                AFTER UPDATE OF status ON pedidos
+                WHEN OLD.status = 'retirado' AND NEW.status != 'retirado'
+                BEGIN
+                    {evento.format(p='OLD', sinal=-1)}
+                END''',
+            'trg_rollup_pedido_delete': f'''
+                AFTER DELETE ON pedidos
+                WHEN OLD.status = 'retirado'
+                BEGIN
+                    {evento.format(p='OLD', sinal=-1)}
+                END''',
+        }
+        for nome, corpo in triggers.items():
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {nome} {corpo}')
+        
+        return not ja_existia or migrou
+    
+    def _acumular_rollups(self, cursor: sqlite3.Cursor, origem: str, params: Tuple[Any, ...] = ()) -> None:
+        """Soma nas tabelas de rollup as linhas (dia, oferta_id, sinal, quantidade, valor_total) da origem"""
+        for tabela, (coluna, _, expressao) in ROLLUPS_DIARIOS.items():
+            cursor.execute(f'''
+                INSERT INTO {tabela} (dia, {coluna}, pedidos, vendidos, receita)
+                SELECT f.dia, {expressao}, SUM(f.sinal), SUM(f.sinal * f.quantidade), SUM(f.sinal * f.valor_total)
+                FROM ({origem}) f
+                JOIN ofertas o ON o.id = f.oferta_id
+                GROUP BY f.dia, {expressao}
+                ON CONFLICT (dia, {coluna}) DO UPDATE SET
+                    pedidos = pedidos + excluded.pedidos,
+                    vendidos = vendidos + excluded.vendidos,
+                    receita = receita + excluded.receita
+            ''', params)
+        
+        cursor.execute(f'''
+            INSERT INTO vendas_acumuladas_oferta
+                (oferta_id, pedidos, vendidos, vendidos_quadrados, receita, receita_quadrados,
+                 ticket_min, ticket_max)
+            SELECT f.oferta_id, SUM(f.sinal), SUM(f.sinal * f.quantidade), SUM(f.sinal * f.quantidade * f.quantidade),
+                   SUM(f.sinal * f.valor_total), SUM(f.sinal * f.valor_total * f.valor_total),
+                   MIN(CASE WHEN f.sinal > 0 THEN f.valor_total END),
+                   MAX(CASE WHEN f.sinal > 0 THEN f.valor_total END)
+            FROM ({origem}) f
+            GROUP BY f.oferta_id
+            ON CONFLICT (oferta_id) DO UPDATE SET
+                pedidos = pedidos + excluded.pedidos,
+                vendidos = vendidos + excluded.vendidos,
+                vendidos_quadrados = vendidos_quadrados + excluded.vendidos_quadrados,
+                receita = receita + excluded.receita,
+                receita_quadrados = receita_quadrados + excluded.receita_quadrados,
+                ticket_min = MIN(COALESCE(ticket_min, excluded.ticket_min), COALESCE(excluded.ticket_min, ticket_min)),
+                ticket_max = MAX(COALESCE(ticket_max, excluded.ticket_max), COALESCE(excluded.ticket_max, ticket_max))
+        ''', params)
+    
+    def atualizar_rollups(self) -> int:
+        """Aplica aos rollups os eventos da fila posteriores à marca d'água.
+
+        Retorna o número de eventos processados. Sem eventos pendentes não
+        abre transação de escrita.
+        """
+        conn = self.get_connection()
+        pendente = conn.execute('''
+            SELECT EXISTS (SELECT 1 FROM fila_rollup WHERE id > (SELECT ultimo_evento FROM controle_rollup))
+        ''').fetchone()[0]
+        conn.close()
+        if not pendente:
+            return 0
+        
+        def operacao(cursor: sqlite3.Cursor) -> int:
+            cursor.execute('SELECT ultimo_evento FROM controle_rollup WHERE id = 1')
+            inicio = cursor.fetchone()[0]
+            cursor.execute('SELECT MAX(id), COUNT(*) FROM fila_rollup WHERE id > ?', (inicio,))
+            fim, total = cursor.fetchone()
+            if not total:
+                return 0
+            
+            origem = '''
+                SELECT dia, oferta_id, sinal, quantidade, valor_total
+                FROM fila_rollup WHERE id > ? AND id <= ?
+            '''
+            self._acumular_rollups(cursor, origem, (inicio, fim))
+            
+            # Estornos podem remover o mínimo/máximo: recalcula essas ofertas na origem
+            cursor.execute('''
+                UPDATE vendas_acumuladas_oferta
+                SET (ticket_min, ticket_max) = (
+                    SELECT MIN(valor_total), MAX(valor_total) FROM pedidos
+                    WHERE oferta_id = vendas_acumuladas_oferta.oferta_id AND status = 'retirado'
+                )
+                WHERE oferta_id IN (SELECT oferta_id FROM fila_rollup WHERE id > ? AND id <= ? AND sinal < 0)
+            ''', (inicio, fim))
+            
+            cursor.execute('UPDATE controle_rollup SET ultimo_evento = ? WHERE id = 1', (fim,))
+            cursor.execute('DELETE FROM fila_rollup WHERE id <= ?', (fim,))
+            return total
+        
+        # Nenhuma leitura em cache usa os rollups: drenar a fila não invalida os caches
+        return self._executar_escrita(operacao, versionar=False, metodo='atualizar_rollups')
+    
+    def reconstruir_rollups(self) -> int:
+        """Recalcula todos os rollups de vendas em lote a partir de pedidos.
+
+        Retorna o número de linhas de vendas diárias por oferta geradas.
+        """
+        def operacao(cursor: sqlite3.Cursor) -> int:
+            for tabela in [*ROLLUPS_DIARIOS, 'vendas_acumuladas_oferta']:
+                cursor.execute(f'DELETE FROM {tabela}')
+            
+            # Os eventos já na fila estão refletidos em pedidos: avança a marca d'água
+            cursor.execute('''
+                UPDATE controle_rollup
+                SET ultimo_evento = MAX(ultimo_evento, (SELECT COALESCE(MAX(id), 0) FROM fila_rollup))
+                WHERE id = 1
+            ''')
+            cursor.execute('DELETE FROM fila_rollup')
+            
+            self._acumular_rollups(cursor, '''
+                SELECT DATE(criado_em) AS dia, oferta_id, 1 AS sinal,
+                       COALESCE(quantidade, 1) AS quantidade, valor_total
+                FROM pedidos WHERE status = 'retirado'
+            ''')
+            cursor.execute('SELECT COUNT(*) FROM vendas_diarias_oferta')
+            return cursor.fetchone()[0]
+        
+        return self._executar_escrita(operacao, metodo='reconstruir_rollups')
     
     def hash_senha(self, senha: str, salt: Optional[str] = None) -> str:
-        """Gera hash SHA256 da senha com salt."""
-        if salt is None:
-            salt = secrets.token_hex(16)
-        hash_obj = hashlib.sha256((salt + senha).encode()).hexdigest()
-        return f"{salt}${hash_obj}"
+        """Gera o hash da senha com o KDF configurado (no pool de hashing)"""
+        return self.senhas.gerar(senha, salt)
     
     def criar_usuario(self, nome: str, email: str, senha: str, tipo: str, telefone: Optional[str] = None) -> Optional[int]:
         """Cria um novo usuário"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        senha_hash = self.hash_senha(senha)
         
-        try:
+        def operacao(cursor: sqlite3.Cursor) -> int:
             cursor.execute('''
                 INSERT INTO usuarios (nome, email, senha, tipo, telefone)
                 VALUES (?, ?, ?, ?, ?)
-            ''', (nome, email, self.hash_senha(senha), tipo, telefone))
-            
-            user_id = cursor.lastrowid
-            conn.commit()
-            return user_id
+            ''', (nome, email, senha_hash, tipo, telefone))
+            return cursor.lastrowid
+        
+        try:
+            return self._executar_escrita(operacao, metodo='criar_usuario')
         except sqlite3.IntegrityError:
             return None
-        finally:
-            conn.close()
     
     def autenticar_usuario(self, email: str, senha: str) -> Optional[Dict[str, Any]]:
-        """Autentica usuário e retorna seus dados"""
+        """Autentica usuário e retorna seus dados.
+
+        Hashes em formato antigo (SHA-256 com ou sem salt) ou com custo
+        diferente do configurado são refeitos com o KDF atual após o login.
+        """
+        user, refazer = self._conferir_credenciais(email, senha)
+        if refazer:
+            self._executar_escrita(refazer, versionar=False, metodo='autenticar_usuario')
+        return user
+    
+    def _conferir_credenciais(self, email: str, senha: str) -> Tuple[Optional[Dict[str, Any]], Optional[Callable[[sqlite3.Cursor], None]]]:
+        """Só leitura: confere a senha e retorna (usuário, operação de rehash ou None).
+
+        A operação de rehash, quando existe, já traz o novo hash calculado e
+        deve ser aplicada como escrita (autenticar_usuario faz isso; o
+        AsyncDatabase a envia à thread escritora).
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
         
@@ -160,136 +1016,385 @@ class Database:
         user = cursor.fetchone()
         conn.close()
         
-        if user:
-            stored_hash = user[3]
-
-            # Verificar se é hash legado (sem salt/delimitador $)
-            if '$' not in stored_hash:
-                if hashlib.sha256(senha.encode()).hexdigest() == stored_hash:
-                    # Opcional: Atualizar senha para novo formato
-                    return {
-                        'id': user[0],
-                        'nome': user[1],
-                        'email': user[2],
-                        'tipo': user[4]
-                    }
-            else:
-                try:
-                    salt = stored_hash.split('$')[0]
-                    if self.hash_senha(senha, salt) == stored_hash:
-                        return {
-                            'id': user[0],
-                            'nome': user[1],
-                            'email': user[2],
-                            'tipo': user[4]
-                        }
-                except (ValueError, IndexError):
-                    pass
-
-        return None
+        if not user:
+            return None, None
+        
+        confere, refazer = self.senhas.verificar(senha, user[3])
+        if not confere:
+            return None, None
+        
+        operacao = None
+        if refazer:
+            novo_hash = self.hash_senha(senha)
+            
+            def operacao(cursor: sqlite3.Cursor) -> None:
+                # Só troca se ninguém alterou a senha no meio tempo
+                cursor.execute('UPDATE usuarios SET senha = ? WHERE id = ? AND senha = ?',
+                               (novo_hash, user[0], user[3]))
+        
+        return {
+            'id': user[0],
+            'nome': user[1],
+            'email': user[2],
+            'tipo': user[4]
+        }, operacao
     
-    def criar_estabelecimento(self, usuario_id: int, nome_fantasia: str, cnpj: str, endereco: str, latitude: float, longitude: float) -> Optional[int]:
-        """Cria perfil de estabelecimento"""
+    # ---------- Sessões ----------
+    @staticmethod
+    def _hash_token(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+    
+    def criar_sessao(self, usuario_id: int) -> str:
+        """Abre uma sessão para o usuário e retorna o token (só o hash fica no banco)"""
+        token = secrets.token_urlsafe(32)
+        
+        def operacao(cursor: sqlite3.Cursor) -> None:
+            cursor.execute("DELETE FROM sessoes WHERE expira_em <= datetime('now')")
+            cursor.execute('''
+                INSERT INTO sessoes (token_hash, usuario_id, expira_em)
+                VALUES (?, ?, datetime('now', ?))
+            ''', (self._hash_token(token), usuario_id, f'+{self.validade_sessao_horas * 3600:.0f} seconds'))
+        
+        self._executar_escrita(operacao, versionar=False, metodo='criar_sessao')
+        return token
+    
+    def validar_sessao(self, token: str) -> Optional[Dict[str, Any]]:
+        """Retorna o usuário da sessão se o token for válido e não tiver expirado"""
         conn = self.get_connection()
-        cursor = conn.cursor()
+        user = conn.execute('''
+            SELECT u.id, u.nome, u.email, u.tipo
+            FROM sessoes s
+            JOIN usuarios u ON u.id = s.usuario_id
+            WHERE s.token_hash = ? AND s.expira_em > datetime('now')
+        ''', (self._hash_token(token),)).fetchone()
+        conn.close()
         
-        try:
+        if not user:
+            return None
+        return {'id': user[0], 'nome': user[1], 'email': user[2], 'tipo': user[3]}
+    
+    def encerrar_sessao(self, token: str) -> None:
+        """Invalida o token (logout)"""
+        def operacao(cursor: sqlite3.Cursor) -> None:
+            cursor.execute('DELETE FROM sessoes WHERE token_hash = ?', (self._hash_token(token),))
+        
+        self._executar_escrita(operacao, versionar=False, metodo='encerrar_sessao')
+    
+    def criar_estabelecimento(self, usuario_id: int, nome_fantasia: str, cnpj: str, endereco: str, latitude: float, longitude: float) -> Optional[int]:
+        """Cria perfil de estabelecimento"""
+        def operacao(cursor: sqlite3.Cursor) -> int:
             cursor.execute('''
                 INSERT INTO estabelecimentos (usuario_id, nome_fantasia, cnpj, endereco, latitude, longitude)
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (usuario_id, nome_fantasia, cnpj, endereco, latitude, longitude))
-            
-            est_id = cursor.lastrowid
-            conn.commit()
-            return est_id
+            return cursor.lastrowid
+        
+        try:
+            return self._executar_escrita(operacao, metodo='criar_estabelecimento')
         except sqlite3.IntegrityError:
             return None
-        finally:
-            conn.close()
     
     def criar_oferta(self, estabelecimento_id: int, titulo: str, descricao: str, categoria: str, preco_original: float,
                      preco_venda: float, estoque: int, horario_inicio: str, horario_fim: str) -> int:
         """Cria uma nova oferta"""
+        def operacao(cursor: sqlite3.Cursor) -> int:
+            cursor.execute('''
+                INSERT INTO ofertas (estabelecimento_id, titulo, descricao, categoria, preco_original, 
+                                    preco_venda, estoque_inicial, estoque_atual, 
+                                    horario_retirada_inicio, horario_retirada_fim)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (estabelecimento_id, titulo, descricao, categoria, preco_original, 
+                  preco_venda, estoque, estoque, horario_inicio, horario_fim))
+            return cursor.lastrowid
+        
+        return self._executar_escrita(operacao, metodo='criar_oferta')
+    
+    def _oferta_para_dict(self, o: tuple) -> Dict[str, Any]:
+        """Converte linha de oferta (colunas da vitrine) em dicionário"""
+        return {
+            'id': o[0], 'titulo': o[1], 'descricao': o[2], 'categoria': o[3],
+            'preco_original': o[4], 'preco_venda': o[5], 'estoque': o[6],
+            'horario_inicio': o[7], 'horario_fim': o[8],
+            'estabelecimento': o[9], 'endereco': o[10],
+            'latitude': o[11], 'longitude': o[12]
+        }
+    
+    def listar_ofertas_ativas(self, formato: str = 'dict') -> Any:
+        """Lista todas ofertas ativas com estoque.
+
+        ``formato`` segue resultados.FORMATOS_RESULTADO. 'dict' e 'tupla' ficam
+        em cache até a próxima escrita; 'colunas' e 'dataframe' (leituras em
+        massa, objetos mutáveis) consultam o banco a cada chamada.
+        """
+        validar_formato(formato)
+        if formato in ('colunas', 'dataframe'):
+            return self._listar_ofertas_ativas(formato)
+        chave = ('listar_ofertas_ativas',) if formato == 'dict' else ('listar_ofertas_ativas', formato)
+        ofertas = self._consultar_com_cache(chave, lambda: self._listar_ofertas_ativas(formato))
+        # Cópia de cada linha: o chamador pode alterar o dict sem corromper o cache (tuplas são imutáveis)
+        return [dict(o) for o in ofertas] if formato == 'dict' else list(ofertas)
+    
+    def _listar_ofertas_ativas(self, formato: str = 'dict') -> Any:
+        """Consulta sem cache de listar_ofertas_ativas"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
-            INSERT INTO ofertas (estabelecimento_id, titulo, descricao, categoria, preco_original, 
-                                preco_venda, estoque_inicial, estoque_atual, 
-                                horario_retirada_inicio, horario_retirada_fim)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (estabelecimento_id, titulo, descricao, categoria, preco_original, 
-              preco_venda, estoque, estoque, horario_inicio, horario_fim))
+            SELECT o.id, o.titulo, o.descricao, o.categoria, o.preco_original, o.preco_venda,
+                   o.estoque_atual, o.horario_retirada_inicio, o.horario_retirada_fim,
+                   e.nome_fantasia, e.endereco, e.latitude, e.longitude
+            FROM ofertas o
+            JOIN estabelecimentos e ON o.estabelecimento_id = e.id
+            WHERE o.status = 'ativa'
+            ORDER BY o.criado_em DESC
+        ''')
         
-        oferta_id = cursor.lastrowid
-        conn.commit()
+        ofertas = cursor.fetchall()
         conn.close()
         
-        return oferta_id
+        if formato != 'dict':
+            return ESQUEMA_OFERTA.montar(ofertas, formato)
+        return [self._oferta_para_dict(o) for o in ofertas]
     
-    def listar_ofertas_ativas(self) -> List[Dict[str, Any]]:
-        """Lista todas ofertas ativas com estoque"""
+    def buscar_ofertas(self, categoria: Optional[str] = None, preco_max: Optional[float] = None,
+                       ordenacao: str = 'recentes', cursor: Optional[Tuple[Any, int]] = None,
+                       limite: int = 20) -> Dict[str, Any]:
+        """Busca uma página de ofertas ativas com filtros e ordenação feitos no SQL.
+
+        ``ordenacao`` é 'recentes', 'preco' ou 'desconto'. A paginação é por
+        keyset: passe o ``proximo_cursor`` da página anterior para obter a
+        seguinte. Retorna {'ofertas': [...], 'proximo_cursor': tupla ou None}.
+        Cada página fica em cache até a próxima escrita.
+        """
+        if ordenacao not in ORDENACOES_OFERTAS:
+            raise ValueError(f"Ordenação inválida: {ordenacao}")
+        
+        chave_cache = ('buscar_ofertas', categoria, preco_max, ordenacao,
+                       tuple(cursor) if cursor is not None else None, limite)
+        pagina = self._consultar_com_cache(
+            chave_cache, lambda: self._buscar_ofertas(categoria, preco_max, ordenacao, cursor, limite)
+        )
+        return {'ofertas': [dict(o) for o in pagina['ofertas']], 'proximo_cursor': pagina['proximo_cursor']}
+    
+    def _buscar_ofertas(self, categoria: Optional[str], preco_max: Optional[float], ordenacao: str,
+                        cursor: Optional[Tuple[Any, int]], limite: int) -> Dict[str, Any]:
+        """Consulta sem cache de buscar_ofertas"""
+        chave, direcao = ORDENACOES_OFERTAS[ordenacao]
+        condicoes = ["o.status = 'ativa'"]
+        params: List[Any] = []
+        
+        if categoria:
+            condicoes.append('o.categoria = ?')
+            params.append(categoria)
+        
+        if preco_max is not None:
+            condicoes.append('o.preco_venda <= ?')
+            params.append(preco_max)
+        
+        if cursor is not None:
+            # Forma expandida de (chave, id) < (?, ?): permite busca por faixa
+            # também no índice de expressão do desconto
+            operador = '<' if direcao == 'DESC' else '>'
+            condicoes.append(f'{chave} {operador}= ? AND ({chave} {operador} ? OR o.id {operador} ?)')
+            params.extend([cursor[0], cursor[0], cursor[1]])
+        
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(f'''
+            SELECT o.id, o.titulo, o.descricao, o.categoria, o.preco_original, o.preco_venda,
+                   o.estoque_atual, o.horario_retirada_inicio, o.horario_retirada_fim,
+                   e.nome_fantasia, e.endereco, e.latitude, e.longitude,
+                   {chave} AS chave
+            FROM ofertas o
+            JOIN estabelecimentos e ON o.estabelecimento_id = e.id
+            WHERE {' AND '.join(condicoes)}
+            ORDER BY {chave} {direcao}, o.id {direcao}
+            LIMIT ?
+        ''', (*params, limite + 1))
+        
+        linhas = cur.fetchall()
+        conn.close()
+        
+        proximo_cursor = None
+        if len(linhas) > limite:
+            linhas = linhas[:limite]
+            proximo_cursor = (linhas[-1][13], linhas[-1][0])
+        
+        return {
+            'ofertas': [self._oferta_para_dict(o) for o in linhas],
+            'proximo_cursor': proximo_cursor
+        }
+    
+    def listar_ofertas_proximas(self, lat: float, lon: float, raio_km: float, categoria: Optional[str] = None,
+                                preco_max: Optional[float] = None, limite: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Lista ofertas ativas num raio (km) do ponto, da mais próxima para a mais distante.
+
+        A R-tree de estabelecimentos faz o pré-filtro por bounding box; a
+        distância exata (haversine) é calculada em lote com NumPy. Perto de
+        ±180° a faixa de longitudes dá a volta e vira duas faixas (uma de
+        cada lado do antimeridiano).
+        """
+        delta_lat = raio_km / KM_POR_GRAU
+        cos_lat = math.cos(math.radians(lat))
+        delta_lon = 180.0 if cos_lat < 1e-6 else min(180.0, raio_km / (KM_POR_GRAU * cos_lat))
+        min_lon, max_lon = lon - delta_lon, lon + delta_lon
+        
+        if self.indice_espacial == 'rtree':
+            origem = 'estabelecimentos_rtree r JOIN estabelecimentos e ON e.id = r.id'
+            condicoes = ['r.max_lat >= ?', 'r.min_lat <= ?']
+            col_min_lon, col_max_lon = 'r.min_lon', 'r.max_lon'
+        else:
+            origem = 'estabelecimentos e'
+            condicoes = ['e.latitude >= ?', 'e.latitude <= ?']
+            col_min_lon, col_max_lon = 'e.longitude', 'e.longitude'
+        params: List[Any] = [lat - delta_lat, lat + delta_lat]
+        
+        if delta_lon >= 180.0:
+            pass   # A caixa cobre todas as longitudes
+        elif min_lon < -180.0 or max_lon > 180.0:
+            # Cruza o antimeridiano: [min_lon, 180] ∪ [-180, max_lon], já normalizados
+            condicoes.append(f'({col_max_lon} >= ? OR {col_min_lon} <= ?)')
+            params += [min_lon + 360.0 if min_lon < -180.0 else min_lon,
+                       max_lon - 360.0 if max_lon > 180.0 else max_lon]
+        else:
+            condicoes += [f'{col_max_lon} >= ?', f'{col_min_lon} <= ?']
+            params += [min_lon, max_lon]
+        
+        condicoes += ["o.status = 'ativa'"]
+        
+        if categoria:
+            condicoes.append('o.categoria = ?')
+            params.append(categoria)
+        
+        if preco_max is not None:
+            condicoes.append('o.preco_venda <= ?')
+            params.append(preco_max)
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
+        cursor.execute(f'''
             SELECT o.id, o.titulo, o.descricao, o.categoria, o.preco_original, o.preco_venda,
                    o.estoque_atual, o.horario_retirada_inicio, o.horario_retirada_fim,
                    e.nome_fantasia, e.endereco, e.latitude, e.longitude
-            FROM ofertas o
+            FROM {origem}
+            JOIN ofertas o ON o.estabelecimento_id = e.id
+            WHERE {' AND '.join(condicoes)}
+        ''', params)
+        
+        candidatas = cursor.fetchall()
+        conn.close()
+        
+        if not candidatas:
+            return []
+        
+        # Haversine vetorizado sobre todas as candidatas da bounding box
+        lats = np.radians(np.fromiter((c[11] for c in candidatas), dtype=float, count=len(candidatas)))
+        lons = np.radians(np.fromiter((c[12] for c in candidatas), dtype=float, count=len(candidatas)))
+        lat0, lon0 = math.radians(lat), math.radians(lon)
+        a = np.sin((lats - lat0) / 2) ** 2 + math.cos(lat0) * np.cos(lats) * np.sin((lons - lon0) / 2) ** 2
+        distancias = 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        
+        dentro = np.flatnonzero(distancias <= raio_km)
+        ordem = dentro[np.argsort(distancias[dentro], kind='stable')]
+        if limite is not None:
+            ordem = ordem[:limite]
+        
+        resultado = []
+        for i in ordem:
+            oferta = self._oferta_para_dict(candidatas[i])
+            oferta['distancia_km'] = float(distancias[i])
+            resultado.append(oferta)
+        return resultado
+    
+    def pesquisar_ofertas(self, termo: str, categoria: Optional[str] = None, preco_max: Optional[float] = None,
+                          limite: int = 20) -> List[Dict[str, Any]]:
+        """Busca textual em título, descrição e estabelecimento das ofertas ativas.
+
+        Cada palavra do termo vira um prefixo sem acentos ("pao" encontra
+        "pão", "piz" encontra "pizza") e todas precisam aparecer. O resultado
+        vem ordenado por relevância (bm25, com título pesando mais).
+        """
+        palavras = re.findall(r'\w+', termo.lower())
+        if not palavras:
+            return []
+        
+        condicoes = ["o.status = 'ativa'"]
+        params: List[Any] = []
+        
+        if self.busca_textual == 'fts5':
+            origem = 'ofertas_fts f JOIN ofertas o ON o.id = f.rowid'
+            condicoes.insert(0, 'ofertas_fts MATCH ?')
+            params.append(' '.join(f'"{p}"*' for p in palavras))
+            ordem = 'bm25(ofertas_fts, 10.0, 2.0, 5.0)'
+        else:
+            origem = 'ofertas o'
+            for p in palavras:
+                condicoes.append("(o.titulo || ' ' || COALESCE(o.descricao, '') || ' ' || e.nome_fantasia) LIKE ?")
+                params.append(f'%{p}%')
+            ordem = 'o.criado_em DESC'
+        
+        if categoria:
+            condicoes.append('o.categoria = ?')
+            params.append(categoria)
+        
+        if preco_max is not None:
+            condicoes.append('o.preco_venda <= ?')
+            params.append(preco_max)
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(f'''
+            SELECT o.id, o.titulo, o.descricao, o.categoria, o.preco_original, o.preco_venda,
+                   o.estoque_atual, o.horario_retirada_inicio, o.horario_retirada_fim,
+                   e.nome_fantasia, e.endereco, e.latitude, e.longitude
+            FROM {origem}
             JOIN estabelecimentos e ON o.estabelecimento_id = e.id
-            WHERE o.status = 'ativa' AND o.estoque_atual > 0
-            ORDER BY o.criado_em DESC
-        ''')
+            WHERE {' AND '.join(condicoes)}
+            ORDER BY {ordem}
+            LIMIT ?
+        ''', (*params, limite))
         
         ofertas = cursor.fetchall()
         conn.close()
         
-        return [
-            {
-                'id': o[0], 'titulo': o[1], 'descricao': o[2], 'categoria': o[3],
-                'preco_original': o[4], 'preco_venda': o[5], 'estoque': o[6],
-                'horario_inicio': o[7], 'horario_fim': o[8],
-                'estabelecimento': o[9], 'endereco': o[10],
-                'latitude': o[11], 'longitude': o[12]
-            }
-            for o in ofertas
-        ]
+        return [self._oferta_para_dict(o) for o in ofertas]
     
     def criar_pedido(self, consumidor_id: int, oferta_id: int, quantidade: int = 1) -> Optional[Dict[str, Any]]:
         """Cria um pedido, atualiza estoque e registra pagamento (RF09 + RF10)"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            # 1. Buscar preço e verificar estoque
-            cursor.execute('SELECT preco_venda, estoque_atual FROM ofertas WHERE id = ?', (oferta_id,))
+        def operacao(cursor: sqlite3.Cursor) -> Optional[Dict[str, Any]]:
+            # 1. Buscar preço
+            cursor.execute('SELECT preco_venda, estabelecimento_id FROM ofertas WHERE id = ?', (oferta_id,))
             oferta = cursor.fetchone()
             
             if not oferta:
-                conn.close()
                 return None
             
-            preco_unitario, estoque_disponivel = oferta
+            preco_unitario, estabelecimento_id = oferta
             
-            # 2. Validar estoque
-            if estoque_disponivel < quantidade:
-                conn.close()
+            # 2. Decrementar estoque de forma condicional (RNF07 - Confiabilidade)
+            #    Feito antes dos INSERTs: se não houver estoque nada foi escrito
+            cursor.execute('''
+                UPDATE ofertas 
+                SET estoque_atual = estoque_atual - ?
+                WHERE id = ? AND estoque_atual >= ?
+            ''', (quantidade, oferta_id, quantidade))
+            
+            if cursor.rowcount == 0:
                 return None
             
             # 3. Calcular valor total
             valor_total = preco_unitario * quantidade
             
-            # 4. Gerar código único de retirada
-            codigo_retirada = hashlib.md5(
-                f"{consumidor_id}{oferta_id}{datetime.now()}{quantidade}".encode()
-            ).hexdigest()[:8].upper()
-            
-            # 5. Criar pedido (status inicial: reservado)
-            cursor.execute('''
-                INSERT INTO pedidos (consumidor_id, oferta_id, quantidade, valor_total, codigo_retirada, status)
-                VALUES (?, ?, ?, ?, ?, 'reservado')
-            ''', (consumidor_id, oferta_id, quantidade, valor_total, codigo_retirada))
+            # 4-5. Criar pedido (status inicial: reservado) com código de retirada
+            #      sorteado; em caso de colisão o alocador sorteia outro
+            codigo_retirada = self.codigos.inserir_com_codigo(cursor, '''
+                INSERT INTO pedidos (consumidor_id, oferta_id, estabelecimento_id, quantidade, valor_total,
+                                     codigo_retirada, status)
+                VALUES (?, ?, ?, ?, ?, ?, 'reservado')
+            ''', (consumidor_id, oferta_id, estabelecimento_id, quantidade, valor_total))
             
             pedido_id = cursor.lastrowid
             
@@ -306,100 +1411,289 @@ class Database:
                 WHERE id = ?
             ''', (pedido_id,))
             
-            # 8. Decrementar estoque (RNF07 - Confiabilidade)
-            cursor.execute('''
-                UPDATE ofertas 
-                SET estoque_atual = estoque_atual - ?
-                WHERE id = ? AND estoque_atual >= ?
-            ''', (quantidade, oferta_id, quantidade))
-            
-            # 9. Verificar se o estoque foi realmente decrementado
-            if cursor.rowcount == 0:
-                conn.rollback()
-                conn.close()
-                return None
-            
-            conn.commit()
-            conn.close()
-            
             return {
                 'id': pedido_id,
                 'codigo_retirada': codigo_retirada,
                 'valor_total': valor_total,
                 'quantidade': quantidade
             }
-            
+        
+        try:
+            return self._executar_escrita(operacao, metodo='criar_pedido')
         except Exception as e:
-            conn.rollback()
-            conn.close()
             print(f"Erro ao criar pedido: {e}")
             return None
     
-    def validar_retirada(self, codigo_retirada: str) -> Dict[str, Any]:
-        """Valida código de retirada e marca como retirado"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT p.id, p.status, o.titulo, e.nome_fantasia
-            FROM pedidos p
-            JOIN ofertas o ON p.oferta_id = o.id
-            JOIN estabelecimentos e ON o.estabelecimento_id = e.id
-            WHERE p.codigo_retirada = ?
-        ''', (codigo_retirada,))
-        
-        pedido = cursor.fetchone()
-        
-        if not pedido:
-            conn.close()
-            return {'sucesso': False, 'mensagem': 'Código inválido'}
-        
-        if pedido[1] == 'retirado':
-            conn.close()
-            return {'sucesso': False, 'mensagem': 'Pedido já foi retirado'}
-        
-        if pedido[1] == 'cancelado':
-            conn.close()
-            return {'sucesso': False, 'mensagem': 'Pedido cancelado'}
+    def criar_pedidos_lote(self, consumidor_id: int, itens: List[Tuple[int, int]],
+                           metodo: str = 'pix') -> Dict[str, Any]:
+        """Reserva várias ofertas de uma vez, em uma única transação (tudo ou nada).
+
+        ``itens`` é uma lista de (oferta_id, quantidade). Se qualquer item não
+        puder ser atendido, nada é gravado. Retorna {'sucesso', 'mensagem',
+        'itens'}, com um resultado por item na mesma ordem da entrada.
+        """
+        if not itens:
+            return {'sucesso': False, 'mensagem': 'Nenhum item informado', 'itens': []}
         
-        # Atualizar status
-        cursor.execute('''
-            UPDATE pedidos 
-            SET status = 'retirado', retirado_em = CURRENT_TIMESTAMP
-            WHERE codigo_retirada = ?
-        ''', (codigo_retirada,))
+        def operacao(cursor: sqlite3.Cursor) -> Dict[str, Any]:
+            # 1. Quantidade total pedida por oferta (a mesma oferta pode repetir)
+            total_por_oferta: Dict[int, int] = {}
+            for oferta_id, quantidade in itens:
+                total_por_oferta[oferta_id] = total_por_oferta.get(oferta_id, 0) + quantidade
+            
+            # 2. Buscar preço e estoque de todas as ofertas de uma vez
+            #    (BEGIN IMMEDIATE garante que nenhum outro escritor altera o estoque)
+            ids = list(total_por_oferta)
+            marcadores = ','.join('?' * len(ids))
+            cursor.execute(f'''
+                SELECT id, preco_venda, estoque_atual, estabelecimento_id
+                FROM ofertas
+                WHERE id IN ({marcadores}) AND status IN ('ativa', 'esgotada')
+            ''', ids)
+            ofertas = {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+            
+            # 3. Validar todos os itens antes de escrever qualquer coisa
+            resultados = []
+            for oferta_id, quantidade in itens:
+                if quantidade <= 0:
+                    mensagem = 'Quantidade inválida'
+                elif oferta_id not in ofertas:
+                    mensagem = 'Oferta não encontrada'
+                elif ofertas[oferta_id][1] < total_por_oferta[oferta_id]:
+                    mensagem = 'Estoque insuficiente'
+                else:
+                    mensagem = None
+                resultados.append({
+                    'oferta_id': oferta_id, 'quantidade': quantidade,
+                    'sucesso': mensagem is None, 'mensagem': mensagem or 'OK', 'pedido': None
+                })
+            
+            if not all(r['sucesso'] for r in resultados):
+                return {'sucesso': False, 'mensagem': 'Nenhum item foi reservado', 'itens': resultados}
+            
+            # 4. Decrementar estoque com guarda (RNF07 - Confiabilidade)
+            cursor.executemany('''
+                UPDATE ofertas 
+                SET estoque_atual = estoque_atual - ?
+                WHERE id = ? AND estoque_atual >= ?
+            ''', [(qtd, oferta_id, qtd) for oferta_id, qtd in total_por_oferta.items()])
+            
+            if cursor.rowcount != len(total_por_oferta):
+                raise sqlite3.IntegrityError('Estoque alterado durante o checkout')
+            
+            # 5. Criar pedidos e pagamentos em lote (códigos já conferidos como livres)
+            codigos = self.codigos.alocar_lote(cursor, len(resultados))
+            linhas = []
+            for r, codigo in zip(resultados, codigos):
+                preco, _, estabelecimento_id = ofertas[r['oferta_id']]
+                linhas.append((consumidor_id, r['oferta_id'], r['quantidade'], preco * r['quantidade'], codigo,
+                               estabelecimento_id))
+            
+            # Mesmo caminho do criar_pedido (reservado -> pagamento -> pago), para que
+            # log de eventos, KPIs e rollups vejam a mesma sequência nos dois casos
+            cursor.executemany('''
+                INSERT INTO pedidos (consumidor_id, oferta_id, quantidade, valor_total, codigo_retirada,
+                                     estabelecimento_id, status)
+                VALUES (?, ?, ?, ?, ?, ?, 'reservado')
+            ''', linhas)
+            
+            cursor.execute(
+                f"SELECT codigo_retirada, id FROM pedidos WHERE codigo_retirada IN ({','.join('?' * len(codigos))})",
+                codigos
+            )
+            ids_por_codigo = dict(cursor.fetchall())
+            
+            cursor.executemany('''
+                INSERT INTO pagamentos (pedido_id, metodo, status, gateway_id)
+                VALUES (?, ?, 'aprovado', ?)
+            ''', [(ids_por_codigo[linha[4]], metodo, f"SIM_{linha[4]}") for linha in linhas])
+            
+            cursor.executemany("UPDATE pedidos SET status = 'pago' WHERE id = ?",
+                               [(ids_por_codigo[linha[4]],) for linha in linhas])
+            
+            for r, linha in zip(resultados, linhas):
+                r['pedido'] = {
+                    'id': ids_por_codigo[linha[4]],
+                    'codigo_retirada': linha[4],
+                    'valor_total': linha[3],
+                    'quantidade': linha[2]
+                }
+            
+            return {'sucesso': True, 'mensagem': f'{len(resultados)} itens reservados', 'itens': resultados}
         
-        conn.commit()
-        conn.close()
+        try:
+            return self._executar_escrita(operacao, metodo='criar_pedidos_lote')
+        except Exception as e:
+            print(f"Erro no checkout em lote: {e}")
+            return {'sucesso': False, 'mensagem': f'Erro no checkout: {e}', 'itens': []}
+    
+    def validar_retirada(self, codigo_retirada: str, estabelecimento_id: Optional[int]) -> Dict[str, Any]:
+        """Valida código de retirada e marca como retirado.
+
+        O código só é procurado entre os pedidos da loja informada (índice
+        (estabelecimento_id, codigo_retirada)): código de outra loja é
+        tratado como inválido. A loja é obrigatória; ``None`` explícito
+        (manutenção, testes) aceita o código de qualquer loja.
+        """
+        codigo_retirada = normalizar_codigo(codigo_retirada)
+        filtro, params = 'p.codigo_retirada = ?', [codigo_retirada]
+        if estabelecimento_id is not None:
+            filtro, params = 'p.estabelecimento_id = ? AND p.codigo_retirada = ?', [estabelecimento_id, codigo_retirada]
         
-        return {
-            'sucesso': True,
-            'mensagem': f'Pedido retirado com sucesso!',
-            'detalhes': {
-                'oferta': pedido[2],
-                'estabelecimento': pedido[3]
+        def operacao(cursor: sqlite3.Cursor) -> Dict[str, Any]:
+            cursor.execute(f'''
+                SELECT p.id, p.status, o.titulo, e.nome_fantasia
+                FROM pedidos p
+                JOIN ofertas o ON p.oferta_id = o.id
+                JOIN estabelecimentos e ON o.estabelecimento_id = e.id
+                WHERE {filtro}
+            ''', params)
+            
+            pedido = cursor.fetchone()
+            
+            if not pedido:
+                return {'sucesso': False, 'mensagem': 'Código inválido'}
+            
+            if pedido[1] == 'retirado':
+                return {'sucesso': False, 'mensagem': 'Pedido já foi retirado'}
+            
+            if pedido[1] == 'cancelado':
+                return {'sucesso': False, 'mensagem': 'Pedido cancelado'}
+            
+            # Atualizar status
+            cursor.execute('''
+                UPDATE pedidos 
+                SET status = 'retirado', retirado_em = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (pedido[0],))
+            
+            return {
+                'sucesso': True,
+                'mensagem': f'Pedido retirado com sucesso!',
+                'detalhes': {
+                    'oferta': pedido[2],
+                    'estabelecimento': pedido[3]
+                }
             }
-        }
+        
+        return self._executar_escrita(operacao, metodo='validar_retirada')
+
+    def validar_retiradas_lote(self, codigos: List[str],
+                               estabelecimento_id: Optional[int]) -> List[Dict[str, Any]]:
+        """Valida vários códigos de retirada de uma vez (balcão em horário de pico).
+
+        Busca todos os códigos em uma única consulta IN (...) e marca os
+        válidos como retirados em uma única transação. Retorna um resultado
+        por código, na ordem da entrada, no mesmo formato de validar_retirada
+        (mais a chave 'codigo'). Código repetido na lista conta uma vez só.
+        """
+        normalizados = [normalizar_codigo(codigo) for codigo in codigos]
+        distintos = list(dict.fromkeys(c for c in normalizados if c))
+        if not distintos:
+            return [{'codigo': c, 'sucesso': False, 'mensagem': 'Código inválido'} for c in normalizados]
+
+        filtro, params = '', list(distintos)
+        if estabelecimento_id is not None:
+            filtro, params = 'p.estabelecimento_id = ? AND ', [estabelecimento_id, *distintos]
+
+        def operacao(cursor: sqlite3.Cursor) -> List[Dict[str, Any]]:
+            cursor.execute(f'''
+                SELECT p.codigo_retirada, p.id, p.status, o.titulo, e.nome_fantasia
+                FROM pedidos p
+                JOIN ofertas o ON p.oferta_id = o.id
+                JOIN estabelecimentos e ON o.estabelecimento_id = e.id
+                WHERE {filtro}p.codigo_retirada IN ({','.join('?' * len(distintos))})
+            ''', params)
+            pedidos = {linha[0]: linha[1:] for linha in cursor.fetchall()}
+
+            retirar = [pedido[0] for pedido in pedidos.values() if pedido[1] not in ('retirado', 'cancelado')]
+            if retirar:
+                cursor.execute(f'''
+                    UPDATE pedidos
+                    SET status = 'retirado', retirado_em = CURRENT_TIMESTAMP
+                    WHERE id IN ({','.join('?' * len(retirar))})
+                ''', retirar)
+
+            # Código repetido: só a primeira ocorrência de um pedido retirado agora
+            # conta como retirada; as demais respondem como já retirado
+            resultados, retirados_agora = [], set()
+            for codigo in normalizados:
+                pedido = pedidos.get(codigo)
+                if not pedido:
+                    resultado = {'sucesso': False, 'mensagem': 'Código inválido'}
+                elif pedido[1] == 'cancelado':
+                    resultado = {'sucesso': False, 'mensagem': 'Pedido cancelado'}
+                elif pedido[1] == 'retirado' or codigo in retirados_agora:
+                    resultado = {'sucesso': False, 'mensagem': 'Pedido já foi retirado'}
+                else:
+                    retirados_agora.add(codigo)
+                    resultado = {
+                        'sucesso': True,
+                        'mensagem': 'Pedido retirado com sucesso!',
+                        'detalhes': {'oferta': pedido[2], 'estabelecimento': pedido[3]}
+                    }
+                resultados.append({'codigo': codigo, **resultado})
+            return resultados
+
+        return self._executar_escrita(operacao, metodo='validar_retiradas_lote')
+
+    def _filtros_pedidos(self, dono: str, dono_id: int, status: Optional[List[str]] = None,
+                         inicio: Optional[str] = None, fim: Optional[str] = None,
+                         cursor: Optional[Tuple[str, int]] = None) -> Tuple[List[str], List[Any]]:
+        """Condições SQL comuns às listagens de pedidos (``dono`` = coluna de pedidos que filtra o dono).
+
+        Datas 'AAAA-MM-DD' com ``fim`` inclusivo. ``cursor`` = (criado_em, id)
+        do último pedido da página anterior, para ordem decrescente.
+        """
+        condicoes, params = [f'p.{dono} = ?'], [dono_id]
+        if status:
+            condicoes.append(f"p.status IN ({','.join('?' * len(status))})")
+            params.extend(status)
+        if inicio:
+            condicoes.append('p.criado_em >= ?')
+            params.append(inicio)
+        if fim:
+            condicoes.append("p.criado_em < date(?, '+1 day')")
+            params.append(fim)
+        if cursor is not None:
+            # Forma expandida de (criado_em, id) < (?, ?), como em buscar_ofertas
+            condicoes.append('p.criado_em <= ? AND (p.criado_em < ? OR p.id < ?)')
+            params.extend([cursor[0], cursor[0], cursor[1]])
+        return condicoes, params
     
-    def listar_pedidos_consumidor(self, consumidor_id: int) -> List[Dict[str, Any]]:
-        """Lista pedidos de um consumidor"""
+    def listar_pedidos_consumidor(self, consumidor_id: int, status: Optional[List[str]] = None,
+                                  inicio: Optional[str] = None, fim: Optional[str] = None,
+                                  cursor: Optional[Tuple[str, int]] = None,
+                                  limite: Optional[int] = None, formato: str = 'dict') -> Any:
+        """Lista pedidos de um consumidor, do mais recente ao mais antigo.
+
+        Filtros de status e período ficam no SQL (índice (consumidor_id,
+        criado_em, id)). Paginação por keyset: para a próxima página passe
+        ``cursor=(ultimo['data'], ultimo['id'])`` da página atual.
+        ``formato`` segue resultados.FORMATOS_RESULTADO (padrão: lista de dicts).
+        """
+        validar_formato(formato)
+        condicoes, params = self._filtros_pedidos('consumidor_id', consumidor_id, status, inicio, fim, cursor)
         conn = self.get_connection()
-        cursor = conn.cursor()
+        cursor_db = conn.cursor()
         
-        cursor.execute('''
+        cursor_db.execute(f'''
             SELECT p.id, p.codigo_retirada, p.valor_total, p.status, p.criado_em,
                    o.titulo, e.nome_fantasia, e.endereco,
                    o.horario_retirada_inicio, o.horario_retirada_fim
             FROM pedidos p
             JOIN ofertas o ON p.oferta_id = o.id
             JOIN estabelecimentos e ON o.estabelecimento_id = e.id
-            WHERE p.consumidor_id = ?
-            ORDER BY p.criado_em DESC
-        ''', (consumidor_id,))
+            WHERE {' AND '.join(condicoes)}
+            ORDER BY p.criado_em DESC, p.id DESC
+            LIMIT ?
+        ''', (*params, -1 if limite is None else limite))
         
-        pedidos = cursor.fetchall()
+        pedidos = cursor_db.fetchall()
         conn.close()
         
+        if formato != 'dict':
+            return ESQUEMA_PEDIDO_CONSUMIDOR.montar(pedidos, formato)
         return [
             {
                 'id': p[0], 'codigo': p[1], 'valor': p[2], 'status': p[3],
@@ -420,24 +1714,56 @@ class Database:
         
         return result[0] if result else None
     
-    def listar_pedidos_estabelecimento(self, estabelecimento_id: int) -> List[Dict[str, Any]]:
-        """Lista pedidos de um estabelecimento"""
+    def obter_kpis_estabelecimento(self, estabelecimento_id: int) -> Dict[str, Any]:
+        """Retorna os KPIs do dashboard do estabelecimento (consulta por chave primária)"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
+            SELECT total_pedidos, receita_retirada, ofertas_ativas
+            FROM kpis_estabelecimento
+            WHERE estabelecimento_id = ?
+        ''', (estabelecimento_id,))
+        
+        kpis = cursor.fetchone()
+        conn.close()
+        
+        if not kpis:
+            return {'total_pedidos': 0, 'receita': 0.0, 'ofertas_ativas': 0}
+        
+        return {'total_pedidos': kpis[0], 'receita': kpis[1], 'ofertas_ativas': kpis[2]}
+    
+    def listar_pedidos_estabelecimento(self, estabelecimento_id: int, status: Optional[List[str]] = None,
+                                       inicio: Optional[str] = None, fim: Optional[str] = None,
+                                       cursor: Optional[Tuple[str, int]] = None,
+                                       limite: Optional[int] = None, formato: str = 'dict') -> Any:
+        """Lista pedidos de um estabelecimento, do mais recente ao mais antigo.
+
+        Mesmos filtros, paginação e formatos de listar_pedidos_consumidor; usa a
+        coluna pedidos.estabelecimento_id e o índice (estabelecimento_id, criado_em, id).
+        """
+        validar_formato(formato)
+        condicoes, params = self._filtros_pedidos('estabelecimento_id', estabelecimento_id,
+                                                  status, inicio, fim, cursor)
+        conn = self.get_connection()
+        cursor_db = conn.cursor()
+        
+        cursor_db.execute(f'''
             SELECT p.id, p.codigo_retirada, p.valor_total, p.status, p.criado_em,
                    o.titulo, u.nome, u.telefone
             FROM pedidos p
             JOIN ofertas o ON p.oferta_id = o.id
             JOIN usuarios u ON p.consumidor_id = u.id
-            WHERE o.estabelecimento_id = ?
-            ORDER BY p.criado_em DESC
-        ''', (estabelecimento_id,))
+            WHERE {' AND '.join(condicoes)}
+            ORDER BY p.criado_em DESC, p.id DESC
+            LIMIT ?
+        ''', (*params, -1 if limite is None else limite))
         
-        pedidos = cursor.fetchall()
+        pedidos = cursor_db.fetchall()
         conn.close()
         
+        if formato != 'dict':
+            return ESQUEMA_PEDIDO_ESTABELECIMENTO.montar(pedidos, formato)
         return [
             {
                 'id': p[0], 'codigo': p[1], 'valor': p[2], 'status': p[3],
@@ -446,36 +1772,142 @@ class Database:
             for p in pedidos
         ]
     
-    def cancelar_pedido(self, pedido_id: int, motivo: str = 'Cancelado pelo estabelecimento') -> Dict[str, Any]:
-        """Cancela um pedido e devolve estoque (RF - Cancelamento/Devolução)"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Buscar dados do pedido
-        cursor.execute('''
-            SELECT p.id, p.status, p.oferta_id, p.quantidade, pag.id as pagamento_id
-            FROM pedidos p
-            LEFT JOIN pagamentos pag ON p.id = pag.pedido_id
-            WHERE p.id = ?
-        ''', (pedido_id,))
+    def exportar_pedidos_estabelecimento(self, estabelecimento_id: int, formato: str = 'csv',
+                                         inicio: Optional[str] = None, fim: Optional[str] = None,
+                                         status: Optional[List[str]] = None,
+                                         tamanho_bloco: int = 1000) -> Iterator[str]:
+        """Exporta o histórico de pedidos da loja em CSV ou JSONL, em blocos de texto.
+
+        Gerador: percorre o cursor com fetchmany(tamanho_bloco) e entrega um
+        bloco de linhas por vez, então a memória não cresce com o histórico.
+        ``inicio``/``fim`` ('AAAA-MM-DD', fim inclusivo) e ``status`` viram
+        filtros no SQL (índice (estabelecimento_id, criado_em, id)). A conexão
+        fica com o gerador até ele terminar ou ser fechado.
+        """
+        if formato not in FORMATOS_EXPORTACAO:
+            raise ValueError(f"Formato de exportação desconhecido: {formato}")
         
-        pedido = cursor.fetchone()
+        condicoes, params = self._filtros_pedidos('estabelecimento_id', estabelecimento_id, status, inicio, fim)
         
-        if not pedido:
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute(f'''
+                SELECT p.id, p.codigo_retirada, p.status, p.quantidade, p.valor_total, p.criado_em,
+                       p.retirado_em, o.titulo, o.categoria, u.nome, pag.metodo, pag.status
+                FROM pedidos p
+                JOIN ofertas o ON p.oferta_id = o.id
+                JOIN usuarios u ON p.consumidor_id = u.id
+                LEFT JOIN pagamentos pag ON pag.pedido_id = p.id
+                WHERE {' AND '.join(condicoes)}
+                ORDER BY p.criado_em, p.id
+            ''', params)
+            
+            buffer = io.StringIO()
+            escritor = csv.writer(buffer, lineterminator='\n')
+            if formato == 'csv':
+                escritor.writerow(COLUNAS_EXPORTACAO)
+            while True:
+                linhas = cursor.fetchmany(tamanho_bloco)
+                if not linhas:
+                    break
+                if formato == 'csv':
+                    escritor.writerows(linhas)
+                else:
+                    for linha in linhas:
+                        buffer.write(json.dumps(dict(zip(COLUNAS_EXPORTACAO, linha)), ensure_ascii=False))
+                        buffer.write('\n')
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()   # Só o cabeçalho, se não houver pedidos
+        finally:
             conn.close()
-            return {'sucesso': False, 'mensagem': 'Pedido não encontrado'}
+    
+    def ultimo_evento_pedido(self, estabelecimento_id: Optional[int] = None) -> int:
+        """Id do evento de pedido mais recente (0 se não houver): o cursor inicial de quem acompanha o log"""
+        conn = self.get_connection()
+        if estabelecimento_id is None:
+            ultimo = conn.execute('SELECT MAX(id) FROM eventos_pedido').fetchone()[0]
+        else:
+            ultimo = conn.execute('SELECT MAX(id) FROM eventos_pedido WHERE estabelecimento_id = ?',
+                                  (estabelecimento_id,)).fetchone()[0]
+        conn.close()
+        return ultimo or 0
+    
+    def listar_eventos_pedido(self, estabelecimento_id: Optional[int] = None, apos_id: int = 0,
+                              limite: int = 500) -> List[Dict[str, Any]]:
+        """Eventos de pedidos com id > ``apos_id``, do mais antigo ao mais novo.
+
+        Cada evento traz o pedido no estado atual, no formato de
+        listar_pedidos_estabelecimento. Para acompanhar o log, guarde o
+        ``id`` do último evento e passe-o como ``apos_id`` na próxima chamada;
+        menos de ``limite`` eventos significa que o log foi lido até o fim.
+        """
+        condicoes, params = ['ev.id > ?'], [apos_id]
+        if estabelecimento_id is not None:
+            condicoes.append('ev.estabelecimento_id = ?')
+            params.append(estabelecimento_id)
         
-        status_atual = pedido[1]
-        oferta_id = pedido[2]
-        quantidade = pedido[3]
-        pagamento_id = pedido[4]
+        conn = self.get_connection()
+        eventos = conn.execute(f'''
+            SELECT ev.id, ev.status_anterior, ev.status, ev.criado_em,
+                   p.id, p.codigo_retirada, p.valor_total, p.status, p.criado_em,
+                   o.titulo, u.nome, u.telefone
+            FROM eventos_pedido ev
+            JOIN pedidos p ON p.id = ev.pedido_id
+            JOIN ofertas o ON p.oferta_id = o.id
+            JOIN usuarios u ON p.consumidor_id = u.id
+            WHERE {' AND '.join(condicoes)}
+            ORDER BY ev.id
+            LIMIT ?
+        ''', (*params, limite)).fetchall()
+        conn.close()
         
-        # Só pode cancelar se for Reservado ou Pago
-        if status_atual not in ['reservado', 'pago']:
-            conn.close()
-            return {'sucesso': False, 'mensagem': f'Pedido já está {status_atual}'}
+        return [
+            {
+                'id': e[0], 'status_anterior': e[1], 'status': e[2], 'em': e[3],
+                'pedido': {
+                    'id': e[4], 'codigo': e[5], 'valor': e[6], 'status': e[7],
+                    'data': e[8], 'oferta': e[9], 'cliente': e[10], 'telefone': e[11]
+                }
+            }
+            for e in eventos
+        ]
+    
+    def podar_eventos_pedido(self, dias: int = 7) -> int:
+        """Apaga eventos com mais de ``dias`` dias; retorna quantos foram removidos"""
+        def operacao(cursor: sqlite3.Cursor) -> int:
+            cursor.execute("DELETE FROM eventos_pedido WHERE criado_em < datetime('now', ?)", (f'-{dias} days',))
+            return cursor.rowcount
         
-        try:
+        return self._executar_escrita(operacao, versionar=False, metodo='podar_eventos_pedido')
+    
+    def cancelar_pedido(self, pedido_id: int, motivo: str = 'Cancelado pelo estabelecimento') -> Dict[str, Any]:
+        """Cancela um pedido e devolve estoque (RF - Cancelamento/Devolução)"""
+        def operacao(cursor: sqlite3.Cursor) -> Dict[str, Any]:
+            # Buscar dados do pedido
+            cursor.execute('''
+                SELECT p.id, p.status, p.oferta_id, p.quantidade, pag.id as pagamento_id
+                FROM pedidos p
+                LEFT JOIN pagamentos pag ON p.id = pag.pedido_id
+                WHERE p.id = ?
+            ''', (pedido_id,))
+            
+            pedido = cursor.fetchone()
+            
+            if not pedido:
+                return {'sucesso': False, 'mensagem': 'Pedido não encontrado'}
+            
+            status_atual = pedido[1]
+            oferta_id = pedido[2]
+            quantidade = pedido[3]
+            pagamento_id = pedido[4]
+            
+            # Só pode cancelar se for Reservado ou Pago
+            if status_atual not in ['reservado', 'pago']:
+                return {'sucesso': False, 'mensagem': f'Pedido já está {status_atual}'}
+            
             # 1. Atualizar status do pedido
             cursor.execute('''
                 UPDATE pedidos 
@@ -498,17 +1930,97 @@ class Database:
                     WHERE id = ?
                 ''', (pagamento_id,))
             
-            conn.commit()
-            conn.close()
-            
             return {
                 'sucesso': True,
                 'mensagem': 'Pedido cancelado com sucesso',
+                'oferta_id': oferta_id,
                 'estoque_devolvido': quantidade,
                 'pagamento_estornado': bool(pagamento_id and status_atual == 'pago')
             }
-            
+        
+        try:
+            return self._executar_escrita(operacao, metodo='cancelar_pedido')
         except Exception as e:
-            conn.rollback()
-            conn.close()
             return {'sucesso': False, 'mensagem': f'Erro ao cancelar: {str(e)}'}
+
+    def expirar_reservas(self, tolerancia_minutos: int = 30, tamanho_lote: int = 500) -> Dict[str, Any]:
+        """Cancela em massa pedidos não retirados após o fim da janela de retirada.
+
+        Pedidos 'reservado'/'pago' cujo prazo (PRAZO_RETIRADA + tolerância)
+        já passou são cancelados em lotes de ``tamanho_lote``, cada lote na
+        sua própria transação curta: o estoque volta às ofertas com um UPDATE
+        agregado por oferta (limitado ao estoque inicial) e os pagamentos dos
+        pedidos pagos são estornados. Os candidatos são lidos fora da
+        transação; sem pedidos expirados nenhum lock de escrita é pedido.
+        """
+        resumo = {'pedidos': 0, 'pagamentos_estornados': 0, 'unidades_devolvidas': 0,
+                  'ofertas': set(), 'lotes': 0}
+        limite = f'+{int(tolerancia_minutos)} minutes'
+        
+        def cancelar_lote(ids: List[int]) -> Tuple[int, int, int, List[int]]:
+            marcadores = ','.join('?' * len(ids))
+            
+            def operacao(cursor: sqlite3.Cursor) -> Tuple[int, int, int, List[int]]:
+                # Revalida dentro da transação: o pedido pode ter sido retirado nesse meio tempo
+                cursor.execute(f'''
+                    SELECT id, oferta_id, quantidade, status FROM pedidos
+                    WHERE id IN ({marcadores}) AND status IN ('reservado', 'pago')
+                ''', ids)
+                pedidos = cursor.fetchall()
+                if not pedidos:
+                    return 0, 0, 0, []
+                validos = [pedido[0] for pedido in pedidos]
+                marcadores_validos = ','.join('?' * len(validos))
+                
+                cursor.execute(f'''
+                    UPDATE ofertas
+                    SET estoque_atual = MIN(ofertas.estoque_inicial, ofertas.estoque_atual + d.quantidade)
+                    FROM (
+                        SELECT oferta_id, SUM(quantidade) AS quantidade FROM pedidos
+                        WHERE id IN ({marcadores_validos}) GROUP BY oferta_id
+                    ) AS d
+                    WHERE ofertas.id = d.oferta_id
+                ''', validos)
+                
+                pagos = [pedido[0] for pedido in pedidos if pedido[3] == 'pago']
+                if pagos:
+                    cursor.execute(f'''
+                        UPDATE pagamentos
+                        SET status = 'estornado', atualizado_em = CURRENT_TIMESTAMP
+                        WHERE pedido_id IN ({','.join('?' * len(pagos))}) AND status = 'aprovado'
+                    ''', pagos)
+                estornados = max(cursor.rowcount, 0) if pagos else 0
+                
+                cursor.execute(f"UPDATE pedidos SET status = 'cancelado' WHERE id IN ({marcadores_validos})", validos)
+                return (len(validos), estornados, sum(pedido[2] for pedido in pedidos),
+                        sorted({pedido[1] for pedido in pedidos}))
+            
+            return self._executar_escrita(operacao, metodo='expirar_reservas')
+        
+        ultimo_id = 0
+        while True:
+            conn = self.get_connection()
+            candidatos = conn.execute(f'''
+                SELECT p.id
+                FROM pedidos p
+                JOIN ofertas o ON o.id = p.oferta_id
+                WHERE p.status IN ('reservado', 'pago') AND p.id > ?
+                  AND datetime({PRAZO_RETIRADA}, ?) < datetime('now', 'localtime')
+                ORDER BY p.id
+                LIMIT ?
+            ''', (ultimo_id, limite, tamanho_lote)).fetchall()
+            conn.close()
+            if not candidatos:
+                break
+            
+            ids = [linha[0] for linha in candidatos]
+            ultimo_id = ids[-1]
+            pedidos, estornados, unidades, ofertas = cancelar_lote(ids)
+            resumo['pedidos'] += pedidos
+            resumo['pagamentos_estornados'] += estornados
+            resumo['unidades_devolvidas'] += unidades
+            resumo['ofertas'].update(ofertas)
+            resumo['lotes'] += 1
+        
+        resumo['ofertas'] = sorted(resumo['ofertas'])
+        return resumo
@@ -0,0 +1,209 @@
+"""Escritor único com group commit para as escritas do Database.
+
+O SQLite aceita um escritor por vez: com muitas threads, cada escrita paga
+seu próprio BEGIN IMMEDIATE/COMMIT e disputa o lock com as demais (busy
+timeout, retentativas com backoff). Com o escritor agrupado, as threads
+apenas enfileiram a operação; uma thread dedicada junta até ``tamanho_lote``
+operações (ou o que chegar em ``espera_ms``) e as aplica numa única
+transação, cada uma dentro do seu SAVEPOINT: uma operação que falha é
+desfeita sozinha e a exceção vai só para quem a enviou. O resultado chega
+ao chamador por um Future, depois do COMMIT do lote.
+
+Opcional: ``Database(escrita_agrupada=True)`` ou PEGA_AI_ESCRITA_AGRUPADA=1 no app.
+"""
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from connection_pool import banco_bloqueado
+
+T = TypeVar('T')
+
+Operacao = Callable[[sqlite3.Cursor], Any]
+
+
+class EscritorAgrupado:
+    """Thread escritora que aplica operações enfileiradas em transações agrupadas.
+
+    ``conectar`` devolve uma conexão (ex.: ``Database.get_connection``);
+    ``antes_do_commit`` roda no cursor do lote quando alguma operação com
+    ``versionar=True`` alterou linhas (o Database incrementa a versão dos
+    dados uma vez por lote, não por operação); ``ao_retentar`` é avisado a
+    cada lote refeito por banco bloqueado.
+    """
+
+    def __init__(self, conectar: Callable[[], sqlite3.Connection], tamanho_lote: int = 64,
+                 espera_ms: float = 2.0, max_tentativas: int = 5, backoff_base: float = 0.01,
+                 backoff_maximo: float = 0.5,
+                 antes_do_commit: Optional[Callable[[sqlite3.Cursor], None]] = None,
+                 ao_retentar: Optional[Callable[[], None]] = None):
+        self.conectar = conectar
+        self.tamanho_lote = tamanho_lote
+        self.espera_s = espera_ms / 1000
+        self.max_tentativas = max_tentativas
+        self.backoff_base = backoff_base
+        self.backoff_maximo = backoff_maximo
+        self.antes_do_commit = antes_do_commit
+        self.ao_retentar = ao_retentar
+        self._fila: 'queue.Queue[Optional[Tuple[Operacao, bool, Future]]]' = queue.Queue()
+        self._lock = threading.Lock()
+        self._encerrado = False
+        self._stats = {'lotes': 0, 'operacoes': 0, 'falhas': 0, 'retentativas': 0, 'maior_lote': 0}
+        self._thread = threading.Thread(target=self._laco, name='pega-ai-escritor', daemon=True)
+        self._thread.start()
+
+    def submeter(self, operacao: Callable[[sqlite3.Cursor], T], versionar: bool = True) -> 'Future[T]':
+        """Enfileira a operação; o Future recebe o retorno (ou a exceção) após o COMMIT do lote.
+
+        Cancelar o Future antes de o lote começar descarta a operação.
+        """
+        futuro: Future = Future()
+        with self._lock:
+            if self._encerrado:
+                raise RuntimeError("Escritor agrupado encerrado")
+            self._fila.put((operacao, versionar, futuro))
+        return futuro
+
+    def executar(self, operacao: Callable[[sqlite3.Cursor], T], versionar: bool = True) -> T:
+        """Enfileira e aguarda o resultado (mesmo contrato de Database._executar_escrita)"""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Escrita aninhada dentro de uma operação do escritor agrupado")
+        return self.submeter(operacao, versionar).result()
+
+    def _proximo_lote(self, primeiro: Tuple[Operacao, bool, Future]) -> Tuple[List[Tuple[Operacao, bool, Future]], bool]:
+        """Junta operações até encher o lote ou vencer a espera; indica se chegou o sinal de parada"""
+        lote = [primeiro]
+        prazo = time.monotonic() + self.espera_s
+        while len(lote) < self.tamanho_lote:
+            try:
+                item = self._fila.get(timeout=max(0.0, prazo - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                return lote, True
+            lote.append(item)
+        return lote, False
+
+    def _laco(self) -> None:
+        parar = False
+        try:
+            while not parar:
+                item = self._fila.get()
+                if item is None:
+                    break
+                lote, parar = self._proximo_lote(item)
+                lote = [op for op in lote if op[2].set_running_or_notify_cancel()]
+                if not lote:
+                    continue
+                try:
+                    self._aplicar(lote)
+                except BaseException as e:
+                    # nada escapa para a thread: o lote falha e o laço segue
+                    self._falhar(lote, e)
+        finally:
+            with self._lock:
+                self._encerrado = True
+            self._esvaziar_fila()
+
+    def _esvaziar_fila(self) -> None:
+        """Falha o que ficou na fila quando a thread termina (ninguém fica preso em result())"""
+        erro = RuntimeError("Escritor agrupado encerrado")
+        while True:
+            try:
+                item = self._fila.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None and item[2].set_running_or_notify_cancel():
+                item[2].set_exception(erro)
+
+    def _aplicar(self, lote: List[Tuple[Operacao, bool, Future]]) -> None:
+        """Aplica o lote numa transação (refeita inteira se o banco estiver bloqueado).
+
+        Qualquer outra falha (inclusive ao obter a conexão) sobe para ``_laco``,
+        que a repassa a todas as operações do lote.
+        """
+        tentativa = 0
+        while True:
+            conn = self.conectar()
+            try:
+                resultados = self._transacao(conn, lote)
+                break
+            except BaseException as e:
+                conn.rollback()
+                if not (isinstance(e, sqlite3.OperationalError) and banco_bloqueado(e)) \
+                        or tentativa >= self.max_tentativas:
+                    raise
+            finally:
+                conn.close()
+
+            with self._lock:
+                self._stats['retentativas'] += 1
+            if self.ao_retentar:
+                self.ao_retentar()
+            espera = min(self.backoff_maximo, self.backoff_base * (2 ** tentativa))
+            time.sleep(espera + random.uniform(0, espera))
+            tentativa += 1
+
+        falhas = 0
+        for (_, _, futuro), (resultado, erro) in zip(lote, resultados):
+            if erro is None:
+                futuro.set_result(resultado)
+            else:
+                futuro.set_exception(erro)
+                falhas += 1
+        with self._lock:
+            self._stats['lotes'] += 1
+            self._stats['operacoes'] += len(lote)
+            self._stats['falhas'] += falhas
+            self._stats['maior_lote'] = max(self._stats['maior_lote'], len(lote))
+
+    def _transacao(self, conn: sqlite3.Connection, lote: List[Tuple[Operacao, bool, Future]]) -> List[Tuple[Any, Optional[BaseException]]]:
+        """Uma transação com um SAVEPOINT por operação; retorna (resultado, exceção) de cada uma"""
+        resultados: List[Tuple[Any, Optional[BaseException]]] = []
+        alterou = False
+        conn.execute('BEGIN IMMEDIATE')
+        for operacao, versionar, _ in lote:
+            alteracoes_antes = conn.total_changes
+            conn.execute('SAVEPOINT operacao')
+            try:
+                resultado = operacao(conn.cursor())
+            except Exception as e:
+                if isinstance(e, sqlite3.OperationalError) and banco_bloqueado(e):
+                    raise   # refaz o lote inteiro
+                conn.execute('ROLLBACK TO operacao')
+                conn.execute('RELEASE operacao')
+                resultados.append((None, e))
+            else:
+                conn.execute('RELEASE operacao')
+                alterou = alterou or (versionar and conn.total_changes != alteracoes_antes)
+                resultados.append((resultado, None))
+        if alterou and self.antes_do_commit:
+            self.antes_do_commit(conn.cursor())
+        conn.commit()
+        return resultados
+
+    def _falhar(self, lote: List[Tuple[Operacao, bool, Future]], erro: BaseException) -> None:
+        for _, _, futuro in lote:
+            if not futuro.done():
+                futuro.set_exception(erro)
+        with self._lock:
+            self._stats['falhas'] += len(lote)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        """Lotes aplicados, operações, falhas, retentativas, maior lote e média por lote"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['media_lote'] = stats['operacoes'] / stats['lotes'] if stats['lotes'] else 0.0
+        return stats
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Aplica o que já está na fila e encerra a thread"""
+        with self._lock:
+            if self._encerrado:
+                return
+            self._fila.put(None)
+        self._thread.join(timeout)
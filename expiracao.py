@@ -0,0 +1,84 @@
+"""Varredura periódica de reservas não retiradas.
+
+Pedidos 'reservado'/'pago' seguram estoque até serem retirados ou
+cancelados; depois do fim da janela de retirada (mais uma tolerância) o
+varredor os cancela em massa via ``Database.expirar_reservas``, devolvendo o
+estoque às ofertas e estornando os pagamentos.
+
+Roda como thread dentro do app (``iniciar``/``parar``) ou uma vez pela CLI:
+``python manutencao.py expirar-reservas``.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from database import Database
+
+
+class VarredorReservas:
+    """Executa ``expirar_reservas`` a cada ``intervalo_s`` segundos e acumula métricas.
+
+    ``ao_liberar`` recebe os ids das ofertas que tiveram estoque devolvido
+    (ex.: ``MotorReservas.sincronizar`` para recarregar os contadores).
+    """
+
+    def __init__(self, db: Database, intervalo_s: float = 300.0, tolerancia_minutos: int = 30,
+                 tamanho_lote: int = 500, ao_liberar: Optional[Callable[[List[int]], None]] = None):
+        self.db = db
+        self.intervalo_s = intervalo_s
+        self.tolerancia_minutos = tolerancia_minutos
+        self.tamanho_lote = tamanho_lote
+        self.ao_liberar = ao_liberar
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats: Dict[str, Any] = {
+            'execucoes': 0, 'falhas': 0, 'pedidos': 0, 'pagamentos_estornados': 0,
+            'unidades_devolvidas': 0, 'ultima_execucao': None,
+        }
+
+    def varrer(self) -> Dict[str, Any]:
+        """Uma varredura completa; retorna o resumo da execução (com duração e horário)"""
+        inicio = time.perf_counter()
+        resumo = self.db.expirar_reservas(self.tolerancia_minutos, self.tamanho_lote)
+        resumo['duracao_s'] = time.perf_counter() - inicio
+        resumo['em'] = time.strftime('%Y-%m-%d %H:%M:%S')
+
+        with self._lock:
+            self._stats['execucoes'] += 1
+            for chave in ('pedidos', 'pagamentos_estornados', 'unidades_devolvidas'):
+                self._stats[chave] += resumo[chave]
+            self._stats['ultima_execucao'] = resumo
+
+        if resumo['ofertas'] and self.ao_liberar:
+            self.ao_liberar(resumo['ofertas'])
+        return resumo
+
+    def _laco(self) -> None:
+        while not self._parar.is_set():
+            try:
+                self.varrer()
+            except Exception as e:
+                with self._lock:
+                    self._stats['falhas'] += 1
+                print(f"Erro na varredura de reservas: {e}")
+            self._parar.wait(self.intervalo_s)
+
+    def iniciar(self) -> None:
+        """Inicia a thread de varredura (a primeira execução é imediata)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._laco, name='pega-ai-varredor', daemon=True)
+        self._thread.start()
+
+    def parar(self, timeout: Optional[float] = None) -> None:
+        """Sinaliza a thread e aguarda a varredura em andamento terminar"""
+        self._parar.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        """Totais acumulados (execucoes, falhas, pedidos, ...) e o resumo da última execução"""
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,90 @@
+"""Comandos de manutenção do banco do Pega Aí.
+
+Uso:
+    python manutencao.py reconstruir-kpis [--db pega_ai.db]
+    python manutencao.py atualizar-rollups [--db pega_ai.db]
+    python manutencao.py reconstruir-rollups [--db pega_ai.db]
+    python manutencao.py expirar-reservas [--db pega_ai.db] [--tolerancia 30] [--lote 500] [--intervalo 0]
+    python manutencao.py podar-eventos [--db pega_ai.db] [--dias 7]
+"""
+import argparse
+import time
+
+from database import Database
+from expiracao import VarredorReservas
+
+
+def reconstruir_kpis(db: Database, args: argparse.Namespace) -> None:
+    """Recalcula a tabela kpis_estabelecimento a partir do histórico"""
+    inicio = time.perf_counter()
+    total = db.reconstruir_kpis()
+    print(f"✅ KPIs de {total} estabelecimentos recalculados em {time.perf_counter() - inicio:.2f}s")
+
+
+def atualizar_rollups(db: Database, args: argparse.Namespace) -> None:
+    """Aplica aos rollups de vendas os eventos pendentes da fila"""
+    inicio = time.perf_counter()
+    total = db.atualizar_rollups()
+    print(f"✅ {total} eventos aplicados aos rollups em {time.perf_counter() - inicio:.2f}s")
+
+
+def reconstruir_rollups(db: Database, args: argparse.Namespace) -> None:
+    """Recalcula os rollups de vendas a partir do histórico de pedidos"""
+    inicio = time.perf_counter()
+    total = db.reconstruir_rollups()
+    print(f"✅ Rollups recalculados ({total} linhas diárias por oferta) em {time.perf_counter() - inicio:.2f}s")
+
+
+def expirar_reservas(db: Database, args: argparse.Namespace) -> None:
+    """Cancela reservas não retiradas após a janela de retirada (uma vez ou a cada --intervalo s)"""
+    varredor = VarredorReservas(db, tolerancia_minutos=args.tolerancia, tamanho_lote=args.lote)
+    while True:
+        r = varredor.varrer()
+        print(f"✅ {r['pedidos']} pedidos expirados em {r['lotes']} lotes, {r['unidades_devolvidas']} unidades "
+              f"devolvidas a {len(r['ofertas'])} ofertas, {r['pagamentos_estornados']} pagamentos estornados "
+              f"em {r['duracao_s']:.2f}s")
+        if not args.intervalo:
+            break
+        time.sleep(args.intervalo)
+
+
+def podar_eventos(db: Database, args: argparse.Namespace) -> None:
+    """Apaga do log eventos_pedido os eventos mais antigos que --dias"""
+    inicio = time.perf_counter()
+    total = db.podar_eventos_pedido(args.dias)
+    print(f"✅ {total} eventos de pedidos removidos em {time.perf_counter() - inicio:.2f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manutenção do banco do Pega Aí")
+    parser.add_argument('--db', default='pega_ai.db', help='arquivo do banco SQLite')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    comandos.add_parser('reconstruir-kpis', help='recalcula kpis_estabelecimento do zero')
+    comandos.add_parser('atualizar-rollups', help='aplica os pedidos novos aos rollups de vendas')
+    comandos.add_parser('reconstruir-rollups', help='recalcula os rollups de vendas do zero')
+    expirar = comandos.add_parser('expirar-reservas', help='cancela reservas vencidas e devolve o estoque')
+    expirar.add_argument('--tolerancia', type=int, default=30, help='minutos após o fim da janela de retirada')
+    expirar.add_argument('--lote', type=int, default=500, help='pedidos por transação')
+    expirar.add_argument('--intervalo', type=float, default=0, help='repete a cada N segundos (0 = uma vez)')
+    podar = comandos.add_parser('podar-eventos', help='apaga eventos antigos do log de pedidos')
+    podar.add_argument('--dias', type=int, default=7, help='mantém os eventos dos últimos N dias')
+
+    args = parser.parse_args()
+    acoes = {
+        'reconstruir-kpis': reconstruir_kpis,
+        'atualizar-rollups': atualizar_rollups,
+        'reconstruir-rollups': reconstruir_rollups,
+        'expirar-reservas': expirar_reservas,
+        'podar-eventos': podar_eventos,
+    }
+
+    db = Database(args.db)
+    try:
+        acoes[args.comando](db, args)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
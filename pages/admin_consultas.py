@@ -0,0 +1,131 @@
+import os
+
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+from perfilador import PerfiladorConsultas
+from recursos import get_database
+
+
+# -----------------------------
+# Acesso: só com ?token=<PEGA_AI_ADMIN_TOKEN> na URL
+# -----------------------------
+def acesso_liberado() -> bool:
+    token = os.environ.get("PEGA_AI_ADMIN_TOKEN")
+    return bool(token) and st.query_params.get("token") == token
+
+
+def main():
+    st.set_page_config(page_title="Consultas – Pega Aí", layout="wide")
+
+    if not acesso_liberado():
+        st.error("Página não encontrada.")
+        st.stop()
+
+    st.title("🩺 Perfil de Consultas SQL")
+
+    db = get_database()
+    perfilador = db.perfilador
+
+    if perfilador is None:
+        st.info("Perfilador desativado. Inicie o app com PEGA_AI_PERFILAR=1 ou ative abaixo.")
+        if st.button("Ativar perfilador"):
+            db.perfilador = PerfiladorConsultas.do_ambiente() or PerfiladorConsultas()
+            st.rerun()
+        st.stop()
+
+    col_ordem, col_limpar, col_desligar = st.columns([3, 1, 1])
+    criterios = {
+        "Tempo total": "tempo_total_ms",
+        "p99": "p99_ms",
+        "Chamadas": "chamadas",
+        "Linhas por chamada": "linhas_media",
+    }
+    criterio = col_ordem.selectbox("Ordenar por", list(criterios))
+    if col_limpar.button("Limpar estatísticas"):
+        perfilador.limpar()
+        st.rerun()
+    if col_desligar.button("Desativar"):
+        db.perfilador = None
+        st.rerun()
+
+    relatorio = perfilador.relatorio(ordenar_por=criterios[criterio], limite=None)
+    lentas = perfilador.consultas_lentas()
+
+    # -----------------------------
+    # Resumo
+    # -----------------------------
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Formatos de consulta", len(relatorio))
+    col2.metric("Execuções", sum(r["chamadas"] for r in relatorio))
+    col3.metric("Com scan completo", sum(r["scan_completo"] for r in relatorio))
+    col4.metric(f"Lentas (≥ {perfilador.limite_lento_ms:g} ms)", len(lentas))
+
+    if not relatorio:
+        st.info("Nenhuma consulta registrada ainda. Navegue pelo app e volte aqui.")
+        st.stop()
+
+    # -----------------------------
+    # Top consultas
+    # -----------------------------
+    st.header("🔝 Top Consultas")
+
+    df = pd.DataFrame([{
+        "⚠️": "SCAN" if r["scan_completo"] else "",
+        "método": ", ".join(r["metodos"]),
+        "chamadas": r["chamadas"],
+        "total (ms)": round(r["tempo_total_ms"], 2),
+        "média (ms)": round(r["media_ms"], 3),
+        "p50 (ms)": round(r["p50_ms"], 3),
+        "p99 (ms)": round(r["p99_ms"], 3),
+        "máx (ms)": round(r["max_ms"], 3),
+        "linhas/chamada": round(r["linhas_media"], 1),
+        "consulta": r["forma"][:160],
+    } for r in relatorio[:50]])
+    st.dataframe(df, use_container_width=True, hide_index=True)
+
+    # -----------------------------
+    # Scans completos
+    # -----------------------------
+    scans = [r for r in relatorio if r["scan_completo"]]
+    if scans:
+        st.header("🐢 Consultas com Scan Completo de Tabela")
+        for r in scans:
+            with st.expander(f"{', '.join(r['metodos'])} – {r['chamadas']} chamadas, {r['tempo_total_ms']:.1f} ms"):
+                st.code(r["sql"], language="sql")
+                st.code("\n".join(r["plano"]), language="text")
+
+    # -----------------------------
+    # Detalhe de uma consulta
+    # -----------------------------
+    st.header("🔎 Detalhe")
+
+    indice = st.selectbox(
+        "Consulta",
+        range(min(len(relatorio), 50)),
+        format_func=lambda i: f"#{i + 1} {', '.join(relatorio[i]['metodos'])}: {relatorio[i]['forma'][:80]}",
+    )
+    r = relatorio[indice]
+    st.code(r["sql"], language="sql")
+    st.code("\n".join(r["plano"]) or "(sem plano)", language="text")
+
+    histograma = pd.DataFrame({"faixa": list(r["histograma"]), "execuções": list(r["histograma"].values())})
+    fig = px.bar(histograma, x="faixa", y="execuções", title="Latência (janela recente)")
+    st.plotly_chart(fig, use_container_width=True)
+
+    # -----------------------------
+    # Log de consultas lentas
+    # -----------------------------
+    st.header("⏱️ Consultas Lentas")
+
+    if lentas:
+        st.dataframe(pd.DataFrame(lentas), use_container_width=True, hide_index=True)
+        if perfilador.arquivo_lento:
+            st.caption(f"Também gravadas em {perfilador.arquivo_lento}")
+    else:
+        st.info("Nenhuma consulta acima do limite.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,17 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
 import plotly.express as px
-import sqlite3
-import scipy.stats as stats
+
+from analytics_queries import carregar_pacote
+from recursos import get_database
+
 
 # ------------------------------
-# Conexão com o banco
+# Pacote de análises (memoizado pela versão dos dados)
 # ------------------------------
-def get_connection():
-    return sqlite3.connect("pega_ai.db", check_same_thread=False)
+@st.cache_data(max_entries=4, show_spinner=False)
+def obter_pacote(versao_dados: int):
+    # A versão só entra na chave do cache: qualquer escrita no banco a incrementa
+    return carregar_pacote(get_database())
 
 # -----------------------------
 # Página principal
@@ -19,7 +21,10 @@ def main():
     st.title("📊 Dashboard de Análises – Pega Aí")
     st.markdown("Relatórios automáticos com base nos dados populados no protótipo.")
 
-    conn = get_connection()
+    db = get_database()
+    # Único ponto que drena a fila dos rollups; o carregador memoizado só lê
+    db.atualizar_rollups()
+    pacote = obter_pacote(db.obter_versao_dados())
 
     # -----------------------------
     # KPIs gerais
@@ -28,15 +33,11 @@ def main():
 
     col1, col2, col3, col4 = st.columns(4)
 
-    total_ofertas = pd.read_sql("SELECT COUNT(*) AS total FROM ofertas", conn)["total"][0]
-    total_pedidos = pd.read_sql("SELECT COUNT(*) AS total FROM pedidos", conn)["total"][0]
-    total_retirados = pd.read_sql("SELECT COUNT(*) AS total FROM pedidos WHERE status='retirado'", conn)["total"][0]
-    total_consumidores = pd.read_sql("SELECT COUNT(*) AS total FROM usuarios WHERE tipo='Consumidor'", conn)["total"][0]
-
-    col1.metric("Ofertas cadastradas", total_ofertas)
-    col2.metric("Pedidos criados", total_pedidos)
-    col3.metric("Pedidos retirados", total_retirados)
-    col4.metric("Consumidores", total_consumidores)
+    kpis = pacote["kpis"]
+    col1.metric("Ofertas cadastradas", kpis["total_ofertas"])
+    col2.metric("Pedidos criados", kpis["total_pedidos"])
+    col3.metric("Pedidos retirados", kpis["total_retirados"])
+    col4.metric("Consumidores", kpis["total_consumidores"])
 
     st.markdown("---")
 
@@ -45,22 +46,12 @@ def main():
     # -----------------------------
     st.header("💳 Ticket Médio")
 
-    df_ticket = pd.read_sql("""
-        SELECT valor_total
-        FROM pedidos
-        WHERE status = 'retirado'
-    """, conn)
-
-    if len(df_ticket) > 0:
-        ticket_medio = df_ticket["valor_total"].mean()
-        ticket_min = df_ticket["valor_total"].min()
-        ticket_max = df_ticket["valor_total"].max()
-        ticket_std = df_ticket["valor_total"].std()
-
-        st.metric("Ticket médio", f"R$ {ticket_medio:.2f}")
-        st.markdown(f"- **Mínimo:** R$ {ticket_min:.2f}")
-        st.markdown(f"- **Máximo:** R$ {ticket_max:.2f}")
-        st.markdown(f"- **Desvio padrão:** {ticket_std:.2f}")
+    ticket = pacote["ticket"]
+    if ticket is not None:
+        st.metric("Ticket médio", f"R$ {ticket['medio']:.2f}")
+        st.markdown(f"- **Mínimo:** R$ {ticket['min']:.2f}")
+        st.markdown(f"- **Máximo:** R$ {ticket['max']:.2f}")
+        st.markdown(f"- **Desvio padrão:** {ticket['std']:.2f}")
     else:
         st.info("Não há pedidos retirados suficientes para calcular o ticket médio.")
 
@@ -71,19 +62,7 @@ def main():
     # -----------------------------
     st.header("📦 Desempenho das Ofertas")
 
-    df_ofertas = pd.read_sql("""
-        SELECT 
-            o.id,
-            o.titulo,
-            o.categoria,
-            o.preco_venda,
-            o.preco_original,
-            o.estoque_inicial,
-            COALESCE(SUM(p.quantidade), 0) AS vendidos
-        FROM ofertas o
-        LEFT JOIN pedidos p ON p.oferta_id = o.id AND p.status='retirado'
-        GROUP BY o.id
-    """, conn)
+    df_ofertas = pacote["desempenho"]
 
     st.dataframe(df_ofertas)
 
@@ -104,10 +83,8 @@ def main():
     # -----------------------------
     st.header("📈 Correlação: Preço vs Vendas")
 
-    df_corr = df_ofertas.copy()
-
-    if len(df_corr) > 2 and df_corr["vendidos"].std() > 0:
-        corr_val = df_corr["preco_venda"].corr(df_corr["vendidos"])
+    corr_val = pacote["correlacao"]
+    if corr_val is not None:
         st.metric("Correlação (Pearson)", f"{corr_val:.3f}")
 
         if abs(corr_val) >= 0.5:
@@ -122,45 +99,21 @@ def main():
     st.markdown("---")
 
     # -----------------------------
-    # Teste estatístico por categoria (corrigido)
+    # Teste estatístico por categoria (quantidade por pedido retirado)
     # -----------------------------
     st.header("🧪 Teste Estatístico entre Categorias")
 
-    df_teste = pd.read_sql("""
-        SELECT 
-            o.categoria,
-            COALESCE(SUM(p.quantidade), 0) AS total_vendido
-        FROM ofertas o
-        LEFT JOIN pedidos p ON p.oferta_id = o.id AND p.status='retirado'
-        GROUP BY o.categoria
-        HAVING COUNT(DISTINCT o.id) >= 3
-    """, conn)
-
-    if len(df_teste["categoria"].unique()) >= 2:
-        categorias = df_teste["categoria"].unique()
-
-        # Criar lista de grupos para ANOVA
-        grupos = []
-        for cat in categorias:
-            valores = pd.read_sql("""
-                SELECT COALESCE(p.quantidade,0) as vendidos
-                FROM ofertas o
-                LEFT JOIN pedidos p ON p.oferta_id = o.id AND p.status='retirado'
-                WHERE o.categoria = ?
-            """, conn, params=[cat])
-            grupos.append(valores["vendidos"])
-
-        try:
-            f_valor, p_valor = stats.f_oneway(*grupos)
-
+    if len(pacote["categorias_anova"]) >= 2:
+        anova = pacote["anova"]
+        if anova is not None:
             st.write("**ANOVA** entre categorias")
-            st.write(f"F = {f_valor:.3f}, p = {p_valor:.4f}")
+            st.write(f"F = {anova['f']:.3f}, p = {anova['p']:.4f}")
 
-            if p_valor < 0.05:
+            if anova["p"] < 0.05:
                 st.success("Há diferença estatisticamente significativa entre categorias.")
             else:
                 st.info("Não há diferença significativa.")
-        except:
+        else:
             st.warning("Não foi possível realizar ANOVA. Verifique se há dados suficientes.")
     else:
         st.info("Não há categorias suficientes para realizar teste estatístico (precisa de 2+ categorias).")
@@ -172,13 +125,7 @@ def main():
     # -----------------------------
     st.header("📅 Vendas ao Longo do Tempo")
 
-    df_tempo = pd.read_sql("""
-        SELECT DATE(criado_em) as data, SUM(quantidade) as vendidos
-        FROM pedidos
-        WHERE status='retirado'
-        GROUP BY DATE(criado_em)
-        ORDER BY DATE(criado_em)
-    """, conn)
+    df_tempo = pacote["tempo"]
 
     if len(df_tempo) > 0:
         fig2 = px.line(df_tempo, x="data", y="vendidos", title="Vendas ao longo do tempo")
@@ -186,8 +133,6 @@ def main():
     else:
         st.info("Ainda não há vendas retiradas para análise temporal.")
 
-    conn.close()
-
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,328 @@
+"""Perfilador de consultas SQL do Database (opcional).
+
+Quando ativo, toda conexão entregue pelo pool cria cursores instrumentados
+que medem cada statement (tempo de parede incluindo o fetch, linhas
+retornadas/afetadas e o método do Database que o disparou), guardam o
+``EXPLAIN QUERY PLAN`` da primeira vez que cada formato de consulta aparece
+e mantêm uma janela móvel de latências por formato. Statements acima do
+limite vão para o log de consultas lentas (JSON por linha).
+
+Ativação pelo ambiente (usada pelo app Streamlit)::
+
+    PEGA_AI_PERFILAR=1 PEGA_AI_LIMITE_LENTO_MS=50 streamlit run streamlit_app.py
+"""
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import numpy as np
+
+# Limites superiores (ms) das faixas do histograma de latência
+FAIXAS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+_PASTA_PROJETO = os.path.dirname(os.path.abspath(__file__))
+_ARQUIVOS_IGNORADOS = {os.path.abspath(__file__), os.path.join(_PASTA_PROJETO, 'connection_pool.py')}
+_EXPLICAVEIS = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_RE_LISTA = re.compile(r'\?(?:\s*,\s*\?)+')
+_RE_ESPACOS = re.compile(r'\s+')
+
+
+def normalizar_sql(sql: str) -> str:
+    """Formato da consulta: literais viram ``?`` e listas de ``?`` viram ``?...``"""
+    forma = _RE_STRING.sub('?', sql)
+    forma = _RE_NUMERO.sub('?', forma)
+    forma = _RE_LISTA.sub('?...', forma)
+    return _RE_ESPACOS.sub(' ', forma).strip()
+
+
+def _scan_completo(plano: List[str]) -> bool:
+    """True se o plano varre alguma tabela inteira (SCAN sem índice)"""
+    return any(
+        linha.startswith('SCAN ') and ' USING ' not in linha
+        and 'VIRTUAL TABLE' not in linha and 'CONSTANT ROW' not in linha
+        for linha in plano
+    )
+
+
+_atribuicao = threading.local()
+
+
+@contextmanager
+def atribuir_metodo(metodo: str) -> Iterator[None]:
+    """Atribui ao ``metodo`` as consultas feitas nesta thread dentro do bloco.
+
+    Usado pelas escritas do Database, que recebem o nome do método
+    explicitamente (a operação pode rodar na thread do EscritorAgrupado,
+    fora da pilha de quem a chamou).
+    """
+    anterior = getattr(_atribuicao, 'metodo', None)
+    _atribuicao.metodo = metodo
+    try:
+        yield
+    finally:
+        _atribuicao.metodo = anterior
+
+
+def _metodo_chamador() -> str:
+    """Método atribuído com ``atribuir_metodo`` ou a primeira função pública do projeto na pilha"""
+    metodo = getattr(_atribuicao, 'metodo', None)
+    if metodo is not None:
+        return metodo
+    frame = sys._getframe(2)
+    while frame is not None:
+        codigo = frame.f_code
+        nome = codigo.co_name
+        if (codigo.co_filename.startswith(_PASTA_PROJETO) and codigo.co_filename not in _ARQUIVOS_IGNORADOS
+                and not nome.startswith(('_', '<'))):
+            return nome
+        frame = frame.f_back
+    return '?'
+
+
+class _EstatisticaForma:
+    """Acumulados e janela móvel de latências de um formato de consulta"""
+
+    __slots__ = ('sql', 'plano', 'scan_completo', 'chamadas', 'tempo_total', 'tempo_max',
+                 'linhas_total', 'metodos', 'recentes')
+
+    def __init__(self, sql: str, janela: int):
+        self.sql = sql
+        self.plano: Optional[List[str]] = None
+        self.scan_completo = False
+        self.chamadas = 0
+        self.tempo_total = 0.0
+        self.tempo_max = 0.0
+        self.linhas_total = 0
+        self.metodos: Counter = Counter()
+        self.recentes: Deque[float] = deque(maxlen=janela)
+
+
+class PerfiladorConsultas:
+    """Coleta estatísticas por formato de consulta e registra as consultas lentas"""
+
+    def __init__(self, limite_lento_ms: float = 100.0, arquivo_lento: Optional[str] = 'consultas_lentas.log',
+                 janela: int = 1000, max_lentas: int = 200, explicar: bool = True):
+        self.limite_lento_ms = limite_lento_ms
+        self.arquivo_lento = arquivo_lento
+        self.janela = janela
+        self.explicar = explicar
+        self._formas: Dict[str, _EstatisticaForma] = {}
+        self._lentas: Deque[Dict[str, Any]] = deque(maxlen=max_lentas)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def do_ambiente(cls) -> Optional['PerfiladorConsultas']:
+        """Cria o perfilador se ``PEGA_AI_PERFILAR`` estiver ativo no ambiente"""
+        if os.environ.get('PEGA_AI_PERFILAR', '').lower() not in ('1', 'true', 'sim'):
+            return None
+        return cls(
+            limite_lento_ms=float(os.environ.get('PEGA_AI_LIMITE_LENTO_MS', 100)),
+            arquivo_lento=os.environ.get('PEGA_AI_LOG_LENTAS', 'consultas_lentas.log'),
+        )
+
+    # ---------- Coleta (chamada pelos cursores instrumentados) ----------
+
+    def preparar(self, conn: sqlite3.Connection, sql: str, parametros: Any) -> str:
+        """Retorna o formato da consulta e guarda o plano na primeira vez que aparece"""
+        forma = normalizar_sql(sql)
+        with self._lock:
+            estatistica = self._formas.get(forma)
+            if estatistica is None:
+                estatistica = self._formas[forma] = _EstatisticaForma(sql.strip(), self.janela)
+            precisa_plano = estatistica.plano is None
+            if precisa_plano:
+                estatistica.plano = []   # Reserva: outra thread não explica de novo
+        if precisa_plano and self.explicar and forma.upper().startswith(_EXPLICAVEIS):
+            try:
+                linhas = conn.cursor(sqlite3.Cursor).execute(f'EXPLAIN QUERY PLAN {sql}', parametros).fetchall()
+                plano = [linha[3] for linha in linhas]
+            except sqlite3.Error as e:
+                plano = [f'(plano indisponível: {e})']
+            with self._lock:
+                estatistica.plano = plano
+                estatistica.scan_completo = _scan_completo(plano)
+        return forma
+
+    def registrar(self, forma: str, sql: str, parametros: Any, duracao: float, linhas: int, metodo: str) -> None:
+        """Contabiliza uma execução e a envia ao log se passou do limite"""
+        with self._lock:
+            estatistica = self._formas[forma]
+            estatistica.chamadas += 1
+            estatistica.tempo_total += duracao
+            estatistica.tempo_max = max(estatistica.tempo_max, duracao)
+            estatistica.linhas_total += max(linhas, 0)
+            estatistica.metodos[metodo] += 1
+            estatistica.recentes.append(duracao)
+
+        duracao_ms = duracao * 1000
+        if duracao_ms < self.limite_lento_ms:
+            return
+        registro = {
+            'quando': datetime.now().isoformat(timespec='milliseconds'),
+            'duracao_ms': round(duracao_ms, 3),
+            'metodo': metodo,
+            'linhas': linhas,
+            'sql': _RE_ESPACOS.sub(' ', sql).strip(),
+            'parametros': repr(parametros)[:200],
+        }
+        with self._lock:
+            self._lentas.append(registro)
+            if self.arquivo_lento:
+                with open(self.arquivo_lento, 'a', encoding='utf-8') as arquivo:
+                    arquivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+    # ---------- Consulta ----------
+
+    def relatorio(self, ordenar_por: str = 'tempo_total_ms', limite: Optional[int] = 20) -> List[Dict[str, Any]]:
+        """Formatos de consulta com totais, percentis da janela recente e plano"""
+        with self._lock:
+            formas = [(forma, e, np.array(e.recentes) * 1000) for forma, e in self._formas.items() if e.chamadas]
+            linhas = []
+            for forma, e, recentes in formas:
+                p50, p95, p99 = np.percentile(recentes, [50, 95, 99])
+                linhas.append({
+                    'forma': forma,
+                    'sql': e.sql,
+                    'metodos': dict(e.metodos.most_common()),
+                    'chamadas': e.chamadas,
+                    'tempo_total_ms': e.tempo_total * 1000,
+                    'media_ms': e.tempo_total * 1000 / e.chamadas,
+                    'p50_ms': float(p50),
+                    'p95_ms': float(p95),
+                    'p99_ms': float(p99),
+                    'max_ms': e.tempo_max * 1000,
+                    'linhas_media': e.linhas_total / e.chamadas,
+                    'plano': list(e.plano or []),
+                    'scan_completo': e.scan_completo,
+                    'histograma': self._histograma(recentes),
+                })
+        linhas.sort(key=lambda linha: linha[ordenar_por], reverse=True)
+        return linhas[:limite] if limite else linhas
+
+    @staticmethod
+    def _histograma(recentes_ms: np.ndarray) -> Dict[str, int]:
+        """Contagem da janela recente em cada faixa de FAIXAS_MS"""
+        contagens = np.bincount(np.searchsorted(FAIXAS_MS, recentes_ms), minlength=len(FAIXAS_MS) + 1)
+        rotulos = [f'≤{faixa:g} ms' for faixa in FAIXAS_MS] + [f'>{FAIXAS_MS[-1]:g} ms']
+        return dict(zip(rotulos, contagens.tolist()))
+
+    def consultas_lentas(self) -> List[Dict[str, Any]]:
+        """Consultas lentas mais recentes (da mais nova para a mais antiga)"""
+        with self._lock:
+            return list(reversed(self._lentas))
+
+    def limpar(self) -> None:
+        """Descarta estatísticas, planos e consultas lentas em memória"""
+        with self._lock:
+            self._formas.clear()
+            self._lentas.clear()
+
+
+class CursorPerfilado(sqlite3.Cursor):
+    """Cursor que mede cada statement e reporta ao perfilador da conexão.
+
+    A medição de um SELECT fica aberta até o resultado ser consumido (ou até
+    o próximo execute/close), somando o tempo gasto nos fetches.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        super().__init__(conn)
+        self._perfilador: Optional[PerfiladorConsultas] = getattr(conn, '_perfilador', None)
+        self._medicao: Optional[list] = None
+
+    def _iniciar(self, sql: str, parametros: Any) -> float:
+        self._finalizar()
+        forma = self._perfilador.preparar(self.connection, sql, parametros)
+        self._medicao = [forma, sql, parametros, 0.0, 0, _metodo_chamador()]
+        return time.perf_counter()
+
+    def _apos_execute(self, inicio: float) -> None:
+        self._medicao[3] += time.perf_counter() - inicio
+        if self.description is None:
+            # Sem resultado (INSERT/UPDATE/DELETE): linhas afetadas
+            self._medicao[4] = self.rowcount
+            self._finalizar()
+
+    def _finalizar(self) -> None:
+        medicao, self._medicao = self._medicao, None
+        if medicao is not None:
+            self._perfilador.registrar(*medicao)
+
+    def execute(self, sql: str, parametros: Any = ()) -> 'CursorPerfilado':
+        if self._perfilador is None:
+            return super().execute(sql, parametros)
+        inicio = self._iniciar(sql, parametros)
+        super().execute(sql, parametros)
+        self._apos_execute(inicio)
+        return self
+
+    def executemany(self, sql: str, sequencia: Any) -> 'CursorPerfilado':
+        if self._perfilador is None:
+            return super().executemany(sql, sequencia)
+        if not isinstance(sequencia, (list, tuple)):
+            sequencia = list(sequencia)
+        inicio = self._iniciar(sql, sequencia[0] if sequencia else ())
+        super().executemany(sql, sequencia)
+        self._apos_execute(inicio)
+        return self
+
+    def _medir_fetch(self, fetch, *args):
+        if self._medicao is None:
+            return fetch(*args)
+        inicio = time.perf_counter()
+        resultado = fetch(*args)
+        self._medicao[3] += time.perf_counter() - inicio
+        return resultado
+
+    def fetchone(self):
+        linha = self._medir_fetch(super().fetchone)
+        if self._medicao is not None:
+            if linha is None:
+                self._finalizar()
+            else:
+                self._medicao[4] += 1
+        return linha
+
+    def fetchmany(self, size: int = None):
+        linhas = self._medir_fetch(super().fetchmany, self.arraysize if size is None else size)
+        if self._medicao is not None:
+            self._medicao[4] += len(linhas)
+            if not linhas:
+                self._finalizar()
+        return linhas
+
+    def fetchall(self):
+        linhas = self._medir_fetch(super().fetchall)
+        if self._medicao is not None:
+            self._medicao[4] += len(linhas)
+            self._finalizar()
+        return linhas
+
+    def __next__(self):
+        try:
+            linha = self._medir_fetch(super().__next__)
+        except StopIteration:
+            self._finalizar()
+            raise
+        if self._medicao is not None:
+            self._medicao[4] += 1
+        return linha
+
+    def close(self) -> None:
+        self._finalizar()
+        super().close()
+
+    def __del__(self) -> None:
+        if getattr(self, '_medicao', None) is not None:
+            self._finalizar()
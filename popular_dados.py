@@ -1,256 +1,372 @@
+"""Gerador de dados sintéticos do Pega Aí.
+
+Cria estabelecimentos, consumidores, ofertas, pedidos e avaliações em lote
+(executemany em transações grandes), de forma determinística para uma dada
+semente. A escala vai da demonstração (padrão) a milhões de pedidos.
+
+Uso:
+    python popular_dados.py                          # escala de demonstração
+    python popular_dados.py --escala grande --db carga.db --substituir
+    python popular_dados.py --escala media --pedidos 250000 --seed 7
+"""
+import argparse
+import os
 import random
-from datetime import datetime, timedelta
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from codigos import codificar_inteiro
 from database import Database
 
 # Instalar faker: pip install faker
 try:
     from faker import Faker
-    fake = Faker('pt_BR')
 except ImportError:
     print("⚠️  Instale o Faker: pip install faker")
-    exit(1)
-
-def popular_banco_dados():
-    """Popula o banco com dados realistas para demonstração"""
-    
-    db = Database()
-    print("🚀 Iniciando população do banco de dados...")
-    
-    # Dados para ofertas
-    categorias = ['Padaria', 'Restaurante', 'Hortifrúti', 'Confeitaria', 'Mercado', 'Pizzaria']
-    
-    titulos_por_categoria = {
-        'Padaria': ['Cesta de Pães Artesanais', 'Surpresa da Padaria', 'Mix de Pães e Bolos'],
-        'Restaurante': ['Refeição Completa', 'Prato do Dia', 'Combo Executivo'],
-        'Hortifrúti': ['Cesta de Frutas', 'Legumes Frescos', 'Mix Orgânico'],
-        'Confeitaria': ['Doces Variados', 'Bolos e Tortas', 'Surpresa Doce'],
-        'Mercado': ['Cesta Básica Mini', 'Produtos Frescos', 'Surpresa do Mercado'],
-        'Pizzaria': ['Pizza Surpresa', 'Combo Pizza', 'Fatias Variadas']
-    }
-    
-    # Coordenadas de São Paulo (diferentes bairros)
-    coords_sp = [
-        (-23.550520, -46.633308, 'Centro - Sé'),
-        (-23.561414, -46.656011, 'Av. Paulista'),
-        (-23.587416, -46.682426, 'Pinheiros'),
-        (-23.574573, -46.645235, 'Jardins'),
-        (-23.533773, -46.625290, 'Santana'),
-        (-23.596593, -46.688034, 'Vila Madalena'),
-        (-23.652221, -46.654659, 'Jabaquara'),
-        (-23.519614, -46.618045, 'Tucuruvi'),
-        (-23.600785, -46.663929, 'Vila Mariana'),
-        (-23.545422, -46.639314, 'Bela Vista')
-    ]
-    
-    usuarios_estabelecimentos = []
-    usuarios_consumidores = []
-    
-    # 1. Criar 10 estabelecimentos
+    sys.exit(1)
+
+
+@dataclass(frozen=True)
+class Escala:
+    """Tamanho do banco gerado"""
+    estabelecimentos: int = 10
+    consumidores: int = 50
+    ofertas_min: int = 3             # Ofertas por estabelecimento
+    ofertas_max: int = 5
+    pedidos: int = 90
+    dias: int = 30                   # Dias de histórico dos pedidos
+    avaliacoes: int = 20
+
+
+ESCALAS = {
+    'demo': Escala(),
+    'media': Escala(estabelecimentos=500, consumidores=20_000, pedidos=100_000, dias=180, avaliacoes=5_000),
+    'grande': Escala(estabelecimentos=2_000, consumidores=100_000, pedidos=1_000_000, dias=365,
+                     avaliacoes=50_000),
+}
+
+SENHA_DEMO = "senha123"
+TAMANHO_LOTE = 100_000               # Linhas por transação
+TAMANHO_BLOCO_FAKER = 5_000          # Registros por tarefa do pool de processos
+
+CATEGORIAS = ['Padaria', 'Restaurante', 'Hortifrúti', 'Confeitaria', 'Mercado', 'Pizzaria']
+
+TITULOS_POR_CATEGORIA = {
+    'Padaria': ['Cesta de Pães Artesanais', 'Surpresa da Padaria', 'Mix de Pães e Bolos'],
+    'Restaurante': ['Refeição Completa', 'Prato do Dia', 'Combo Executivo'],
+    'Hortifrúti': ['Cesta de Frutas', 'Legumes Frescos', 'Mix Orgânico'],
+    'Confeitaria': ['Doces Variados', 'Bolos e Tortas', 'Surpresa Doce'],
+    'Mercado': ['Cesta Básica Mini', 'Produtos Frescos', 'Surpresa do Mercado'],
+    'Pizzaria': ['Pizza Surpresa', 'Combo Pizza', 'Fatias Variadas']
+}
+
+DESCRICOES = [
+    "Deliciosos produtos frescos do dia. Valor estimado de R$ {original:.2f} por apenas R$ {venda:.2f}!",
+    "Aproveite nossa seleção especial com até 70% de desconto. Uma surpresa deliciosa te aguarda!",
+    "Salve comida de qualidade e economize! Produtos frescos com grande desconto.",
+    "Caixa surpresa recheada de {categoria}. Qualidade garantida!"
+]
+
+HORARIOS = [('17:00', '18:00'), ('18:00', '19:00'), ('19:00', '20:00'), ('20:00', '21:00')]
+
+# Coordenadas de São Paulo (diferentes bairros)
+COORDS_SP = [
+    (-23.550520, -46.633308, 'Centro - Sé'),
+    (-23.561414, -46.656011, 'Av. Paulista'),
+    (-23.587416, -46.682426, 'Pinheiros'),
+    (-23.574573, -46.645235, 'Jardins'),
+    (-23.533773, -46.625290, 'Santana'),
+    (-23.596593, -46.688034, 'Vila Madalena'),
+    (-23.652221, -46.654659, 'Jabaquara'),
+    (-23.519614, -46.618045, 'Tucuruvi'),
+    (-23.600785, -46.663929, 'Vila Mariana'),
+    (-23.545422, -46.639314, 'Bela Vista')
+]
+
+STATUS_PEDIDOS = ['reservado', 'pago', 'retirado', 'cancelado']
+PROB_STATUS = [0.15, 0.10, 0.70, 0.05]
+
+COMENTARIOS = [
+    "Excelente! Comida fresca e deliciosa.",
+    "Adorei a variedade. Voltarei com certeza!",
+    "Ótimo custo-benefício. Recomendo!",
+    "Produtos de qualidade. Vale muito a pena!",
+    "Surpreendeu positivamente. Muita coisa boa!",
+    "Bom, mas esperava um pouco mais.",
+    "Razoável. Atendeu as expectativas.",
+    None  # Alguns sem comentário
+]
+
+
+# ---------- Geração com Faker (roda nos processos do pool) ----------
+
+def _gerar_consumidores(seed: int, inicio: int, fim: int) -> List[Tuple[str, str]]:
+    """(nome, telefone) dos consumidores [inicio, fim), com semente própria do bloco"""
+    fake = Faker('pt_BR')
+    fake.seed_instance(seed + inicio)
+    return [(fake.name(), fake.phone_number()) for _ in range(inicio, fim)]
+
+
+def _gerar_estabelecimentos(seed: int, inicio: int, fim: int) -> List[Tuple[str, str, str]]:
+    """(sobrenome, telefone, rua) dos estabelecimentos [inicio, fim)"""
+    fake = Faker('pt_BR')
+    fake.seed_instance(seed + 1_000_000_000 + inicio)
+    return [(fake.last_name(), fake.phone_number(), fake.street_name()) for _ in range(inicio, fim)]
+
+
+def _gerar_em_blocos(funcao, seed: int, total: int, processos: int) -> list:
+    """Divide ``total`` em blocos fixos e gera cada um (em paralelo se processos > 1).
+
+    Os blocos têm tamanho fixo e semente derivada do início, então o
+    resultado não depende do número de processos.
+    """
+    blocos = [(seed, i, min(i + TAMANHO_BLOCO_FAKER, total)) for i in range(0, total, TAMANHO_BLOCO_FAKER)]
+    if processos <= 1 or len(blocos) <= 1:
+        partes = [funcao(*bloco) for bloco in blocos]
+    else:
+        with ProcessPoolExecutor(max_workers=min(processos, len(blocos))) as pool:
+            partes = list(pool.map(funcao, *zip(*blocos)))
+    return [item for parte in partes for item in parte]
+
+
+# ---------- Auxiliares ----------
+
+def _cnpj(indice: int) -> str:
+    """CNPJ sintético válido e único por índice (matriz 0001)"""
+    base = [int(d) for d in f"{indice:08d}0001"]
+    for pesos in ([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]):
+        resto = sum(d * p for d, p in zip(base, pesos)) % 11
+        base.append(0 if resto < 2 else 11 - resto)
+    d = ''.join(map(str, base))
+    return f"{d[:2]}.{d[2:5]}.{d[5:8]}/{d[8:12]}-{d[12:]}"
+
+
+def _codigos_retirada(inicio: int, total: int) -> List[str]:
+    """Códigos únicos no alfabeto de retirada: multiplicação por ímpar é bijetora módulo 2^32 < 31^8"""
+    indices = np.arange(inicio, inicio + total, dtype=np.uint64)
+    embaralhados = (indices * np.uint64(2654435761) + np.uint64(0x5EED)) % np.uint64(2 ** 32)
+    return [codificar_inteiro(int(c)) for c in embaralhados]
+
+
+def _inserir_em_lotes(conn, sql: str, linhas: list) -> None:
+    """executemany em transações de até TAMANHO_LOTE linhas"""
+    for inicio in range(0, len(linhas), TAMANHO_LOTE):
+        conn.executemany(sql, linhas[inicio:inicio + TAMANHO_LOTE])
+        conn.commit()
+
+
+class _Cronometro:
+    """Mede cada etapa e imprime linhas por segundo"""
+
+    def __init__(self):
+        self.inicio_total = time.perf_counter()
+        self.linhas_total = 0
+
+    def etapa(self, nome: str, quantidade: int, inicio: float, linhas: Optional[int] = None) -> None:
+        duracao = time.perf_counter() - inicio
+        linhas = quantidade if linhas is None else linhas
+        self.linhas_total += linhas
+        print(f"  ✅ {quantidade:,} {nome} em {duracao:.2f}s ({linhas / max(duracao, 1e-9):,.0f} linhas/s)")
+
+    def resumo(self) -> None:
+        duracao = time.perf_counter() - self.inicio_total
+        print(f"\n⏱️  {self.linhas_total:,} linhas em {duracao:.1f}s "
+              f"({self.linhas_total / max(duracao, 1e-9):,.0f} linhas/s)")
+
+
+# ---------- Geração ----------
+
+def popular_banco_dados(db_name: str = 'pega_ai.db', escala: Optional[Escala] = None, seed: int = 42,
+                        processos: Optional[int] = None) -> Dict[str, int]:
+    """Popula o banco com dados sintéticos determinísticos para a escala dada.
+
+    Retorna a contagem de linhas geradas por tabela.
+    """
+    escala = escala or ESCALAS['demo']
+    processos = processos or os.cpu_count() or 1
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    cronometro = _Cronometro()
+
+    db = Database(db_name)
+    conn = db.get_connection()
+    if conn.execute('SELECT EXISTS (SELECT 1 FROM usuarios)').fetchone()[0]:
+        conn.close()
+        db.close()
+        raise SystemExit(f"⚠️  {db_name} já tem dados. Use --substituir para recriar o banco.")
+
+    print(f"🚀 Iniciando população do banco de dados ({escala})...")
+
+    # Mesmo hash para todos os usuários sintéticos: calculado uma única vez
+    senha_hash = db.hash_senha(SENHA_DEMO)
+
+    # 1. Estabelecimentos (usuário + perfil)
     print("\n📍 Criando estabelecimentos...")
-    for i, (lat, lon, bairro) in enumerate(coords_sp):
-        categoria = categorias[i % len(categorias)]
-        nome_fantasia = f"{categoria} {fake.last_name()}"
-        
-        # Criar usuário do estabelecimento
-        user_id = db.criar_usuario(
-            nome=f"Admin {nome_fantasia}",
-            email=f"estabelecimento{i+1}@pegaai.com",
-            senha="senha123",  # Senha padrão para demo
-            tipo="estabelecimento",
-            telefone=fake.phone_number()
-        )
-        
-        if user_id:
-            # Criar perfil do estabelecimento
-            est_id = db.criar_estabelecimento(
-                usuario_id=user_id,
-                nome_fantasia=nome_fantasia,
-                cnpj=fake.cnpj(),
-                endereco=f"{fake.street_name()}, {random.randint(10, 999)} - {bairro}, São Paulo - SP",
-                latitude=lat,
-                longitude=lon
-            )
-            
-            if est_id:
-                usuarios_estabelecimentos.append((user_id, est_id, categoria))
-                print(f"  ✅ {nome_fantasia} ({bairro})")
-    
-    # 2. Criar 50 consumidores
+    inicio = time.perf_counter()
+    dados_est = _gerar_em_blocos(_gerar_estabelecimentos, seed, escala.estabelecimentos, processos)
+    usuarios_est, perfis_est, categorias_est = [], [], []
+    for i, (sobrenome, telefone, rua) in enumerate(dados_est):
+        categoria = CATEGORIAS[i % len(CATEGORIAS)]
+        lat, lon, bairro = COORDS_SP[i % len(COORDS_SP)]
+        if i >= len(COORDS_SP):
+            # Espalha os demais estabelecimentos em ~3 km ao redor dos bairros
+            lat += rng.uniform(-0.03, 0.03)
+            lon += rng.uniform(-0.03, 0.03)
+        nome_fantasia = f"{categoria} {sobrenome}"
+        usuarios_est.append((f"Admin {nome_fantasia}", f"estabelecimento{i + 1}@pegaai.com", senha_hash,
+                             'estabelecimento', telefone))
+        perfis_est.append((nome_fantasia, _cnpj(i + 1),
+                           f"{rua}, {rng.randint(10, 999)} - {bairro}, São Paulo - SP", lat, lon))
+        categorias_est.append(categoria)
+
+    conn.executemany('INSERT INTO usuarios (nome, email, senha, tipo, telefone) VALUES (?, ?, ?, ?, ?)',
+                     usuarios_est)
+    primeiro_usuario_est = conn.execute('SELECT MIN(id) FROM usuarios').fetchone()[0]
+    conn.executemany('''
+        INSERT INTO estabelecimentos (usuario_id, nome_fantasia, cnpj, endereco, latitude, longitude)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(primeiro_usuario_est + i, *perfil) for i, perfil in enumerate(perfis_est)])
+    conn.commit()
+    estabelecimentos_ids = [row[0] for row in conn.execute('SELECT id FROM estabelecimentos ORDER BY id')]
+    cronometro.etapa("estabelecimentos", len(perfis_est), inicio, linhas=2 * len(perfis_est))
+
+    # 2. Consumidores
     print("\n👥 Criando consumidores...")
-    for i in range(50):
-        user_id = db.criar_usuario(
-            nome=fake.name(),
-            email=f"consumidor{i+1}@email.com",
-            senha="senha123",
-            tipo="consumidor",
-            telefone=fake.phone_number()
-        )
-        
-        if user_id:
-            usuarios_consumidores.append(user_id)
-    
-    print(f"  ✅ {len(usuarios_consumidores)} consumidores criados")
-    
-    # 3. Criar 30-40 ofertas distribuídas
+    inicio = time.perf_counter()
+    dados_cons = _gerar_em_blocos(_gerar_consumidores, seed, escala.consumidores, processos)
+    usuarios_cons = [
+        (nome, f"consumidor{i + 1}@email.com", senha_hash, 'consumidor', telefone)
+        for i, (nome, telefone) in enumerate(dados_cons)
+    ]
+    _inserir_em_lotes(conn, 'INSERT INTO usuarios (nome, email, senha, tipo, telefone) VALUES (?, ?, ?, ?, ?)',
+                      usuarios_cons)
+    consumidores_ids = np.array(
+        [row[0] for row in conn.execute("SELECT id FROM usuarios WHERE tipo = 'consumidor' ORDER BY id")],
+        dtype=np.int64)
+    cronometro.etapa("consumidores", len(usuarios_cons), inicio)
+
+    # 3. Ofertas
     print("\n📦 Criando ofertas...")
-    total_ofertas = 0
-    
-    for user_id, est_id, categoria in usuarios_estabelecimentos:
-        # Cada estabelecimento cria 3-5 ofertas
-        num_ofertas = random.randint(3, 5)
-        
-        for _ in range(num_ofertas):
-            titulo = random.choice(titulos_por_categoria[categoria])
-            preco_original = round(random.uniform(20, 60), 2)
-            preco_venda = round(preco_original * random.uniform(0.25, 0.40), 2)  # 60-75% desconto
-            
-            descricoes = [
-                f"Deliciosos produtos frescos do dia. Valor estimado de R$ {preco_original:.2f} por apenas R$ {preco_venda:.2f}!",
-                f"Aproveite nossa seleção especial com até 70% de desconto. Uma surpresa deliciosa te aguarda!",
-                f"Salve comida de qualidade e economize! Produtos frescos com grande desconto.",
-                f"Caixa surpresa recheada de {categoria.lower()}. Qualidade garantida!"
-            ]
-            
-            horarios = [
-                ('17:00', '18:00'),
-                ('18:00', '19:00'),
-                ('19:00', '20:00'),
-                ('20:00', '21:00')
-            ]
-            
-            horario = random.choice(horarios)
-            
-            db.criar_oferta(
-                estabelecimento_id=est_id,
-                titulo=titulo,
-                descricao=random.choice(descricoes),
-                categoria=categoria,
-                preco_original=preco_original,
-                preco_venda=preco_venda,
-                estoque=random.randint(5, 15),
-                horario_inicio=horario[0],
-                horario_fim=horario[1]
-            )
-            
-            total_ofertas += 1
-    
-    print(f"  ✅ {total_ofertas} ofertas criadas")
-    
-    # 4. Criar 80-100 pedidos (simulando histórico)
+    inicio = time.perf_counter()
+    ofertas = []
+    for est_id, categoria in zip(estabelecimentos_ids, categorias_est):
+        for _ in range(rng.randint(escala.ofertas_min, escala.ofertas_max)):
+            preco_original = round(rng.uniform(20, 60), 2)
+            preco_venda = round(preco_original * rng.uniform(0.25, 0.40), 2)  # 60-75% desconto
+            descricao = rng.choice(DESCRICOES).format(original=preco_original, venda=preco_venda,
+                                                      categoria=categoria.lower())
+            horario = rng.choice(HORARIOS)
+            estoque = rng.randint(5, 15)
+            ofertas.append((est_id, rng.choice(TITULOS_POR_CATEGORIA[categoria]), descricao, categoria,
+                            preco_original, preco_venda, estoque, estoque, horario[0], horario[1]))
+    _inserir_em_lotes(conn, '''
+        INSERT INTO ofertas (estabelecimento_id, titulo, descricao, categoria, preco_original, preco_venda,
+                             estoque_inicial, estoque_atual, horario_retirada_inicio, horario_retirada_fim)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', ofertas)
+    ofertas_ids = np.array([row[0] for row in conn.execute('SELECT id FROM ofertas ORDER BY id')], dtype=np.int64)
+    precos = np.array([oferta[5] for oferta in ofertas])
+    lojas_oferta = np.array([oferta[0] for oferta in ofertas], dtype=np.int64)
+    cronometro.etapa("ofertas", len(ofertas), inicio)
+
+    # 4. Pedidos (histórico simulado; não decrementa estoque) gerados em lotes vetorizados
     print("\n🛒 Criando pedidos (simulando histórico)...")
-    
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    
-    # Buscar IDs de ofertas existentes
-    cursor.execute('SELECT id FROM ofertas')
-    ofertas_ids = [row[0] for row in cursor.fetchall()]
-    
-    total_pedidos = 0
-    status_opcoes = [
-        ('reservado', 0.15),   # 15% reservados
-        ('pago', 0.10),        # 10% pagos (não retirados ainda)
-        ('retirado', 0.70),    # 70% retirados (sucesso)
-        ('cancelado', 0.05)    # 5% cancelados
-    ]
-    
-    for _ in range(random.randint(80, 100)):
-        consumidor_id = random.choice(usuarios_consumidores)
-        oferta_id = random.choice(ofertas_ids)
-        
-        # Não decrementar estoque (já foi feito na criação)
-        # Este é histórico simulado
-        
-        # Selecionar status baseado em probabilidades
-        rand = random.random()
-        cumulative = 0
-        status_escolhido = 'reservado'
-        
-        for status, prob in status_opcoes:
-            cumulative += prob
-            if rand <= cumulative:
-                status_escolhido = status
-                break
-        
-        # Buscar preço
-        cursor.execute('SELECT preco_venda FROM ofertas WHERE id = ?', (oferta_id,))
-        preco = cursor.fetchone()[0]
-        
-        # Gerar código único
-        codigo = fake.uuid4()[:8].upper()
-        
-        # Data variando nos últimos 30 dias
-        dias_atras = random.randint(0, 30)
-        data_criacao = (datetime.now() - timedelta(days=dias_atras)).strftime('%Y-%m-%d %H:%M:%S')
-        
-        cursor.execute('''
-            INSERT INTO pedidos (consumidor_id, oferta_id, quantidade, valor_total, 
+    inicio = time.perf_counter()
+    # Em UTC, como o CURRENT_TIMESTAMP do SQLite nos pedidos criados pelo app
+    agora = datetime.now(timezone.utc).replace(microsecond=0)
+    segundos_historico = escala.dias * 86400
+    for lote in range(0, escala.pedidos, TAMANHO_LOTE):
+        n = min(TAMANHO_LOTE, escala.pedidos - lote)
+        consumidores = np_rng.choice(consumidores_ids, n)
+        indices_oferta = np_rng.integers(0, len(ofertas_ids), n)
+        status = np_rng.choice(len(STATUS_PEDIDOS), n, p=PROB_STATUS)
+        segundos_atras = np_rng.integers(0, segundos_historico + 1, n)
+        datas = [(agora - timedelta(seconds=int(s))).strftime('%Y-%m-%d %H:%M:%S') for s in segundos_atras]
+        linhas = zip(consumidores.tolist(), ofertas_ids[indices_oferta].tolist(),
+                     lojas_oferta[indices_oferta].tolist(), precos[indices_oferta].tolist(),
+                     _codigos_retirada(lote, n), [STATUS_PEDIDOS[s] for s in status], datas)
+        conn.executemany('''
+            INSERT INTO pedidos (consumidor_id, oferta_id, estabelecimento_id, quantidade, valor_total,
                                codigo_retirada, status, criado_em)
-            VALUES (?, ?, 1, ?, ?, ?, ?)
-        ''', (consumidor_id, oferta_id, preco, codigo, status_escolhido, data_criacao))
-        
-        total_pedidos += 1
-    
-    conn.commit()
-    conn.close()
-    
-    print(f"  ✅ {total_pedidos} pedidos criados")
-    
-    # 5. Criar algumas avaliações
+            VALUES (?, ?, ?, 1, ?, ?, ?, ?)
+        ''', linhas)
+        conn.commit()
+    cronometro.etapa("pedidos", escala.pedidos, inicio)
+
+    # 5. Avaliações de pedidos retirados
     print("\n⭐ Criando avaliações...")
-    
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    
-    # Buscar pedidos retirados
-    cursor.execute('SELECT id FROM pedidos WHERE status = "retirado" LIMIT 30')
-    pedidos_retirados = [row[0] for row in cursor.fetchall()]
-    
-    comentarios = [
-        "Excelente! Comida fresca e deliciosa.",
-        "Adorei a variedade. Voltarei com certeza!",
-        "Ótimo custo-benefício. Recomendo!",
-        "Produtos de qualidade. Vale muito a pena!",
-        "Surpreendeu positivamente. Muita coisa boa!",
-        "Bom, mas esperava um pouco mais.",
-        "Razoável. Atendeu as expectativas.",
-        None  # Alguns sem comentário
-    ]
-    
-    total_avaliacoes = 0
-    for pedido_id in pedidos_retirados[:20]:  # Avaliar 20 pedidos
-        nota = random.choices([3, 4, 5], weights=[0.1, 0.3, 0.6])[0]  # Mais notas altas
-        comentario = random.choice(comentarios)
-        
-        try:
-            cursor.execute('''
-                INSERT INTO avaliacoes (pedido_id, nota, comentario)
-                VALUES (?, ?, ?)
-            ''', (pedido_id, nota, comentario))
-            total_avaliacoes += 1
-        except:
-            pass  # Ignora duplicatas
-    
-    conn.commit()
+    inicio = time.perf_counter()
+    pedidos_retirados = [row[0] for row in conn.execute(
+        "SELECT id FROM pedidos WHERE status = 'retirado' ORDER BY id LIMIT ?", (escala.avaliacoes,))]
+    notas = np_rng.choice([3, 4, 5], len(pedidos_retirados), p=[0.1, 0.3, 0.6]).tolist()  # Mais notas altas
+    avaliacoes = [(pedido_id, nota, rng.choice(COMENTARIOS)) for pedido_id, nota in zip(pedidos_retirados, notas)]
+    _inserir_em_lotes(conn, 'INSERT INTO avaliacoes (pedido_id, nota, comentario) VALUES (?, ?, ?)',
+                      avaliacoes)
+    cronometro.etapa("avaliações", len(avaliacoes), inicio)
+
     conn.close()
-    
-    print(f"  ✅ {total_avaliacoes} avaliações criadas")
-    
+
+    # Inserts diretos: consolida os rollups e invalida caches de leitura
+    db.atualizar_rollups()
+    db.invalidar_cache()
+    db.close()
+    cronometro.resumo()
+
+    totais = {
+        'estabelecimentos': len(estabelecimentos_ids),
+        'consumidores': len(usuarios_cons),
+        'ofertas': len(ofertas),
+        'pedidos': escala.pedidos,
+        'avaliacoes': len(avaliacoes),
+    }
+
     print("\n" + "="*60)
     print("✅ BANCO POPULADO COM SUCESSO!")
     print("="*60)
     print(f"""
 📊 Resumo:
-   • {len(usuarios_estabelecimentos)} estabelecimentos
-   • {len(usuarios_consumidores)} consumidores
-   • {total_ofertas} ofertas ativas
-   • {total_pedidos} pedidos (histórico simulado)
-   • {total_avaliacoes} avaliações
+   • {totais['estabelecimentos']:,} estabelecimentos
+   • {totais['consumidores']:,} consumidores
+   • {totais['ofertas']:,} ofertas ativas
+   • {totais['pedidos']:,} pedidos (histórico simulado)
+   • {totais['avaliacoes']:,} avaliações
 
 🔐 Credenciais de Teste:
-   Estabelecimento: estabelecimento1@pegaai.com / senha123
-   Consumidor: consumidor1@email.com / senha123
+   Estabelecimento: estabelecimento1@pegaai.com / {SENHA_DEMO}
+   Consumidor: consumidor1@email.com / {SENHA_DEMO}
     """)
+    return totais
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Popula o banco do Pega Aí com dados sintéticos")
+    parser.add_argument('--db', default='pega_ai.db', help='arquivo do banco SQLite')
+    parser.add_argument('--escala', choices=ESCALAS, default='demo', help='tamanho predefinido')
+    parser.add_argument('--seed', type=int, default=42, help='semente (mesma semente, mesmos dados)')
+    parser.add_argument('--processos', type=int, default=None, help='processos para o Faker (padrão: CPUs)')
+    parser.add_argument('--substituir', action='store_true', help='apaga o banco existente antes de gerar')
+    for campo in Escala.__dataclass_fields__:
+        parser.add_argument(f"--{campo.replace('_', '-')}", type=int, default=None,
+                            help=f'sobrescreve {campo} da escala')
+    args = parser.parse_args()
+
+    ajustes = {campo: getattr(args, campo) for campo in Escala.__dataclass_fields__
+               if getattr(args, campo) is not None}
+    escala = replace(ESCALAS[args.escala], **ajustes)
+
+    if args.substituir:
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + sufixo):
+                os.remove(args.db + sufixo)
+
+    popular_banco_dados(args.db, escala, seed=args.seed, processos=args.processos)
+
 
 if __name__ == "__main__":
-    popular_banco_dados()
+    main()
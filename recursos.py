@@ -0,0 +1,33 @@
+"""Recursos compartilhados entre as páginas do Streamlit (uma instância por processo)"""
+import os
+
+import streamlit as st
+
+from database import Database
+from expiracao import VarredorReservas
+from perfilador import PerfiladorConsultas
+from reservas import MotorReservas
+
+
+@st.cache_resource
+def get_database():
+    # Perfilador de consultas só com PEGA_AI_PERFILAR=1; group commit só com PEGA_AI_ESCRITA_AGRUPADA=1
+    agrupada = os.environ.get('PEGA_AI_ESCRITA_AGRUPADA', '').lower() in ('1', 'true', 'sim')
+    return Database(perfilador=PerfiladorConsultas.do_ambiente(), escrita_agrupada=agrupada)
+
+
+@st.cache_resource
+def get_motor_reservas():
+    return MotorReservas(get_database())
+
+
+@st.cache_resource
+def get_varredor_reservas():
+    # Intervalo em segundos via PEGA_AI_VARREDURA_S (0 desliga a varredura no app)
+    intervalo = float(os.environ.get('PEGA_AI_VARREDURA_S', 300))
+    if intervalo <= 0:
+        return None
+    varredor = VarredorReservas(get_database(), intervalo_s=intervalo,
+                                ao_liberar=get_motor_reservas().sincronizar)
+    varredor.iniciar()
+    return varredor
@@ -0,0 +1,173 @@
+import threading
+from typing import Optional, Dict, Any, Iterable, List, Tuple
+
+from database import Database
+
+
+class MotorReservas:
+    """Controle de estoque em memória na frente de ``Database.criar_pedido``.
+
+    Mantém um contador autoritativo por oferta, carregado de
+    ``ofertas.estoque_atual``. Cada reserva retira unidades do contador sob
+    um lock (o "token"); só quem conseguiu o token chega ao banco. Pedidos
+    para ofertas esgotadas são recusados sem abrir transação alguma.
+
+    Tudo que mexe no estoque deve passar pelo motor (``reservar``,
+    ``reservar_lote``, ``cancelar_pedido``) ou chamar ``sincronizar`` depois
+    (ex.: o varredor de reservas vencidas, via ``ao_liberar``).
+    """
+
+    def __init__(self, db: Database, carregar_todas: bool = True):
+        self.db = db
+        self._lock = threading.Lock()
+        self._estoque: Dict[int, int] = {}
+        self._pendentes: Dict[int, int] = {}  # Tokens entregues ainda não gravados
+        self._ressincronizar: set = set()     # Ofertas lidas com tokens em voo
+        self._stats = {'aceitas': 0, 'recusadas': 0, 'persistidas': 0, 'falhas': 0}
+        if carregar_todas:
+            self.sincronizar()
+
+    def _ler_estoque(self, oferta_ids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+        """Lê o estoque atual do banco (todas as ofertas ativas ou as informadas)"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+
+        if oferta_ids is None:
+            cursor.execute("SELECT id, estoque_atual FROM ofertas WHERE status = 'ativa'")
+        else:
+            ids = list(oferta_ids)
+            if not ids:
+                conn.close()
+                return {}
+            cursor.execute(
+                f"SELECT id, CASE WHEN status = 'ativa' THEN estoque_atual ELSE 0 END "
+                f"FROM ofertas WHERE id IN ({','.join('?' * len(ids))})",
+                ids
+            )
+
+        estoque = dict(cursor.fetchall())
+        conn.close()
+        return estoque
+
+    def sincronizar(self, oferta_ids: Optional[Iterable[int]] = None) -> None:
+        """Recarrega os contadores a partir do banco.
+
+        Sem argumentos substitui todos os contadores (uso na inicialização).
+        A leitura e o ajuste acontecem sob o mesmo lock, então nenhum token é
+        entregue entre os dois. Uma oferta com tokens ainda em gravação não
+        tem como saber quais já foram commitados: o contador fica com o valor
+        conservador (banco menos pendentes, nunca acima do real) e é relido
+        quando o último token dela terminar.
+        """
+        ids = None if oferta_ids is None else list(oferta_ids)
+
+        with self._lock:
+            estoque = self._ler_estoque(ids)
+            if ids is None:
+                self._estoque.clear()
+            else:
+                for oferta_id in ids:
+                    estoque.setdefault(oferta_id, 0)
+            for oferta_id, disponivel in estoque.items():
+                pendentes = self._pendentes.get(oferta_id, 0)
+                self._estoque[oferta_id] = max(0, disponivel - pendentes)
+                if pendentes:
+                    self._ressincronizar.add(oferta_id)
+
+    def _liberar_pendentes(self, totais: Dict[int, int], gravou: bool) -> None:
+        """Fecha os tokens após a gravação; relê ofertas sincronizadas enquanto estavam em voo"""
+        with self._lock:
+            for oferta_id, quantidade in totais.items():
+                self._pendentes[oferta_id] -= quantidade
+            self._stats['persistidas' if gravou else 'falhas'] += 1
+            reler = [oferta_id for oferta_id in totais
+                     if oferta_id in self._ressincronizar and not self._pendentes[oferta_id]]
+            if reler:
+                self._ressincronizar.difference_update(reler)
+                self._estoque.update(self._ler_estoque(reler))
+
+    def disponivel(self, oferta_id: int) -> Optional[int]:
+        """Estoque em memória da oferta (None se ainda não carregada)"""
+        with self._lock:
+            return self._estoque.get(oferta_id)
+
+    def reservar(self, consumidor_id: int, oferta_id: int, quantidade: int = 1) -> Optional[Dict[str, Any]]:
+        """Reserva via token em memória; grava no banco apenas se houver estoque"""
+        if quantidade <= 0:
+            return None
+
+        if self.disponivel(oferta_id) is None:
+            self.sincronizar([oferta_id])
+
+        # 1. Retirar o token (ou recusar sem tocar no banco)
+        with self._lock:
+            if self._estoque.get(oferta_id, 0) < quantidade:
+                self._stats['recusadas'] += 1
+                return None
+            self._estoque[oferta_id] -= quantidade
+            self._pendentes[oferta_id] = self._pendentes.get(oferta_id, 0) + quantidade
+            self._stats['aceitas'] += 1
+
+        # 2. Gravar o vencedor
+        pedido = None
+        try:
+            pedido = self.db.criar_pedido(consumidor_id, oferta_id, quantidade)
+        finally:
+            self._liberar_pendentes({oferta_id: quantidade}, bool(pedido))
+
+        # 3. Se o banco recusou (ex.: outro processo vendeu), realinhar com ele
+        if not pedido:
+            self.sincronizar([oferta_id])
+
+        return pedido
+
+    def reservar_lote(self, consumidor_id: int, itens: List[Tuple[int, int]],
+                      metodo: str = 'pix') -> Dict[str, Any]:
+        """``Database.criar_pedidos_lote`` com tokens: tudo ou nada também em memória"""
+        totais: Dict[int, int] = {}
+        for oferta_id, quantidade in itens:
+            totais[oferta_id] = totais.get(oferta_id, 0) + quantidade
+        if not totais or any(q <= 0 for _, q in itens):
+            return self.db.criar_pedidos_lote(consumidor_id, itens, metodo)
+
+        faltando = [oferta_id for oferta_id in totais if self.disponivel(oferta_id) is None]
+        if faltando:
+            self.sincronizar(faltando)
+
+        with self._lock:
+            suficiente = {oferta_id: self._estoque.get(oferta_id, 0) >= q for oferta_id, q in totais.items()}
+            if not all(suficiente.values()):
+                self._stats['recusadas'] += 1
+                return {'sucesso': False, 'mensagem': 'Nenhum item foi reservado', 'itens': [
+                    {'oferta_id': oferta_id, 'quantidade': quantidade, 'sucesso': suficiente[oferta_id],
+                     'mensagem': 'OK' if suficiente[oferta_id] else 'Estoque insuficiente', 'pedido': None}
+                    for oferta_id, quantidade in itens
+                ]}
+            for oferta_id, q in totais.items():
+                self._estoque[oferta_id] -= q
+                self._pendentes[oferta_id] = self._pendentes.get(oferta_id, 0) + q
+            self._stats['aceitas'] += 1
+
+        resultado = {'sucesso': False}
+        try:
+            resultado = self.db.criar_pedidos_lote(consumidor_id, itens, metodo)
+        finally:
+            self._liberar_pendentes(totais, resultado['sucesso'])
+
+        if not resultado['sucesso']:
+            self.sincronizar(list(totais))
+        return resultado
+
+    def cancelar_pedido(self, pedido_id: int, motivo: str = 'Cancelado pelo estabelecimento') -> Dict[str, Any]:
+        """Cancela no banco e devolve o estoque ao contador em memória"""
+        resultado = self.db.cancelar_pedido(pedido_id, motivo)
+        if resultado['sucesso']:
+            self.sincronizar([resultado['oferta_id']])
+        return resultado
+
+    def estatisticas(self) -> Dict[str, int]:
+        """Contadores de reservas aceitas, recusadas, gravadas e com falha"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['ofertas_carregadas'] = len(self._estoque)
+            return stats
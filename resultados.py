@@ -0,0 +1,63 @@
+"""Formatos de resultado das listagens do Database.
+
+As listagens aceitam ``formato``:
+
+- ``'dict'`` (padrão): um dicionário por linha, como sempre foi;
+- ``'tupla'``: registros namedtuple (acesso por atributo ou índice, sem
+  ``__dict__`` por linha), mais leves para a interface;
+- ``'colunas'``: dicionário coluna -> array NumPy, lido direto das tuplas
+  do cursor;
+- ``'dataframe'``: DataFrame pandas montado a partir dessas colunas, sem
+  dicionários intermediários por linha.
+"""
+from collections import namedtuple
+from operator import itemgetter
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+FORMATOS_RESULTADO = ('dict', 'tupla', 'colunas', 'dataframe')
+
+
+def validar_formato(formato: str) -> None:
+    """Falha antes da consulta se o formato não existe"""
+    if formato not in FORMATOS_RESULTADO:
+        raise ValueError(f"Formato de resultado inválido: {formato}")
+
+
+class EsquemaResultado:
+    """Nomes e tipos NumPy das colunas de uma listagem, na ordem do SELECT.
+
+    Colunas numéricas que podem ser NULL devem usar ``float`` (NULL vira NaN);
+    texto usa ``object``.
+    """
+
+    def __init__(self, nome: str, colunas: Sequence[Tuple[str, Any]]):
+        self.campos = tuple(campo for campo, _ in colunas)
+        self.tipos = tuple(tipo for _, tipo in colunas)
+        self.registro = namedtuple(nome, self.campos)
+
+    def colunas(self, linhas: List[tuple]) -> Dict[str, np.ndarray]:
+        """Um array por coluna, lido direto das tuplas (sem transpor a lista inteira)"""
+        total = len(linhas)
+        return {
+            campo: np.fromiter(map(itemgetter(i), linhas), dtype=tipo, count=total)
+            for i, (campo, tipo) in enumerate(zip(self.campos, self.tipos))
+        }
+
+    def montar(self, linhas: List[tuple], formato: str = 'dict') -> Any:
+        """Converte as tuplas do cursor no formato pedido (ver FORMATOS_RESULTADO).
+
+        O caminho 'dict' aqui é genérico; as listagens mais usadas montam os
+        dicionários com literais, que é cerca de duas vezes mais rápido.
+        """
+        validar_formato(formato)
+        if formato == 'dict':
+            campos = self.campos
+            return [dict(zip(campos, linha)) for linha in linhas]
+        if formato == 'tupla':
+            return list(map(self.registro._make, linhas))
+        if formato == 'colunas':
+            return self.colunas(linhas)
+        return pd.DataFrame(self.colunas(linhas), columns=list(self.campos), copy=False)
@@ -0,0 +1,104 @@
+"""Hash de senhas com KDF configurável, executado em um pool limitado de threads.
+
+Formatos aceitos na verificação (o primeiro campo identifica o algoritmo):
+
+- ``pbkdf2_sha256$<iteracoes>$<salt>$<hash>``
+- ``scrypt$<n>$<r>$<p>$<salt>$<hash>``
+- ``<salt>$<sha256>``: formato anterior (SHA-256 com salt)
+- ``<sha256>``: legado, sem salt
+
+Senhas em formato antigo ou com custo diferente do configurado são
+marcadas para rehash, feito de forma transparente no próximo login.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+ALGORITMOS = ('pbkdf2_sha256', 'scrypt')
+
+# Custo padrão: ~0,1 s por hash em um núcleo atual
+CUSTO_PADRAO = {'pbkdf2_sha256': 200_000, 'scrypt': 2 ** 14}
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+
+class HasherSenhas:
+    """Gera e verifica hashes de senha no pool de threads do próprio hasher.
+
+    ``hashlib.pbkdf2_hmac`` e ``hashlib.scrypt`` liberam o GIL, então o pool
+    usa vários núcleos; ``trabalhadores`` limita quantos hashes rodam ao
+    mesmo tempo e ``max_pendentes`` quantos podem aguardar na fila (quem
+    excede espera por uma vaga), o que evita que um pico de logins sature a
+    CPU do servidor.
+    """
+
+    def __init__(self, algoritmo: str = 'pbkdf2_sha256', custo: Optional[int] = None,
+                 trabalhadores: Optional[int] = None, max_pendentes: Optional[int] = None):
+        if algoritmo not in ALGORITMOS:
+            raise ValueError(f"Algoritmo de senha desconhecido: {algoritmo}")
+        self.algoritmo = algoritmo
+        self.custo = custo or CUSTO_PADRAO[algoritmo]
+        self.trabalhadores = trabalhadores or min(4, os.cpu_count() or 1)
+        self._pool = ThreadPoolExecutor(max_workers=self.trabalhadores, thread_name_prefix='pega-ai-senhas')
+        self._vagas = threading.BoundedSemaphore(max_pendentes or self.trabalhadores * 8)
+
+    def _no_pool(self, funcao: Callable[..., T], *args) -> T:
+        """Executa a função no pool e aguarda o resultado"""
+        with self._vagas:
+            return self._pool.submit(funcao, *args).result()
+
+    def _derivar(self, algoritmo: str, senha: str, salt: str, parametros: Tuple[int, ...]) -> str:
+        """Hash hexadecimal da senha com o algoritmo e os parâmetros dados"""
+        if algoritmo == 'pbkdf2_sha256':
+            return hashlib.pbkdf2_hmac('sha256', senha.encode(), salt.encode(), parametros[0]).hex()
+        n, r, p = parametros
+        return hashlib.scrypt(senha.encode(), salt=salt.encode(), n=n, r=r, p=p,
+                              maxmem=256 * n * r + 2 ** 20).hex()
+
+    def _parametros_atuais(self) -> Tuple[int, ...]:
+        if self.algoritmo == 'pbkdf2_sha256':
+            return (self.custo,)
+        return (self.custo, SCRYPT_R, SCRYPT_P)
+
+    def gerar(self, senha: str, salt: Optional[str] = None) -> str:
+        """Gera o hash no formato do algoritmo configurado"""
+        salt = salt or secrets.token_hex(16)
+        parametros = self._parametros_atuais()
+        derivado = self._no_pool(self._derivar, self.algoritmo, senha, salt, parametros)
+        return '$'.join([self.algoritmo, *map(str, parametros), salt, derivado])
+
+    def verificar(self, senha: str, armazenado: str) -> Tuple[bool, bool]:
+        """Retorna (senha confere, hash precisa ser refeito com a configuração atual)"""
+        partes = armazenado.split('$')
+        algoritmo = partes[0]
+
+        if algoritmo in ALGORITMOS:
+            try:
+                parametros = tuple(int(p) for p in partes[1:-2])
+                salt, esperado = partes[-2], partes[-1]
+                calculado = self._no_pool(self._derivar, algoritmo, senha, salt, parametros)
+            except (ValueError, IndexError):
+                return False, False
+            confere = hmac.compare_digest(calculado, esperado)
+            atualizado = algoritmo == self.algoritmo and parametros == self._parametros_atuais()
+            return confere, confere and not atualizado
+
+        # Formatos antigos (SHA-256 simples): baratos, verificados na própria thread
+        if len(partes) == 1:
+            calculado = hashlib.sha256(senha.encode()).hexdigest()
+        elif len(partes) == 2:
+            calculado = hashlib.sha256((partes[0] + senha).encode()).hexdigest()
+        else:
+            return False, False
+        confere = hmac.compare_digest(calculado, partes[-1])
+        return confere, confere
+
+    def close(self) -> None:
+        """Encerra o pool de hashing"""
+        self._pool.shutdown(wait=True)
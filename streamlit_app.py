@@ -1,7 +1,7 @@
 import streamlit as st
-from database import Database
-import pandas as pd
+from recursos import get_database, get_motor_reservas, get_varredor_reservas
 from datetime import datetime
+import re
 
 # Configuração da página
 st.set_page_config(
@@ -55,12 +55,25 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Inicializar banco
-@st.cache_resource
-def get_database():
-    return Database()
+# Vitrine de ofertas ("mostrar mais")
+OFERTAS_POR_PAGINA = 20
+ORDENACOES_VITRINE = {
+    "Mais recentes": "recentes",
+    "Menor preço": "preco",
+    "Maior desconto": "desconto",
+}
+
+# Histórico de pedidos ("carregar mais")
+PEDIDOS_POR_PAGINA = 20
+
+# Pedidos da loja: intervalo da leitura do log de eventos e eventos por consulta
+INTERVALO_PEDIDOS_LOJA_S = 5
+EVENTOS_POR_LEITURA = 500
 
+# Inicializar banco
 db = get_database()
+motor_reservas = get_motor_reservas()
+get_varredor_reservas()   # Libera estoque de reservas vencidas em segundo plano
 
 # Inicializar session state
 if 'logged_in' not in st.session_state:
@@ -68,8 +81,26 @@ if 'logged_in' not in st.session_state:
 if 'user' not in st.session_state:
     st.session_state.user = None
 
+# Sessão: o token fica só no servidor (session_state), nunca na URL, onde vazaria
+# por histórico, links copiados, Referer e capturas de tela. A cada execução o
+# token é revalidado, então logout em outro lugar ou expiração encerram o acesso.
+if st.session_state.logged_in and st.session_state.get('sessao'):
+    if not db.validar_sessao(st.session_state.sessao):
+        st.session_state.logged_in = False
+        st.session_state.user = None
+        st.session_state.sessao = None
+
+# Login bem-sucedido: abre a sessão no servidor
+def entrar(user):
+    st.session_state.logged_in = True
+    st.session_state.user = user
+    st.session_state.sessao = db.criar_sessao(user['id'])
+
 # Função de logout
 def logout():
+    if st.session_state.get('sessao'):
+        db.encerrar_sessao(st.session_state.sessao)
+    st.session_state.sessao = None
     st.session_state.logged_in = False
     st.session_state.user = None
     st.rerun()
@@ -97,8 +128,7 @@ def tela_login():
                     if email and senha:
                         user = db.autenticar_usuario(email, senha)
                         if user:
-                            st.session_state.logged_in = True
-                            st.session_state.user = user
+                            entrar(user)
                             st.success(f"Bem-vindo(a), {user['nome']}!")
                             st.rerun()
                         else:
@@ -111,8 +141,7 @@ def tela_login():
                     # Login rápido para demonstração
                     user = db.autenticar_usuario("consumidor1@email.com", "senha123")
                     if user:
-                        st.session_state.logged_in = True
-                        st.session_state.user = user
+                        entrar(user)
                         st.rerun()
             
             st.info("💡 **Demo Rápido**: consumidor1@email.com / senha123")
@@ -196,6 +225,8 @@ def tela_descobrir_ofertas():
     st.title("🔍 Ofertas Disponíveis")
     st.markdown("**Encontre caixas surpresa perto de você!**")
     
+    termo = st.text_input("🔎 Buscar", placeholder="Ex: pão, pizza, nome da loja...")
+    
     # Filtros
     col1, col2, col3 = st.columns(3)
     
@@ -207,97 +238,185 @@ def tela_descobrir_ofertas():
         preco_max = st.slider("💰 Preço máximo", 5, 50, 50)
     
     with col3:
-        ordenacao = st.selectbox("🔄 Ordenar por", ["Mais recentes", "Menor preço", "Maior desconto"])
-    
-    # Buscar ofertas
-    ofertas = db.listar_ofertas_ativas()
-    
-    # Aplicar filtros
-    if filtro_categoria != "Todas":
-        ofertas = [o for o in ofertas if o['categoria'] == filtro_categoria]
-    
-    ofertas = [o for o in ofertas if o['preco_venda'] <= preco_max]
-    
-    # Ordenação
-    if ordenacao == "Menor preço":
-        ofertas = sorted(ofertas, key=lambda x: x['preco_venda'])
-    elif ordenacao == "Maior desconto":
-        ofertas = sorted(ofertas, key=lambda x: (1 - x['preco_venda']/x['preco_original']), reverse=True)
-    
-    st.markdown(f"**{len(ofertas)} ofertas encontradas**")
-    
-    # Exibir ofertas
+        ordenacao = st.selectbox("🔄 Ordenar por", list(ORDENACOES_VITRINE.keys()))
+    
+    # Busca por proximidade
+    perto_de_mim = st.toggle("📍 Perto de mim")
+    if perto_de_mim:
+        col_lat, col_lon, col_raio = st.columns(3)
+        with col_lat:
+            minha_lat = st.number_input("Latitude", value=-23.550520, format="%.6f", key="minha_lat")
+        with col_lon:
+            minha_lon = st.number_input("Longitude", value=-46.633308, format="%.6f", key="minha_lon")
+        with col_raio:
+            raio_km = st.slider("📏 Raio (km)", 1, 20, 3)
+    
+    categoria = None if filtro_categoria == "Todas" else filtro_categoria
+    
+    # "Mostrar mais": as páginas carregadas se acumulam até os filtros mudarem
+    filtros = (termo.strip(), filtro_categoria, preco_max, ordenacao, perto_de_mim,
+               (minha_lat, minha_lon, raio_km) if perto_de_mim else None)
+    if st.session_state.get('vitrine_filtros') != filtros:
+        st.session_state.vitrine_filtros = filtros
+        st.session_state.vitrine_cursores = [None]
+    
+    cursores = st.session_state.vitrine_cursores
+    limite = len(cursores) * OFERTAS_POR_PAGINA
+    proximo_cursor = None
+    
+    if termo.strip():
+        # Ordenadas por relevância; sem keyset, cada página amplia o limite
+        ofertas = db.pesquisar_ofertas(termo, categoria=categoria, preco_max=preco_max, limite=limite)
+        ha_mais = len(ofertas) == limite
+    elif perto_de_mim:
+        # Ordenadas por distância; sem keyset, cada página amplia o limite
+        ofertas = db.listar_ofertas_proximas(minha_lat, minha_lon, raio_km, categoria=categoria,
+                                             preco_max=preco_max, limite=limite)
+        ha_mais = len(ofertas) == limite
+    else:
+        # Paginação por keyset: uma consulta (em cache) por página já carregada
+        ofertas = []
+        for cursor in cursores:
+            pagina = db.buscar_ofertas(
+                categoria=categoria,
+                preco_max=preco_max,
+                ordenacao=ORDENACOES_VITRINE[ordenacao],
+                cursor=cursor,
+                limite=OFERTAS_POR_PAGINA
+            )
+            ofertas += pagina['ofertas']
+        proximo_cursor = pagina['proximo_cursor']
+        ha_mais = proximo_cursor is not None
+    
+    st.markdown(f"**{len(ofertas)} ofertas**")
+    
+    # Cada card é um fragmento: reservar redesenha só aquele card
     for oferta in ofertas:
-        desconto = int((1 - oferta['preco_venda'] / oferta['preco_original']) * 100)
+        cartao_oferta(oferta)
+    
+    if ha_mais and st.button("⬇️ Mostrar mais", key="vitrine_mais", use_container_width=True):
+        cursores.append(proximo_cursor)
+        st.rerun()
+
+def reservar_oferta(oferta_id):
+    """Callback do botão Reservar: roda antes de o fragmento do card ser redesenhado"""
+    pedido = motor_reservas.reservar(
+        consumidor_id=st.session_state.user['id'],
+        oferta_id=oferta_id,
+        quantidade=1
+    )
+    st.session_state[f"reserva_{oferta_id}"] = pedido or {}
+
+@st.fragment
+def cartao_oferta(oferta):
+    """Card de uma oferta da vitrine, com o estoque atual do motor de reservas"""
+    estoque = motor_reservas.disponivel(oferta['id'])
+    if estoque is None:
+        estoque = oferta['estoque']
+    desconto = int((1 - oferta['preco_venda'] / oferta['preco_original']) * 100)
+    
+    with st.container():
+        st.markdown('<div class="oferta-card">', unsafe_allow_html=True)
         
-        with st.container():
-            st.markdown('<div class="oferta-card">', unsafe_allow_html=True)
+        col1, col2 = st.columns([3, 1])
+        
+        with col1:
+            st.markdown(f"### 🍽️ {oferta['titulo']}")
+            st.markdown(f"**📍 {oferta['estabelecimento']}**")
+            st.markdown(f"_{oferta['endereco']}_")
             
-            col1, col2 = st.columns([3, 1])
+            if 'distancia_km' in oferta:
+                st.markdown(f"🧭 **{oferta['distancia_km']:.1f} km** de você")
             
-            with col1:
-                st.markdown(f"### 🍽️ {oferta['titulo']}")
-                st.markdown(f"**📍 {oferta['estabelecimento']}**")
-                st.markdown(f"_{oferta['endereco']}_")
-                
-                if oferta['descricao']:
-                    st.markdown(f"💬 {oferta['descricao']}")
-                
-                st.markdown(f"⏰ **Retirada:** {oferta['horario_inicio']} às {oferta['horario_fim']}")
-                st.markdown(f"📦 **Estoque:** {oferta['estoque']} unidades")
+            if oferta['descricao']:
+                st.markdown(f"💬 {oferta['descricao']}")
             
-            with col2:
-                st.markdown(f"### ~~R$ {oferta['preco_original']:.2f}~~")
-                st.markdown(f"## 💚 R$ {oferta['preco_venda']:.2f}")
-                st.success(f"**{desconto}% OFF**")
-                
-                # Prevenir múltiplas reservas com session_state
-                if f"reservando_{oferta['id']}" not in st.session_state:
-                    st.session_state[f"reservando_{oferta['id']}"] = False
-                
-                if st.button("➕ Reservar", key=f"reservar_{oferta['id']}", use_container_width=True, disabled=st.session_state[f"reservando_{oferta['id']}"]):
-                    st.session_state[f"reservando_{oferta['id']}"] = True
-                    
-                    pedido = db.criar_pedido(
-                        consumidor_id=st.session_state.user['id'],
-                        oferta_id=oferta['id'],
-                        quantidade=1
-                    )
-                    
-                    if pedido:
-                        st.success(f"✅ Reserva confirmada!")
-                        st.info(f"**Código de retirada:** `{pedido['codigo_retirada']}`")
-                        st.balloons()
-                        st.session_state[f"reservando_{oferta['id']}"] = False
-                        st.rerun()
-                    else:
-                        st.error("❌ Oferta esgotada ou erro na reserva")
-                        st.session_state[f"reservando_{oferta['id']}"] = False
+            st.markdown(f"⏰ **Retirada:** {oferta['horario_inicio']} às {oferta['horario_fim']}")
+            if estoque > 0:
+                st.markdown(f"📦 **Estoque:** {estoque} unidades")
+            else:
+                st.markdown("📦 **Esgotado**")
+        
+        with col2:
+            st.markdown(f"### ~~R$ {oferta['preco_original']:.2f}~~")
+            st.markdown(f"## 💚 R$ {oferta['preco_venda']:.2f}")
+            st.success(f"**{desconto}% OFF**")
+            
+            st.button("➕ Reservar", key=f"reservar_{oferta['id']}", use_container_width=True,
+                      disabled=estoque <= 0, on_click=reservar_oferta, args=(oferta['id'],))
             
-            st.markdown('</div>', unsafe_allow_html=True)
-            st.markdown("---")
+            # Resultado da reserva feita no clique que redesenhou este card
+            reserva = st.session_state.pop(f"reserva_{oferta['id']}", None)
+            if reserva:
+                st.success(f"✅ Reserva confirmada!")
+                st.info(f"**Código de retirada:** `{reserva['codigo_retirada']}`")
+                st.balloons()
+            elif reserva is not None:
+                st.error("❌ Oferta esgotada ou erro na reserva")
+        
+        st.markdown('</div>', unsafe_allow_html=True)
+        st.markdown("---")
+
+def filtros_pedidos(chave, status_padrao):
+    """Status e período escolhidos (datas 'AAAA-MM-DD', fim inclusivo)"""
+    col_status, col_periodo = st.columns([2, 1])
+    status = col_status.multiselect(
+        "Filtrar por status",
+        ["reservado", "pago", "retirado", "cancelado"],
+        default=status_padrao,
+        key=f"{chave}_status"
+    )
+    periodo = col_periodo.date_input("Período", value=(), format="DD/MM/YYYY", key=f"{chave}_periodo")
+    inicio = periodo[0].isoformat() if len(periodo) > 0 else None
+    fim = periodo[1].isoformat() if len(periodo) > 1 else inicio
+    return status, inicio, fim
+
+def carregar_paginas(chave, listar, filtros):
+    """Pedidos das páginas já carregadas ("carregar mais") e se há outra página.
+
+    Guarda só os cursores (criado_em, id) de cada página; cada página é uma
+    consulta por keyset no banco, com os filtros no SQL.
+    """
+    if st.session_state.get(f"{chave}_filtros") != filtros:
+        st.session_state[f"{chave}_filtros"] = filtros
+        st.session_state[f"{chave}_cursores"] = [None]
+    
+    cursores = st.session_state[f"{chave}_cursores"]
+    pedidos = []
+    for cursor in cursores:
+        pedidos += listar(cursor=cursor, limite=PEDIDOS_POR_PAGINA)
+    return pedidos, len(pedidos) == len(cursores) * PEDIDOS_POR_PAGINA
+
+def botao_carregar_mais(chave, pedidos, ha_mais):
+    if ha_mais and st.button("⬇️ Carregar mais", key=f"{chave}_mais", use_container_width=True):
+        ultimo = pedidos[-1]
+        st.session_state[f"{chave}_cursores"].append((ultimo['data'], ultimo['id']))
+        st.rerun()
 
 def tela_meus_pedidos():
     st.title("📦 Meus Pedidos")
     
-    pedidos = db.listar_pedidos_consumidor(st.session_state.user['id'])
-    
-    if not pedidos:
+    consumidor_id = st.session_state.user['id']
+    if not db.listar_pedidos_consumidor(consumidor_id, limite=1):
         st.info("Você ainda não fez nenhum pedido. Que tal explorar as ofertas disponíveis?")
         return
     
-    # Filtro por status
-    status_filtro = st.multiselect(
-        "Filtrar por status",
-        ["reservado", "pago", "retirado", "cancelado"],
-        default=["reservado", "pago", "retirado"]
-    )
+    # Filtros de status e período (aplicados no banco)
+    status_filtro, inicio, fim = filtros_pedidos("meus_pedidos", ["reservado", "pago", "retirado"])
+    if not status_filtro:
+        st.warning("Selecione ao menos um status")
+        return
     
-    pedidos_filtrados = [p for p in pedidos if p['status'] in status_filtro]
+    pedidos, ha_mais = carregar_paginas(
+        "meus_pedidos",
+        lambda cursor, limite: db.listar_pedidos_consumidor(consumidor_id, status_filtro, inicio, fim,
+                                                            cursor, limite),
+        (tuple(status_filtro), inicio, fim)
+    )
     
-    st.markdown(f"**{len(pedidos_filtrados)} pedidos encontrados**")
+    st.markdown(f"**{len(pedidos)}{'+' if ha_mais else ''} pedidos encontrados**")
     
-    for pedido in pedidos_filtrados:
+    for pedido in pedidos:
         status_class = f"status-{pedido['status']}"
         
         with st.expander(f"🎫 {pedido['oferta']} - {pedido['estabelecimento']}", expanded=(pedido['status'] == 'reservado')):
@@ -318,7 +437,7 @@ def tela_meus_pedidos():
                     
                     # Botão de cancelamento
                     if st.button("🗑️ Cancelar Pedido", key=f"cancelar_{pedido['id']}", type="secondary"):
-                        resultado = db.cancelar_pedido(pedido['id'])
+                        resultado = motor_reservas.cancelar_pedido(pedido['id'])
                         if resultado['sucesso']:
                             st.success(resultado['mensagem'])
                             if resultado.get('pagamento_estornado'):
@@ -326,6 +445,8 @@ def tela_meus_pedidos():
                             st.rerun()
                         else:
                             st.error(resultado['mensagem'])
+    
+    botao_carregar_mais("meus_pedidos", pedidos, ha_mais)
 
 def tela_como_funciona():
     st.title("❓ Como Funciona o Pega Aí")
@@ -387,7 +508,7 @@ def area_estabelecimento():
     elif menu == "📦 Pedidos":
         tela_pedidos_estabelecimento(est_id)
     else:
-        tela_validar_retirada()
+        tela_validar_retirada(est_id)
 
 def completar_cadastro_estabelecimento():
     st.title("🏪 Complete seu Cadastro")
@@ -422,33 +543,11 @@ def completar_cadastro_estabelecimento():
 def tela_dashboard(est_id):
     st.title("📊 Dashboard")
     
-    # KPIs
-    conn = db.get_connection()
-    
-    # Total de pedidos
-    total_pedidos = pd.read_sql(f"""
-        SELECT COUNT(*) as total
-        FROM pedidos p
-        JOIN ofertas o ON p.oferta_id = o.id
-        WHERE o.estabelecimento_id = {est_id}
-    """, conn)['total'][0]
-    
-    # Receita total
-    receita = pd.read_sql(f"""
-        SELECT COALESCE(SUM(p.valor_total), 0) as total
-        FROM pedidos p
-        JOIN ofertas o ON p.oferta_id = o.id
-        WHERE o.estabelecimento_id = {est_id} AND p.status = 'retirado'
-    """, conn)['total'][0]
-    
-    # Ofertas ativas
-    ofertas_ativas = pd.read_sql(f"""
-        SELECT COUNT(*) as total
-        FROM ofertas
-        WHERE estabelecimento_id = {est_id} AND status = 'ativa' AND estoque_atual > 0
-    """, conn)['total'][0]
-    
-    conn.close()
+    # KPIs (tabela de resumo mantida a cada escrita)
+    kpis = db.obter_kpis_estabelecimento(est_id)
+    total_pedidos = kpis['total_pedidos']
+    receita = kpis['receita']
+    ofertas_ativas = kpis['ofertas_ativas']
     
     col1, col2, col3 = st.columns(3)
     
@@ -510,24 +609,94 @@ def tela_nova_oferta(est_id):
 def tela_pedidos_estabelecimento(est_id):
     st.title("📦 Pedidos Recebidos")
     
-    pedidos = db.listar_pedidos_estabelecimento(est_id)
-    
-    if not pedidos:
+    if not db.listar_pedidos_estabelecimento(est_id, limite=1):
         st.info("Nenhum pedido recebido ainda. Publique ofertas para começar!")
         return
     
-    # Filtros
-    status_filtro = st.multiselect(
-        "Filtrar por status",
-        ["reservado", "pago", "retirado", "cancelado"],
-        default=["reservado", "pago"]
-    )
+    with st.expander("⬇️ Exportar histórico completo"):
+        exportar_historico(est_id)
     
-    pedidos_filtrados = [p for p in pedidos if p['status'] in status_filtro]
+    # Filtros (aplicados no banco)
+    status_filtro, inicio, fim = filtros_pedidos("pedidos_loja", ["reservado", "pago"])
+    if not status_filtro:
+        st.warning("Selecione ao menos um status")
+        return
     
-    st.markdown(f"**{len(pedidos_filtrados)} pedidos**")
+    lista_pedidos_loja(est_id, tuple(status_filtro), inicio, fim)
+
+def pedido_no_filtro(pedido, filtros):
+    _, status_filtro, inicio, fim = filtros
+    return (pedido['status'] in status_filtro
+            and (not inicio or pedido['data'] >= inicio)
+            and (not fim or pedido['data'][:10] <= fim))
+
+def aplicar_eventos_pedidos(estado, est_id):
+    """Aplica à lista carregada os eventos posteriores ao cursor; retorna os pedidos novos.
+
+    Cada evento traz o pedido no estado atual: ele entra, sai ou muda de
+    status na lista conforme os filtros. Pedidos mais antigos que a última
+    página carregada ficam para o "carregar mais".
+    """
+    atuais, novos = {}, []
+    while True:
+        eventos = db.listar_eventos_pedido(est_id, apos_id=estado['evento'], limite=EVENTOS_POR_LEITURA)
+        for evento in eventos:
+            atuais[evento['pedido']['id']] = evento['pedido']
+            if evento['status_anterior'] is None:
+                novos.append(evento['pedido'])
+        if eventos:
+            estado['evento'] = eventos[-1]['id']
+        if len(eventos) < EVENTOS_POR_LEITURA:
+            break
+    
+    if atuais:
+        pedidos = [p for p in estado['pedidos'] if p['id'] not in atuais]
+        for pedido in atuais.values():
+            if pedido_no_filtro(pedido, estado['filtros']) and (
+                    estado['cursor'] is None or (pedido['data'], pedido['id']) > estado['cursor']):
+                pedidos.append(pedido)
+        pedidos.sort(key=lambda p: (p['data'], p['id']), reverse=True)
+        estado['pedidos'] = pedidos
+    return novos
+
+def carregar_mais_pedidos_loja(est_id):
+    """Callback do "carregar mais": busca a página seguinte ao cursor da última carregada"""
+    estado = st.session_state.pedidos_loja_estado
+    _, status_filtro, inicio, fim = estado['filtros']
+    pagina = db.listar_pedidos_estabelecimento(est_id, list(status_filtro), inicio, fim,
+                                               estado['cursor'], PEDIDOS_POR_PAGINA)
+    carregados = {p['id'] for p in estado['pedidos']}
+    estado['pedidos'] += [p for p in pagina if p['id'] not in carregados]
+    estado['cursor'] = (pagina[-1]['data'], pagina[-1]['id']) if len(pagina) == PEDIDOS_POR_PAGINA else None
+
+@st.fragment(run_every=INTERVALO_PEDIDOS_LOJA_S)
+def lista_pedidos_loja(est_id, status_filtro, inicio, fim):
+    """Pedidos da loja guardados na sessão e atualizados pelo log de eventos.
+
+    A lista só é relida do banco quando os filtros mudam; a cada intervalo o
+    fragmento consulta apenas os eventos novos. ``cursor`` é a chave
+    (criado_em, id) da última página carregada, ou None se não há mais páginas.
+    """
+    filtros = (est_id, status_filtro, inicio, fim)
+    estado = st.session_state.get("pedidos_loja_estado")
+    
+    if estado is None or estado['filtros'] != filtros:
+        # Cursor do log lido antes da lista: eventos no meio são reaplicados, nunca perdidos
+        evento = db.ultimo_evento_pedido(est_id)
+        pedidos = db.listar_pedidos_estabelecimento(est_id, list(status_filtro), inicio, fim,
+                                                    limite=PEDIDOS_POR_PAGINA)
+        cursor = (pedidos[-1]['data'], pedidos[-1]['id']) if len(pedidos) == PEDIDOS_POR_PAGINA else None
+        estado = {'filtros': filtros, 'evento': evento, 'pedidos': pedidos, 'cursor': cursor}
+        st.session_state.pedidos_loja_estado = estado
+    else:
+        for pedido in aplicar_eventos_pedidos(estado, est_id):
+            st.toast(f"🆕 Novo pedido #{pedido['id']} - {pedido['oferta']}")
+    
+    pedidos = estado['pedidos']
+    st.markdown(f"**{len(pedidos)}{'+' if estado['cursor'] else ''} pedidos**")
+    st.caption(f"Atualizado automaticamente a cada {INTERVALO_PEDIDOS_LOJA_S}s")
     
-    for pedido in pedidos_filtrados:
+    for pedido in pedidos:
         with st.expander(f"🎫 Pedido #{pedido['id']} - {pedido['oferta']}"):
             col1, col2 = st.columns([2, 1])
             
@@ -542,22 +711,58 @@ def tela_pedidos_estabelecimento(est_id):
                 st.markdown(f"**Status:** {pedido['status'].upper()}")
                 st.code(pedido['codigo'])
                 st.caption("Código de retirada")
+    
+    if estado['cursor']:
+        st.button("⬇️ Carregar mais", key="pedidos_loja_mais", use_container_width=True,
+                  on_click=carregar_mais_pedidos_loja, args=(est_id,))
+
+def exportar_historico(est_id):
+    col1, col2, col3 = st.columns([2, 2, 1])
+    periodo = col1.date_input("Período", value=(), format="DD/MM/YYYY", key="exportar_periodo")
+    status = col2.multiselect("Status", ["reservado", "pago", "retirado", "cancelado"], key="exportar_status")
+    formato = col3.radio("Formato", ["csv", "jsonl"], key="exportar_formato")
+    
+    inicio = periodo[0].isoformat() if len(periodo) > 0 else None
+    fim = periodo[1].isoformat() if len(periodo) > 1 else inicio
+    
+    def gerar_arquivo():
+        # Roda só no clique, fora do script. O Database lê o histórico em blocos
+        # com memória constante, mas este caminho da interface NÃO é streaming: o
+        # download_button precisa do conteúdo inteiro como bytes (guardado pelo
+        # MediaFileManager), então o arquivo completo fica em memória. Para
+        # históricos muito grandes, sirva o gerador por um endpoint HTTP próprio.
+        return b"".join(bloco.encode("utf-8") for bloco in
+                        db.exportar_pedidos_estabelecimento(est_id, formato, inicio, fim, status or None))
+    
+    st.download_button(
+        "⬇️ Baixar",
+        data=gerar_arquivo,
+        file_name=f"pedidos_{est_id}_{datetime.now():%Y%m%d}.{formato}",
+        mime="text/csv" if formato == "csv" else "application/x-ndjson",
+        use_container_width=True,
+    )
 
-def tela_validar_retirada():
+def tela_validar_retirada(est_id):
     st.title("✅ Validar Retirada")
     
+    modo = st.radio("Modo", ["Um código", "Vários códigos"], horizontal=True)
+    
+    if modo == "Vários códigos":
+        tela_validar_retiradas_lote(est_id)
+        return
+    
     st.markdown("""
     Digite o código de retirada apresentado pelo cliente para confirmar a entrega.
     """)
     
-    codigo = st.text_input("🔑 Código de Retirada", max_chars=8, placeholder="Ex: A1B2C3D4")
+    codigo = st.text_input("🔑 Código de Retirada", max_chars=9, placeholder="Ex: K7M2X9QP ou K7M2-X9QP")
     
     col1, col2, col3 = st.columns([1, 2, 1])
     
     with col2:
         if st.button("✅ Validar e Confirmar Retirada", use_container_width=True):
             if codigo:
-                resultado = db.validar_retirada(codigo.upper())
+                resultado = db.validar_retirada(codigo, est_id)
                 
                 if resultado['sucesso']:
                     st.success(resultado['mensagem'])
@@ -568,6 +773,31 @@ def tela_validar_retirada():
             else:
                 st.warning("Digite o código de retirada")
 
+def tela_validar_retiradas_lote(est_id):
+    st.markdown("""
+    Cole ou escaneie os códigos (um por linha, ou separados por espaço/vírgula).
+    Todos são conferidos e baixados de uma vez.
+    """)
+    
+    texto = st.text_area("🔑 Códigos de Retirada", height=200, placeholder="K7M2X9QP\nH4TR8WZC\n...")
+    codigos = [c for c in re.split(r"[\s,;]+", texto) if c]
+    st.caption(f"{len(codigos)} código(s)")
+    
+    if st.button("✅ Validar Todos", use_container_width=True, disabled=not codigos):
+        resultados = db.validar_retiradas_lote(codigos, est_id)
+        validos = sum(r['sucesso'] for r in resultados)
+        
+        col1, col2 = st.columns(2)
+        col1.metric("✅ Retirados", validos)
+        col2.metric("❌ Recusados", len(resultados) - validos)
+        
+        st.dataframe([{
+            "Código": r['codigo'],
+            "Resultado": "✅" if r['sucesso'] else "❌",
+            "Mensagem": r['mensagem'],
+            "Oferta": r.get('detalhes', {}).get('oferta', ""),
+        } for r in resultados], use_container_width=True, hide_index=True)
+
 # ============= FLUXO PRINCIPAL =============
 def main():
     if not st.session_state.logged_in:
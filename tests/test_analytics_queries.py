@@ -0,0 +1,89 @@
+import unittest
+import os
+import pandas as pd
+import scipy.stats as stats
+from database import Database
+from analytics_queries import carregar_pacote
+
+class TestAnalyticsQueries(unittest.TestCase):
+    def setUp(self):
+        """Set up a small dataset with sold and unsold offers in three categories"""
+        self.test_db = 'test_analytics.db'
+        self.db = Database(self.test_db)
+        consumidor = self.db.criar_usuario("C", "c@email.com", "senha123", "consumidor")
+        self.db.criar_usuario("C2", "c2@email.com", "senha123", "consumidor")
+        dono = self.db.criar_usuario("E", "e@pegaai.com", "senha123", "estabelecimento")
+        est = self.db.criar_estabelecimento(dono, "Loja", "11222333000144", "Rua 1", -23.55, -46.63)
+
+        self.ofertas = []
+        for i, categoria in enumerate(['Padaria'] * 3 + ['Hortifruti'] * 3 + ['Mercado']):
+            self.ofertas.append(self.db.criar_oferta(
+                est, f"Oferta {i}", "", categoria, 20.0, 5.0 + i, 50, "18:00", "19:00"))
+
+        # Pedidos retirados, um cancelado e um só pago
+        conn = self.db.get_connection()
+        for indice, (oferta, quantidade, status) in enumerate([
+                (0, 2, 'retirado'), (0, 1, 'retirado'), (1, 3, 'retirado'),
+                (3, 1, 'retirado'), (4, 4, 'retirado'), (6, 2, 'retirado'),
+                (2, 1, 'cancelado'), (5, 1, 'pago')]):
+            conn.execute('''
+                INSERT INTO pedidos (consumidor_id, oferta_id, quantidade, valor_total, status, codigo_retirada)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (consumidor, self.ofertas[oferta], quantidade, quantidade * (5.0 + oferta), status, f"C{indice}"))
+        conn.commit()
+        conn.close()
+        self.db.invalidar_cache()
+
+    def tearDown(self):
+        """Clean up the temporary database"""
+        self.db.close()
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db + sufixo):
+                os.remove(self.test_db + sufixo)
+
+    def test_pacote_confere_com_consultas_diretas(self):
+        """Test the single-pass bundle against straightforward per-metric queries"""
+        self.db.atualizar_rollups()
+        pacote = carregar_pacote(self.db)
+        conn = self.db.get_connection()
+
+        kpis = pacote['kpis']
+        self.assertEqual(kpis['total_ofertas'], 7)
+        self.assertEqual(kpis['total_pedidos'], 8)
+        self.assertEqual(kpis['total_retirados'], 6)
+        self.assertEqual(kpis['total_consumidores'], 2)
+
+        tickets = pd.read_sql("SELECT valor_total FROM pedidos WHERE status = 'retirado'", conn)['valor_total']
+        self.assertAlmostEqual(pacote['ticket']['medio'], tickets.mean())
+        self.assertAlmostEqual(pacote['ticket']['std'], tickets.std())
+        self.assertEqual(pacote['ticket']['min'], tickets.min())
+        self.assertEqual(pacote['ticket']['max'], tickets.max())
+
+        # ANOVA original: uma observação por pedido retirado, 0 para oferta sem retirada
+        grupos = [
+            [linha[0] for linha in conn.execute('''
+                SELECT COALESCE(p.quantidade, 0)
+                FROM ofertas o LEFT JOIN pedidos p ON p.oferta_id = o.id AND p.status = 'retirado'
+                WHERE o.categoria = ?
+            ''', (categoria,))]
+            for categoria in sorted(pacote['categorias_anova'])
+        ]
+        f_valor, p_valor = stats.f_oneway(*grupos)
+
+        vendidos = dict(conn.execute('''
+            SELECT o.id, COALESCE(SUM(p.quantidade), 0)
+            FROM ofertas o LEFT JOIN pedidos p ON p.oferta_id = o.id AND p.status = 'retirado'
+            GROUP BY o.id
+        ''').fetchall())
+        conn.close()
+        desempenho = pacote['desempenho'].set_index('id')['vendidos'].to_dict()
+        self.assertEqual(desempenho, vendidos)
+
+        # Mercado tem só uma oferta e fica fora da ANOVA
+        self.assertEqual(sorted(pacote['categorias_anova']), ['Hortifruti', 'Padaria'])
+        self.assertAlmostEqual(pacote['anova']['f'], f_valor)
+        self.assertAlmostEqual(pacote['anova']['p'], p_valor)
+        self.assertEqual(int(pacote['tempo']['vendidos'].sum()), 13)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+import os
+import asyncio
+import hashlib
+import inspect
+import threading
+from database import Database
+from async_database import AsyncDatabase
+
+class TestAsyncDatabase(unittest.TestCase):
+    def setUp(self):
+        """Set up a temporary database for testing"""
+        self.test_db = 'test_async_pega_ai.db'
+
+    def tearDown(self):
+        """Clean up the temporary database"""
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db + sufixo):
+                os.remove(self.test_db + sufixo)
+
+    def test_espelha_api_publica(self):
+        """Test that every public data method of Database has an async counterpart"""
+        infraestrutura = {'get_connection', 'init_database', 'hash_senha', 'close'}
+        publicos = {
+            nome for nome, _ in inspect.getmembers(Database, inspect.isfunction)
+            if not nome.startswith('_') and nome not in infraestrutura
+        }
+        for nome in publicos:
+            self.assertTrue(inspect.iscoroutinefunction(getattr(AsyncDatabase, nome, None)), nome)
+
+    def test_pedidos_concorrentes(self):
+        """Test 20 concurrent coroutines competing for 5 boxes"""
+        async def cenario():
+            async with AsyncDatabase(self.test_db, leitores=4, max_concorrencia=8) as adb:
+                user_id = await adb.criar_usuario("Loja", "loja@email.com", "123", "estabelecimento")
+                est_id = await adb.criar_estabelecimento(user_id, "Loja", "1", "Rua", -23.55, -46.63)
+                oferta_id = await adb.criar_oferta(est_id, "Caixa", "", "Padaria", 20.0, 5.0, 5, "18:00", "19:00")
+                cons_id = await adb.criar_usuario("Cons", "cons@email.com", "123", "consumidor")
+
+                pedidos = await asyncio.gather(*(adb.criar_pedido(cons_id, oferta_id) for _ in range(20)))
+                ofertas, meus = await asyncio.gather(
+                    adb.listar_ofertas_ativas(), adb.listar_pedidos_consumidor(cons_id)
+                )
+                return pedidos, ofertas, meus
+
+        pedidos, ofertas, meus = asyncio.run(cenario())
+        self.assertEqual(sum(1 for p in pedidos if p), 5)
+        self.assertEqual(ofertas, [])
+        self.assertEqual(len(meus), 5)
+
+    def test_cancelamento_nao_interrompe_escrita(self):
+        """Test that a cancelled write coroutine still commits its transaction"""
+        async def cenario():
+            async with AsyncDatabase(self.test_db) as adb:
+                tarefa = asyncio.create_task(adb.criar_usuario("X", "x@email.com", "123", "consumidor"))
+                await asyncio.sleep(0)
+                tarefa.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await tarefa
+            # close() aguardou a thread escritora terminar
+
+        asyncio.run(cenario())
+        db = Database(self.test_db)
+        self.assertIsNotNone(db.autenticar_usuario("x@email.com", "123"))
+        db.close()
+
+    def test_cancelamento_so_libera_vaga_ao_terminar(self):
+        """Test that a cancelled call keeps its concurrency slot until the thread finishes"""
+        liberar = threading.Event()
+
+        async def cenario():
+            async with AsyncDatabase(self.test_db, max_concorrencia=1) as adb:
+                tarefa = asyncio.create_task(adb._escrever(liberar.wait, 5))
+                await asyncio.sleep(0.05)
+                tarefa.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await tarefa
+                ocupado = adb._limite.locked()
+                liberar.set()
+                await adb.obter_versao_dados()
+                return ocupado, adb._limite.locked()
+
+        ocupado, depois = asyncio.run(cenario())
+        self.assertTrue(ocupado)
+        self.assertFalse(depois)
+
+    def test_rehash_no_login_vai_para_escritora(self):
+        """Test that the login rehash is applied by the writer thread, not a reader"""
+        async def cenario():
+            async with AsyncDatabase(self.test_db) as adb:
+                conn = adb.db.get_connection()
+                antigo = f"abc${hashlib.sha256(b'abcsenha123').hexdigest()}"
+                conn.execute("INSERT INTO usuarios (nome, email, senha, tipo) VALUES ('A', 'a@email.com', ?, 'consumidor')",
+                              (antigo,))
+                conn.commit()
+                conn.close()
+
+                threads = []
+                escrever = adb.db._executar_escrita
+                def registrar(*args, **kwargs):
+                    threads.append(threading.current_thread().name)
+                    return escrever(*args, **kwargs)
+                adb.db._executar_escrita = registrar
+
+                user = await adb.autenticar_usuario("a@email.com", "senha123")
+                conn = adb.db.get_connection()
+                novo = conn.execute("SELECT senha FROM usuarios WHERE email = 'a@email.com'").fetchone()[0]
+                conn.close()
+                return user, threads, novo, antigo
+
+        user, threads, novo, antigo = asyncio.run(cenario())
+        self.assertIsNotNone(user)
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith('pega-ai-escritor'))
+        self.assertNotEqual(novo, antigo)
+
+if __name__ == '__main__':
+    unittest.main()
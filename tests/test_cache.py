@@ -0,0 +1,24 @@
+import unittest
+from cache import CacheVersionado
+
+class TestCacheVersionado(unittest.TestCase):
+    def test_lru_e_versao(self):
+        """Test LRU eviction and invalidation when the data version advances"""
+        cache = CacheVersionado(max_entradas=2)
+        cache.guardar('a', 1, 'A')
+        cache.guardar('b', 1, 'B')
+        self.assertEqual(cache.obter('a', 1), (True, 'A'))
+
+        # 'b' é o menos usado recentemente
+        cache.guardar('c', 1, 'C')
+        self.assertEqual(cache.obter('b', 1), (False, None))
+        self.assertEqual(cache.estatisticas()['evictions'], 1)
+
+        # Versão nova descarta tudo; valor calculado com versão antiga é ignorado
+        self.assertEqual(cache.obter('a', 2), (False, None))
+        cache.guardar('a', 1, 'velho')
+        self.assertEqual(cache.obter('a', 2), (False, None))
+        self.assertEqual(cache.estatisticas()['entradas'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
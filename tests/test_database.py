@@ -1,8 +1,14 @@
 import unittest
 import os
+import csv
+import io
+import json
 import sqlite3
 import hashlib
-from database import Database
+import threading
+import time
+from database import Database, COLUNAS_EXPORTACAO
+from senhas import HasherSenhas
 
 class TestDatabase(unittest.TestCase):
     def setUp(self):
@@ -12,8 +18,10 @@ class TestDatabase(unittest.TestCase):
 
     def tearDown(self):
         """Clean up the temporary database"""
-        if os.path.exists(self.test_db):
-            os.remove(self.test_db)
+        self.db.close()
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db + sufixo):
+                os.remove(self.test_db + sufixo)
 
     def test_criar_usuario_e_autenticar(self):
         """Test user creation and authentication with salt"""
@@ -51,6 +59,123 @@ class TestDatabase(unittest.TestCase):
         self.assertIsNotNone(user)
         self.assertEqual(user['email'], "legacy@email.com")
 
+    def test_rehash_senha_no_login(self):
+        """Test that old-format hashes are upgraded to the configured KDF on login"""
+        conn = self.db.get_connection()
+        salt = "abc123"
+        antigo = f"{salt}${hashlib.sha256((salt + 'senha123').encode()).hexdigest()}"
+        conn.execute("INSERT INTO usuarios (nome, email, senha, tipo) VALUES (?, ?, ?, ?)",
+                     ("Antigo", "antigo@email.com", antigo, "consumidor"))
+        conn.commit()
+        conn.close()
+
+        self.assertIsNone(self.db.autenticar_usuario("antigo@email.com", "errada"))
+        self.assertIsNotNone(self.db.autenticar_usuario("antigo@email.com", "senha123"))
+
+        conn = self.db.get_connection()
+        novo = conn.execute("SELECT senha FROM usuarios WHERE email = ?", ("antigo@email.com",)).fetchone()[0]
+        conn.close()
+        self.assertTrue(novo.startswith(f"{self.db.senhas.algoritmo}${self.db.senhas.custo}$"))
+        self.assertEqual(self.db.senhas.verificar("senha123", novo), (True, False))
+        self.assertIsNotNone(self.db.autenticar_usuario("antigo@email.com", "senha123"))
+
+        # Outro algoritmo/custo também pede rehash
+        scrypt = HasherSenhas('scrypt', custo=1024)
+        self.assertEqual(scrypt.verificar("senha123", novo), (True, True))
+        self.assertEqual(scrypt.verificar("senha123", scrypt.gerar("senha123")), (True, False))
+        scrypt.close()
+
+    def test_sessoes(self):
+        """Test session tokens: validation, logout, expiry and no cache invalidation"""
+        user_id = self.db.criar_usuario("Sessão", "sessao@email.com", "senha123", "consumidor")
+        versao = self.db.obter_versao_dados()
+
+        token = self.db.criar_sessao(user_id)
+        self.assertEqual(self.db.validar_sessao(token)['id'], user_id)
+        self.assertIsNone(self.db.validar_sessao(token + "x"))
+        self.assertEqual(self.db.obter_versao_dados(), versao)
+
+        self.db.encerrar_sessao(token)
+        self.assertIsNone(self.db.validar_sessao(token))
+
+        expirado = self.db.criar_sessao(user_id)
+        conn = self.db.get_connection()
+        conn.execute("UPDATE sessoes SET expira_em = datetime('now', '-1 minute')")
+        conn.commit()
+        conn.close()
+        self.assertIsNone(self.db.validar_sessao(expirado))
+
+    def test_codigos_retirada(self):
+        """Test unambiguous codes, collision retry and store-scoped pickup validation"""
+        cons_id = self.db.criar_usuario("Cons", "cons@email.com", "123", "consumidor")
+        lojas = []
+        for i in range(2):
+            user_id = self.db.criar_usuario(f"Loja {i}", f"loja{i}@email.com", "123", "estabelecimento")
+            est_id = self.db.criar_estabelecimento(user_id, f"Loja {i}", str(i), "Rua", -23.55, -46.63)
+            oferta_id = self.db.criar_oferta(est_id, "Pão", "", "Padaria", 20.0, 10.0, 10, "18:00", "19:00")
+            lojas.append((est_id, oferta_id))
+
+        p1 = self.db.criar_pedido(cons_id, lojas[0][1])
+        self.assertRegex(p1['codigo_retirada'], r'^[2-9A-HJKMNP-Z]{8}$')
+
+        # Sorteio que repete um código existente: o alocador tenta de novo
+        sorteios = iter([[p1['codigo_retirada']], ['KKKKKKKK']])
+        gerar = self.db.codigos.gerar
+        self.db.codigos.gerar = lambda quantidade=1: next(sorteios)
+        p2 = self.db.criar_pedido(cons_id, lojas[1][1])
+        self.db.codigos.gerar = gerar
+        self.assertEqual(p2['codigo_retirada'], 'KKKKKKKK')
+        self.assertEqual(self.db.codigos.colisoes, 1)
+
+        lote = self.db.criar_pedidos_lote(cons_id, [(lojas[0][1], 1), (lojas[0][1], 1)])
+        codigos_lote = {item['pedido']['codigo_retirada'] for item in lote['itens']}
+        self.assertEqual(len(codigos_lote), 2)
+
+        # Loja 0 não resgata código da loja 1; a própria loja sim (digitação normalizada)
+        self.assertEqual(self.db.validar_retirada(p2['codigo_retirada'], lojas[0][0])['mensagem'], 'Código inválido')
+        self.assertTrue(self.db.validar_retirada('kkkk-kkkk', lojas[1][0])['sucesso'])
+        self.assertTrue(self.db.validar_retirada(p1['codigo_retirada'], lojas[0][0])['sucesso'])
+
+        conn = self.db.get_connection()
+        plano = conn.execute('''
+            EXPLAIN QUERY PLAN SELECT id FROM pedidos WHERE estabelecimento_id = ? AND codigo_retirada = ?
+        ''', (1, 'X')).fetchall()
+        sem_loja = conn.execute('SELECT COUNT(*) FROM pedidos WHERE estabelecimento_id IS NULL').fetchone()[0]
+        conn.close()
+        self.assertTrue(any('USING' in linha[-1] for linha in plano))
+        self.assertEqual(sem_loja, 0)
+
+    def test_validar_retiradas_lote(self):
+        """Test bulk pickup validation: per-code results in input order, one transaction"""
+        cons_id = self.db.criar_usuario("Cons", "cons@email.com", "123", "consumidor")
+        user_id = self.db.criar_usuario("Loja", "loja@email.com", "123", "estabelecimento")
+        est_id = self.db.criar_estabelecimento(user_id, "Loja", "1", "Rua", -23.55, -46.63)
+        oferta_id = self.db.criar_oferta(est_id, "Pão", "", "Padaria", 20.0, 10.0, 10, "18:00", "19:00")
+        codigos = [self.db.criar_pedido(cons_id, oferta_id)['codigo_retirada'] for _ in range(4)]
+        self.db.validar_retirada(codigos[0], est_id)
+        ids = {p['codigo']: p['id'] for p in self.db.listar_pedidos_consumidor(cons_id)}
+        self.db.cancelar_pedido(ids[codigos[3]])
+        versao = self.db.obter_versao_dados()
+
+        resultados = self.db.validar_retiradas_lote(
+            [codigos[0], codigos[1].lower(), 'ZZZZZZZZ', codigos[2], codigos[1]], est_id)
+        self.assertEqual([r['mensagem'] for r in resultados], [
+            'Pedido já foi retirado', 'Pedido retirado com sucesso!', 'Código inválido',
+            'Pedido retirado com sucesso!', 'Pedido já foi retirado',
+        ])
+        self.assertEqual(resultados[1]['codigo'], codigos[1])
+        self.assertEqual(resultados[1]['detalhes']['oferta'], "Pão")
+        self.assertEqual(self.db.obter_versao_dados(), versao + 1)
+
+        cancelado = self.db.validar_retiradas_lote([codigos[3]], est_id)[0]
+        self.assertEqual(cancelado['mensagem'], 'Pedido cancelado')
+        # Repetidos: cancelado continua cancelado; retirado antes continua "já retirado"
+        repetidos = self.db.validar_retiradas_lote([codigos[3], codigos[0], codigos[3], codigos[0]], est_id)
+        self.assertEqual([r['mensagem'] for r in repetidos], [
+            'Pedido cancelado', 'Pedido já foi retirado', 'Pedido cancelado', 'Pedido já foi retirado',
+        ])
+        self.assertEqual(self.db.validar_retiradas_lote([codigos[3]], est_id + 1)[0]['mensagem'], 'Código inválido')
+
     def test_criar_estabelecimento_e_oferta(self):
         """Test establishment and offer creation"""
         # Create establishment user
@@ -111,5 +236,443 @@ class TestDatabase(unittest.TestCase):
         self.assertEqual(estoque, 2)
         conn.close()
 
+    def test_status_oferta_segue_estoque(self):
+        """Test that offers flip to esgotada at zero stock and back to ativa when stock returns"""
+        cons_id = self.db.criar_usuario("Consumidor", "cons@email.com", "123", "consumidor")
+        est_user_id = self.db.criar_usuario("Estabel", "est@email.com", "123", "estabelecimento")
+        est_id = self.db.criar_estabelecimento(est_user_id, "Restaurante", "111", "End", 0, 0)
+        oferta_id = self.db.criar_oferta(est_id, "Comida", "Boa", "Restaurante", 50.0, 25.0, 1, "12:00", "13:00")
+
+        def status():
+            conn = self.db.get_connection()
+            valor = conn.execute('SELECT status FROM ofertas WHERE id = ?', (oferta_id,)).fetchone()[0]
+            conn.close()
+            return valor
+
+        pedido = self.db.criar_pedido(cons_id, oferta_id, 1)
+        self.assertEqual(status(), 'esgotada')
+        self.assertEqual(self.db.listar_ofertas_ativas(), [])
+        self.assertEqual(self.db.obter_kpis_estabelecimento(est_id)['ofertas_ativas'], 0)
+        lote = self.db.criar_pedidos_lote(cons_id, [(oferta_id, 1)])
+        self.assertEqual(lote['itens'][0]['mensagem'], 'Estoque insuficiente')
+
+        self.db.cancelar_pedido(pedido['id'])
+        self.assertEqual(status(), 'ativa')
+        self.assertEqual([o['id'] for o in self.db.listar_ofertas_ativas()], [oferta_id])
+        self.assertEqual(self.db.obter_kpis_estabelecimento(est_id)['ofertas_ativas'], 1)
+
+        conn = self.db.get_connection()
+        plano = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM ofertas WHERE status = 'ativa' ORDER BY criado_em DESC"
+        ).fetchall()
+        conn.close()
+        self.assertTrue(any('idx_ofertas_ativas_recentes' in linha[-1] for linha in plano))
+
+    def test_exportar_pedidos_estabelecimento(self):
+        """Test streamed CSV/JSONL export: chunking, SQL-side filters and empty result"""
+        cons_id = self.db.criar_usuario("Cliente, Um", "cons@email.com", "123", "consumidor")
+        est_user_id = self.db.criar_usuario("Estabel", "est@email.com", "123", "estabelecimento")
+        est_id = self.db.criar_estabelecimento(est_user_id, "Restaurante", "111", "End", 0, 0)
+        oferta_id = self.db.criar_oferta(est_id, "Comida", "Boa", "Restaurante", 50.0, 25.0, 10, "12:00", "13:00")
+        pedidos = [self.db.criar_pedido(cons_id, oferta_id) for _ in range(5)]
+        self.db.validar_retirada(pedidos[0]['codigo_retirada'], est_id)
+        conn = self.db.get_connection()
+        conn.execute("UPDATE pedidos SET criado_em = '2024-01-10 12:00:00' WHERE id = ?", (pedidos[1]['id'],))
+        conn.commit()
+        conn.close()
+
+        blocos = list(self.db.exportar_pedidos_estabelecimento(est_id, tamanho_bloco=2))
+        self.assertEqual(len(blocos), 3)
+        linhas = list(csv.DictReader(io.StringIO(''.join(blocos))))
+        self.assertEqual(len(linhas), 5)
+        self.assertEqual(linhas[0]['pedido_id'], str(pedidos[1]['id']))   # ordem por data
+        self.assertEqual(linhas[0]['cliente'], "Cliente, Um")
+
+        jsonl = ''.join(self.db.exportar_pedidos_estabelecimento(est_id, 'jsonl', status=['retirado']))
+        registros = [json.loads(linha) for linha in jsonl.splitlines()]
+        self.assertEqual([r['codigo_retirada'] for r in registros], [pedidos[0]['codigo_retirada']])
+        self.assertEqual(registros[0]['pagamento_status'], 'aprovado')
+
+        periodo = ''.join(self.db.exportar_pedidos_estabelecimento(est_id, 'jsonl', '2024-01-01', '2024-01-10'))
+        self.assertEqual([json.loads(l)['pedido_id'] for l in periodo.splitlines()], [pedidos[1]['id']])
+        vazio = ''.join(self.db.exportar_pedidos_estabelecimento(est_id, inicio='2030-01-01'))
+        self.assertEqual(vazio.splitlines(), [','.join(COLUNAS_EXPORTACAO)])
+
+    def test_listar_pedidos_paginado(self):
+        """Test keyset paging plus status/date filters on both order listings"""
+        cons_id = self.db.criar_usuario("Cliente", "cons@email.com", "123", "consumidor")
+        est_user_id = self.db.criar_usuario("Estabel", "est@email.com", "123", "estabelecimento")
+        est_id = self.db.criar_estabelecimento(est_user_id, "Restaurante", "111", "End", 0, 0)
+        oferta_id = self.db.criar_oferta(est_id, "Comida", "Boa", "Restaurante", 50.0, 25.0, 10, "12:00", "13:00")
+        ids = [self.db.criar_pedido(cons_id, oferta_id)['id'] for _ in range(7)]
+        self.db.cancelar_pedido(ids[0])
+        conn = self.db.get_connection()
+        conn.execute("UPDATE pedidos SET criado_em = '2024-01-10 12:00:00' WHERE id IN (?, ?)", (ids[1], ids[2]))
+        conn.commit()
+        conn.close()
+
+        for listar, dono in ((self.db.listar_pedidos_consumidor, cons_id),
+                             (self.db.listar_pedidos_estabelecimento, est_id)):
+            paginas, cursor = [], None
+            while True:
+                pagina = listar(dono, status=['pago'], cursor=cursor, limite=2)
+                if not pagina:
+                    break
+                paginas.append([p['id'] for p in pagina])
+                cursor = (pagina[-1]['data'], pagina[-1]['id'])
+            self.assertEqual(paginas, [[ids[6], ids[5]], [ids[4], ids[3]], [ids[2], ids[1]]])
+            self.assertEqual(len(listar(dono)), 7)
+            self.assertEqual([p['id'] for p in listar(dono, inicio='2024-01-10', fim='2024-01-10')],
+                             [ids[2], ids[1]])
+
+        conn = self.db.get_connection()
+        plano = conn.execute('''
+            EXPLAIN QUERY PLAN SELECT id FROM pedidos p WHERE p.consumidor_id = ?
+            ORDER BY p.criado_em DESC, p.id DESC LIMIT 20
+        ''', (cons_id,)).fetchall()
+        conn.close()
+        self.assertTrue(any('idx_pedidos_consumidor_criado' in linha[-1] for linha in plano))
+        self.assertFalse(any('TEMP B-TREE' in linha[-1] for linha in plano))
+
+    def test_eventos_pedido(self):
+        """Test the order event log: one event per creation/status change, read after a cursor"""
+        cons_id = self.db.criar_usuario("Cliente", "cons@email.com", "123", "consumidor")
+        est_user_id = self.db.criar_usuario("Estabel", "est@email.com", "123", "estabelecimento")
+        est_id = self.db.criar_estabelecimento(est_user_id, "Restaurante", "111", "End", 0, 0)
+        oferta_id = self.db.criar_oferta(est_id, "Comida", "Boa", "Restaurante", 50.0, 25.0, 10, "12:00", "13:00")
+        self.assertEqual(self.db.ultimo_evento_pedido(est_id), 0)
+
+        pedidos = [self.db.criar_pedido(cons_id, oferta_id) for _ in range(3)]
+        cursor = self.db.ultimo_evento_pedido(est_id)
+        self.db.validar_retirada(pedidos[0]['codigo_retirada'], est_id)
+        self.db.cancelar_pedido(pedidos[1]['id'])
+        self.db.validar_retiradas_lote([pedidos[2]['codigo_retirada']], est_id)
+
+        eventos = self.db.listar_eventos_pedido(est_id, apos_id=cursor)
+        self.assertEqual([(e['pedido']['id'], e['status_anterior'], e['status']) for e in eventos],
+                         [(pedidos[0]['id'], 'pago', 'retirado'), (pedidos[1]['id'], 'pago', 'cancelado'),
+                          (pedidos[2]['id'], 'pago', 'retirado')])
+        self.assertEqual(eventos[1]['pedido']['codigo'], pedidos[1]['codigo_retirada'])
+        self.assertEqual(eventos[-1]['id'], self.db.ultimo_evento_pedido(est_id))
+        self.assertEqual(self.db.listar_eventos_pedido(est_id, apos_id=eventos[-1]['id']), [])
+        self.assertEqual(self.db.listar_eventos_pedido(est_id + 1), [])
+
+        # Criação (reservado) e pagamento de cada pedido vêm antes do cursor
+        anteriores = self.db.listar_eventos_pedido(est_id, limite=100)[:-3]
+        self.assertEqual([(e['status_anterior'], e['status']) for e in anteriores],
+                         [(None, 'reservado'), ('reservado', 'pago')] * 3)
+        self.assertEqual(self.db.podar_eventos_pedido(dias=1), 0)
+        conn = self.db.get_connection()
+        conn.execute("UPDATE eventos_pedido SET criado_em = datetime('now', '-8 days')")
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.db.podar_eventos_pedido(dias=7), 9)
+        self.db.criar_pedido(cons_id, oferta_id)
+        self.assertGreater(self.db.ultimo_evento_pedido(), eventos[-1]['id'])
+
+    def test_formatos_resultado(self):
+        """Test that tuple, columnar and DataFrame results match the default dict listing"""
+        cons_id = self.db.criar_usuario("Cliente", "cons@email.com", "123", "consumidor")
+        est_user_id = self.db.criar_usuario("Estabel", "est@email.com", "123", "estabelecimento")
+        est_id = self.db.criar_estabelecimento(est_user_id, "Restaurante", "111", "End", 0, 0)
+        for titulo in ("A", "B"):
+            oferta_id = self.db.criar_oferta(est_id, titulo, "", "Restaurante", 50.0, 25.0, 10, "12:00", "13:00")
+            self.db.criar_pedido(cons_id, oferta_id)
+
+        for listar in (lambda formato: self.db.listar_ofertas_ativas(formato),
+                       lambda formato: self.db.listar_pedidos_consumidor(cons_id, formato=formato),
+                       lambda formato: self.db.listar_pedidos_estabelecimento(est_id, formato=formato)):
+            dicts = listar('dict')
+            self.assertEqual([r._asdict() for r in listar('tupla')], dicts)
+            colunas = listar('colunas')
+            self.assertEqual(list(colunas), list(dicts[0]))
+            self.assertEqual(colunas['id'].dtype.kind, 'i')
+            self.assertEqual(colunas['id'].tolist(), [d['id'] for d in dicts])
+            df = listar('dataframe')
+            self.assertEqual(list(df.columns), list(dicts[0]))
+            self.assertEqual(df['valor' if 'valor' in df else 'preco_venda'].tolist(),
+                             [d.get('valor', d.get('preco_venda')) for d in dicts])
+
+        self.assertEqual(len(self.db.listar_ofertas_ativas('dataframe')), 2)
+        with self.assertRaises(ValueError):
+            self.db.listar_pedidos_consumidor(cons_id, formato='xml')
+
+    def test_pool_reutiliza_conexoes(self):
+        """Test that connections are reused and WAL mode is enabled"""
+        conn = self.db.get_connection()
+        modo = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        conn.close()
+        self.assertEqual(modo, 'wal')
+
+        antes = self.db.estatisticas_pool()
+        for _ in range(5):
+            self.db.get_estabelecimento_id(1)
+        depois = self.db.estatisticas_pool()
+
+        self.assertEqual(depois['hits'] - antes['hits'], 5)
+        self.assertEqual(depois['misses'], antes['misses'])
+
+    def test_escrita_retenta_com_banco_bloqueado(self):
+        """Test that writes retry with backoff while another writer holds the lock"""
+        self.db.close()
+        self.db = Database(self.test_db, busy_timeout_ms=20, max_tentativas_escrita=20)
+
+        bloqueador = sqlite3.connect(self.test_db, isolation_level=None, check_same_thread=False)
+        bloqueador.execute('BEGIN IMMEDIATE')
+
+        def liberar():
+            time.sleep(0.2)
+            bloqueador.execute('COMMIT')
+
+        t = threading.Thread(target=liberar)
+        t.start()
+        user_id = self.db.criar_usuario("Retry", "retry@email.com", "123", "consumidor")
+        t.join()
+        bloqueador.close()
+
+        self.assertIsNotNone(user_id)
+        self.assertGreater(self.db.estatisticas_pool()['lock_retries'], 0)
+
+    def _criar_estabelecimento(self, email="loja@email.com", nome="Loja", lat=-23.55, lon=-46.63):
+        """Helper: create an establishment user and profile"""
+        user_id = self.db.criar_usuario(nome, email, "123", "estabelecimento")
+        return self.db.criar_estabelecimento(user_id, nome, email, "Rua X", lat, lon)
+
+    def test_buscar_ofertas_paginado(self):
+        """Test SQL-side filtering, sorting and keyset pagination of offers"""
+        est_id = self._criar_estabelecimento()
+        for i in range(7):
+            categoria = "Padaria" if i % 2 == 0 else "Mercado"
+            self.db.criar_oferta(est_id, f"Oferta {i}", "", categoria,
+                                 40.0, 10.0 + i, 3, "18:00", "19:00")
+
+        # Percorrer todas as páginas por preço
+        vistos = []
+        cursor = None
+        while True:
+            pagina = self.db.buscar_ofertas(ordenacao='preco', cursor=cursor, limite=3)
+            vistos.extend(o['preco_venda'] for o in pagina['ofertas'])
+            cursor = pagina['proximo_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(vistos, sorted(vistos))
+        self.assertEqual(len(vistos), 7)
+
+        # Filtros de categoria e preço máximo, ordenado por desconto
+        pagina = self.db.buscar_ofertas(categoria="Padaria", preco_max=14.0, ordenacao='desconto')
+        precos = [o['preco_venda'] for o in pagina['ofertas']]
+        self.assertEqual(precos, [10.0, 12.0, 14.0])
+        self.assertIsNone(pagina['proximo_cursor'])
+
+    def test_listar_ofertas_proximas(self):
+        """Test radius search ordered by haversine distance"""
+        # ~0 km, ~1.1 km e ~11 km ao norte do ponto de referência
+        perto = self._criar_estabelecimento("perto@email.com", "Perto", -23.55, -46.63)
+        medio = self._criar_estabelecimento("medio@email.com", "Medio", -23.54, -46.63)
+        longe = self._criar_estabelecimento("longe@email.com", "Longe", -23.45, -46.63)
+        for est_id in (longe, medio, perto):
+            self.db.criar_oferta(est_id, "Caixa", "", "Padaria", 30.0, 10.0, 2, "18:00", "19:00")
+
+        ofertas = self.db.listar_ofertas_proximas(-23.55, -46.63, raio_km=2)
+        self.assertEqual([o['estabelecimento'] for o in ofertas], ["Perto", "Medio"])
+        self.assertAlmostEqual(ofertas[1]['distancia_km'], 1.11, places=1)
+
+        todas = self.db.listar_ofertas_proximas(-23.55, -46.63, raio_km=20, limite=2)
+        self.assertEqual(len(todas), 2)
+
+    def test_listar_ofertas_proximas_antimeridiano(self):
+        """Test that the bounding box wraps around ±180° longitude"""
+        leste = self._criar_estabelecimento("leste@email.com", "Leste", -17.0, 179.99)
+        oeste = self._criar_estabelecimento("oeste@email.com", "Oeste", -17.0, -179.99)
+        for est_id in (leste, oeste):
+            self.db.criar_oferta(est_id, "Caixa", "", "Padaria", 30.0, 10.0, 2, "18:00", "19:00")
+
+        for lon in (179.995, -179.995):
+            ofertas = self.db.listar_ofertas_proximas(-17.0, lon, raio_km=5)
+            self.assertEqual({o['estabelecimento'] for o in ofertas}, {"Leste", "Oeste"})
+            self.assertTrue(all(o['distancia_km'] < 2 for o in ofertas))
+
+    def test_pesquisar_ofertas_texto(self):
+        """Test accent-insensitive full-text search restricted to active offers"""
+        est_id = self._criar_estabelecimento(nome="Padaria Central")
+        self.db.criar_oferta(est_id, "Pão Francês", "Pães do dia", "Padaria", 20.0, 8.0, 3, "18:00", "19:00")
+        self.db.criar_oferta(est_id, "Pizza Surpresa", "Fatias de pão de queijo", "Pizzaria", 40.0, 15.0, 3, "18:00", "19:00")
+        self.db.criar_oferta(est_id, "Bolo", "Sobremesa", "Confeitaria", 30.0, 10.0, 1, "18:00", "19:00")
+
+        # Sem acento, e o título pesa mais que a descrição
+        resultado = self.db.pesquisar_ofertas("pao")
+        self.assertEqual([o['titulo'] for o in resultado], ["Pão Francês", "Pizza Surpresa"])
+
+        # Nome do estabelecimento também é indexado
+        self.assertEqual(len(self.db.pesquisar_ofertas("central")), 3)
+
+        # Ofertas esgotadas não aparecem
+        cons_id = self.db.criar_usuario("Cons", "cons@email.com", "123", "consumidor")
+        bolo = self.db.pesquisar_ofertas("bolo")[0]
+        self.db.criar_pedido(cons_id, bolo['id'], 1)
+        self.assertEqual(self.db.pesquisar_ofertas("bolo"), [])
+        self.assertEqual(self.db.pesquisar_ofertas("   "), [])
+
+    def _estoque(self, oferta_id):
+        """Helper: read current stock of an offer"""
+        conn = self.db.get_connection()
+        estoque = conn.execute('SELECT estoque_atual FROM ofertas WHERE id = ?', (oferta_id,)).fetchone()[0]
+        conn.close()
+        return estoque
+
+    def test_criar_pedidos_lote(self):
+        """Test atomic multi-offer checkout: all lines succeed or nothing is written"""
+        cons_id = self.db.criar_usuario("Cons", "cons@email.com", "123", "consumidor")
+        est_id = self._criar_estabelecimento()
+        a = self.db.criar_oferta(est_id, "A", "", "Padaria", 20.0, 5.0, 3, "18:00", "19:00")
+        b = self.db.criar_oferta(est_id, "B", "", "Padaria", 20.0, 7.0, 1, "18:00", "19:00")
+
+        resultado = self.db.criar_pedidos_lote(cons_id, [(a, 2), (b, 1)])
+        self.assertTrue(resultado['sucesso'])
+        self.assertEqual([i['pedido']['valor_total'] for i in resultado['itens']], [10.0, 7.0])
+        self.assertEqual((self._estoque(a), self._estoque(b)), (1, 0))
+        self.assertEqual(len(self.db.listar_pedidos_consumidor(cons_id)), 2)
+        # Mesma sequência de status do criar_pedido: reservado -> pago
+        self.assertEqual([(e['status_anterior'], e['status']) for e in self.db.listar_eventos_pedido(est_id)],
+                         [(None, 'reservado'), (None, 'reservado'), ('reservado', 'pago'), ('reservado', 'pago')])
+        conn = self.db.get_connection()
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM pagamentos WHERE status = 'aprovado'").fetchone()[0], 2)
+        conn.close()
+
+        # Segundo item sem estoque: nada é gravado
+        falha = self.db.criar_pedidos_lote(cons_id, [(a, 1), (b, 1)])
+        self.assertFalse(falha['sucesso'])
+        self.assertEqual([i['sucesso'] for i in falha['itens']], [True, False])
+        self.assertEqual(self._estoque(a), 1)
+        self.assertEqual(len(self.db.listar_pedidos_consumidor(cons_id)), 2)
+
+        # Mesma oferta repetida conta o estoque somado
+        repetida = self.db.criar_pedidos_lote(cons_id, [(a, 1), (a, 1)])
+        self.assertFalse(repetida['sucesso'])
+
+    def test_cache_ofertas_invalidado_por_escrita(self):
+        """Test that cached offer listings are served until a write bumps the data version"""
+        cons_id = self.db.criar_usuario("Cons", "cons@email.com", "123", "consumidor")
+        est_id = self._criar_estabelecimento()
+        oferta_id = self.db.criar_oferta(est_id, "Caixa", "", "Padaria", 20.0, 5.0, 1, "18:00", "19:00")
+
+        self.assertEqual(len(self.db.listar_ofertas_ativas()), 1)
+        self.db.listar_ofertas_ativas()[0]['estoque'] = 99   # alterar a cópia não afeta o cache
+        self.assertEqual(self.db.estatisticas_cache()['hits'], 1)
+        self.assertEqual(self.db.listar_ofertas_ativas()[0]['estoque'], 1)
+        self.db.buscar_ofertas()['ofertas'][0]['estoque'] = 99
+        self.assertEqual(self.db.buscar_ofertas()['ofertas'][0]['estoque'], 1)
+
+        versao = self.db.obter_versao_dados()
+        self.db.criar_pedido(cons_id, oferta_id, 1)
+        self.assertEqual(self.db.obter_versao_dados(), versao + 1)
+        self.assertEqual(self.db.listar_ofertas_ativas(), [])
+
+        # Escritas que não alteram nada não invalidam o cache
+        self.assertIsNone(self.db.criar_pedido(cons_id, oferta_id, 1))
+        self.assertEqual(self.db.obter_versao_dados(), versao + 1)
+
+    def test_cache_compartilha_versao_entre_processos(self):
+        """Test that a write from another Database instance invalidates this one's cache"""
+        est_id = self._criar_estabelecimento()
+        self.assertEqual(self.db.buscar_ofertas()['ofertas'], [])
+
+        outro = Database(self.test_db)
+        outro.criar_oferta(est_id, "Caixa", "", "Padaria", 20.0, 5.0, 1, "18:00", "19:00")
+        outro.close()
+
+        self.assertEqual(len(self.db.buscar_ofertas()['ofertas']), 1)
+
+    def _kpis_recalculados(self, est_id):
+        """Helper: recompute dashboard KPIs from raw tables"""
+        conn = self.db.get_connection()
+        total, receita = conn.execute('''
+            SELECT COUNT(*), COALESCE(SUM(CASE WHEN p.status = 'retirado' THEN p.valor_total END), 0)
+            FROM pedidos p JOIN ofertas o ON p.oferta_id = o.id
+            WHERE o.estabelecimento_id = ?
+        ''', (est_id,)).fetchone()
+        ativas = conn.execute(
+            "SELECT COUNT(*) FROM ofertas WHERE estabelecimento_id = ? AND status = 'ativa' AND estoque_atual > 0",
+            (est_id,)
+        ).fetchone()[0]
+        conn.close()
+        return total, receita, ativas
+
+    def test_kpis_estabelecimento_incrementais(self):
+        """Test that trigger-maintained KPIs match a full recomputation"""
+        cons_id = self.db.criar_usuario("Cons", "cons@email.com", "123", "consumidor")
+        est_id = self._criar_estabelecimento()
+        outro_id = self._criar_estabelecimento("outra@email.com", "Outra")
+        a = self.db.criar_oferta(est_id, "A", "", "Padaria", 20.0, 5.5, 2, "18:00", "19:00")
+        b = self.db.criar_oferta(est_id, "B", "", "Padaria", 20.0, 7.25, 1, "18:00", "19:00")
+        self.db.criar_oferta(outro_id, "C", "", "Padaria", 20.0, 3.0, 1, "18:00", "19:00")
+
+        p1 = self.db.criar_pedido(cons_id, a, 1)
+        p2 = self.db.criar_pedido(cons_id, b, 1)   # B esgota
+        p3 = self.db.criar_pedido(cons_id, a, 1)   # A esgota
+        self.db.validar_retirada(p1['codigo_retirada'], est_id)
+        self.db.validar_retirada(p2['codigo_retirada'], est_id)
+        self.db.cancelar_pedido(p3['id'])          # A volta a ter estoque
+
+        kpis = self.db.obter_kpis_estabelecimento(est_id)
+        total, receita, ativas = self._kpis_recalculados(est_id)
+        self.assertEqual(kpis['total_pedidos'], total)
+        self.assertAlmostEqual(kpis['receita'], receita)
+        self.assertEqual(kpis['ofertas_ativas'], ativas)
+        self.assertEqual((total, ativas), (3, 1))
+        self.assertAlmostEqual(receita, 12.75)
+
+        # Reconstrução do zero chega nos mesmos valores
+        self.assertEqual(self.db.reconstruir_kpis(), 2)
+        self.assertEqual(self.db.obter_kpis_estabelecimento(est_id), kpis)
+        self.assertEqual(self.db.obter_kpis_estabelecimento(outro_id)['ofertas_ativas'], 1)
+
+    def _ler_rollups(self):
+        conn = self.db.get_connection()
+        linhas = {
+            tabela: conn.execute(f'SELECT * FROM {tabela} ORDER BY 1, 2').fetchall()
+            for tabela in ('vendas_diarias_oferta', 'vendas_diarias_categoria',
+                           'vendas_diarias_estabelecimento', 'vendas_acumuladas_oferta')
+        }
+        conn.close()
+        return linhas
+
+    def test_rollups_incrementais_igual_reconstrucao(self):
+        """Test that high-water-mark rollup updates match a bulk rebuild"""
+        cons_id = self.db.criar_usuario("Cons", "cons@email.com", "123", "consumidor")
+        est_id = self._criar_estabelecimento()
+        a = self.db.criar_oferta(est_id, "A", "", "Padaria", 20.0, 5.5, 5, "18:00", "19:00")
+        b = self.db.criar_oferta(est_id, "B", "", "Mercado", 20.0, 7.0, 5, "18:00", "19:00")
+
+        p1 = self.db.criar_pedido(cons_id, a, 2)
+        p2 = self.db.criar_pedido(cons_id, b, 1)
+        self.db.criar_pedido(cons_id, b, 1)        # Fica só pago
+        self.db.validar_retirada(p1['codigo_retirada'], est_id)
+        self.db.validar_retirada(p2['codigo_retirada'], est_id)
+        versao = self.db.obter_versao_dados()
+        self.assertEqual(self.db.atualizar_rollups(), 2)
+        self.assertEqual(self.db.atualizar_rollups(), 0)
+        self.assertEqual(self.db.obter_versao_dados(), versao)   # drenar não invalida caches
+
+        p4 = self.db.criar_pedido(cons_id, a, 1)
+        self.db.validar_retirada(p4['codigo_retirada'], est_id)
+        # Estorno de uma retirada (fora da API) tira a venda e o ticket máximo
+        conn = self.db.get_connection()
+        conn.execute("UPDATE pedidos SET status = 'cancelado' WHERE id = ?", (p1['id'],))
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.db.atualizar_rollups(), 2)
+
+        incremental = self._ler_rollups()
+        self.assertEqual(incremental['vendas_acumuladas_oferta'][0][:3], (a, 1, 1))
+        self.assertEqual(incremental['vendas_acumuladas_oferta'][0][5:7], (5.5, 5.5))
+
+        self.db.reconstruir_rollups()
+        reconstruido = self._ler_rollups()
+        self.assertEqual(incremental['vendas_acumuladas_oferta'], reconstruido['vendas_acumuladas_oferta'])
+        for tabela in ('vendas_diarias_oferta', 'vendas_diarias_categoria', 'vendas_diarias_estabelecimento'):
+            # Reconstrução não gera as linhas que ficaram zeradas pelo estorno
+            self.assertEqual([l for l in incremental[tabela] if l[2]], reconstruido[tabela])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import os
+import sqlite3
+import threading
+from database import Database
+from senhas import HasherSenhas
+
+class TestEscritorAgrupado(unittest.TestCase):
+    def setUp(self):
+        """Set up a database with group commit and one offer"""
+        self.test_db = 'test_escritor.db'
+        self.db = Database(self.test_db, senhas=HasherSenhas(custo=1000), escrita_agrupada=True,
+                           espera_lote_ms=50)
+        self.cons_id = self.db.criar_usuario("Cons", "cons@email.com", "123", "consumidor")
+        user_id = self.db.criar_usuario("Loja", "loja@email.com", "123", "estabelecimento")
+        self.est_id = self.db.criar_estabelecimento(user_id, "Loja", "1", "Rua", -23.55, -46.63)
+        self.oferta_id = self.db.criar_oferta(self.est_id, "Pão", "", "Padaria", 20.0, 10.0, 15, "18:00", "19:00")
+
+    def tearDown(self):
+        """Clean up the temporary database"""
+        self.db.close()
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db + sufixo):
+                os.remove(self.test_db + sufixo)
+
+    def test_pedidos_concorrentes_em_lotes(self):
+        """Test concurrent orders are coalesced into few transactions without overselling"""
+        lotes_antes = self.db.escritor.estatisticas()['lotes']
+        versao = self.db.obter_versao_dados()
+        largada = threading.Barrier(20)
+        pedidos = []
+
+        def comprar():
+            largada.wait()
+            pedidos.append(self.db.criar_pedido(self.cons_id, self.oferta_id))
+
+        threads = [threading.Thread(target=comprar) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(sum(1 for p in pedidos if p), 15)
+        self.assertEqual(len({p['codigo_retirada'] for p in pedidos if p}), 15)
+        stats = self.db.escritor.estatisticas()
+        self.assertEqual(stats['falhas'], 0)
+        self.assertLess(stats['lotes'] - lotes_antes, 20)
+        self.assertGreater(self.db.obter_versao_dados(), versao)
+        self.assertEqual(self.db.obter_kpis_estabelecimento(self.est_id)['total_pedidos'], 15)
+
+    def test_falha_isolada_por_savepoint(self):
+        """Test that a failing operation is rolled back alone and only its caller sees the error"""
+        def inserir(nome):
+            return lambda cursor: cursor.execute(
+                "INSERT INTO usuarios (nome, email, senha, tipo) VALUES (?, ?, 'x', 'consumidor')",
+                (nome, f"{nome}@email.com")).lastrowid
+
+        def falhar(cursor):
+            inserir("parcial")(cursor)
+            cursor.execute("INSERT INTO usuarios (nome, email, senha, tipo) VALUES ('dup', 'cons@email.com', 'x', 'consumidor')")
+
+        lotes_antes = self.db.escritor.estatisticas()['lotes']
+        futuros = [self.db.escritor.submeter(inserir("a")), self.db.escritor.submeter(falhar),
+                   self.db.escritor.submeter(inserir("b"))]
+
+        self.assertIsInstance(futuros[0].result(), int)
+        with self.assertRaises(sqlite3.IntegrityError):
+            futuros[1].result()
+        self.assertIsInstance(futuros[2].result(), int)
+        self.assertEqual(self.db.escritor.estatisticas()['lotes'], lotes_antes + 1)
+
+        conn = self.db.get_connection()
+        nomes = {linha[0] for linha in conn.execute('SELECT nome FROM usuarios')}
+        conn.close()
+        self.assertTrue({'a', 'b'} <= nomes)
+        self.assertNotIn('parcial', nomes)
+
+    def test_cancelamento_nao_derruba_escritor(self):
+        """Test that cancelling a queued future skips it and later writes still complete"""
+        comecou, liberar = threading.Event(), threading.Event()
+
+        def segurar(cursor):
+            comecou.set()
+            liberar.wait(5)
+
+        ocupado = self.db.escritor.submeter(segurar, versionar=False)
+        self.assertTrue(comecou.wait(5))
+        cancelado = self.db.escritor.submeter(lambda cursor: self.fail("operação cancelada executou"))
+        self.assertTrue(cancelado.cancel())
+        liberar.set()
+        ocupado.result(5)
+
+        self.assertTrue(self.db.escritor._thread.is_alive())
+        self.assertTrue(self.db.cancelar_pedido(self.db.criar_pedido(self.cons_id, self.oferta_id)['id'])['sucesso'])
+
+    def test_falha_ao_conectar_falha_so_o_lote(self):
+        """Test that a connection error fails the batch's futures without killing the writer thread"""
+        conectar = self.db.escritor.conectar
+
+        def sem_conexao():
+            raise TimeoutError("pool esgotado")
+
+        self.db.escritor.conectar = sem_conexao
+        with self.assertRaises(TimeoutError):
+            self.db.escritor.submeter(lambda cursor: None).result(5)
+        self.db.escritor.conectar = conectar
+
+        self.assertTrue(self.db.escritor._thread.is_alive())
+        self.assertIsNotNone(self.db.criar_pedido(self.cons_id, self.oferta_id))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import os
+import threading
+from database import Database
+from expiracao import VarredorReservas
+from senhas import HasherSenhas
+
+class TestVarredorReservas(unittest.TestCase):
+    def setUp(self):
+        """Set up a store with one offer and a few orders"""
+        self.test_db = 'test_expiracao.db'
+        self.db = Database(self.test_db, senhas=HasherSenhas(custo=1000))
+        self.cons_id = self.db.criar_usuario("Cons", "cons@email.com", "123", "consumidor")
+        user_id = self.db.criar_usuario("Loja", "loja@email.com", "123", "estabelecimento")
+        self.est_id = est_id = self.db.criar_estabelecimento(user_id, "Loja", "1", "Rua", -23.55, -46.63)
+        self.oferta_id = self.db.criar_oferta(est_id, "Pão", "", "Padaria", 20.0, 10.0, 10, "18:00", "19:00")
+
+    def tearDown(self):
+        """Clean up the temporary database"""
+        self.db.close()
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db + sufixo):
+                os.remove(self.test_db + sufixo)
+
+    def _envelhecer(self, codigos, quando):
+        conn = self.db.get_connection()
+        conn.execute(f"UPDATE pedidos SET criado_em = datetime('now', ?) "
+                     f"WHERE codigo_retirada IN ({','.join('?' * len(codigos))})", (quando, *codigos))
+        conn.commit()
+        conn.close()
+
+    def _estoque(self):
+        conn = self.db.get_connection()
+        estoque = conn.execute('SELECT estoque_atual FROM ofertas WHERE id = ?', (self.oferta_id,)).fetchone()[0]
+        conn.close()
+        return estoque
+
+    def test_expira_em_lotes_e_devolve_estoque(self):
+        """Test that only expired open orders are cancelled, in chunks, with stock and refunds"""
+        pedidos = [self.db.criar_pedido(self.cons_id, self.oferta_id, 2) for _ in range(4)]
+        codigos = [p['codigo_retirada'] for p in pedidos]
+        self.db.validar_retirada(codigos[3], self.est_id)
+        self._envelhecer(codigos[:2] + codigos[3:], '-2 days')   # codigos[2] ainda no prazo
+        self.assertEqual(self._estoque(), 2)
+
+        resumo = self.db.expirar_reservas(tamanho_lote=1)
+        self.assertEqual(resumo['pedidos'], 2)
+        self.assertEqual(resumo['lotes'], 2)
+        self.assertEqual(resumo['unidades_devolvidas'], 4)
+        self.assertEqual(resumo['pagamentos_estornados'], 2)
+        self.assertEqual(resumo['ofertas'], [self.oferta_id])
+        self.assertEqual(self._estoque(), 6)
+
+        conn = self.db.get_connection()
+        status = dict(conn.execute('''
+            SELECT p.codigo_retirada, p.status || '/' || pag.status
+            FROM pedidos p JOIN pagamentos pag ON pag.pedido_id = p.id
+        '''))
+        conn.close()
+        self.assertEqual([status[c] for c in codigos],
+                         ['cancelado/estornado', 'cancelado/estornado', 'pago/aprovado', 'retirado/aprovado'])
+        self.assertEqual(self.db.expirar_reservas()['pedidos'], 0)
+
+    def test_thread_e_metricas(self):
+        """Test the background sweeper thread, its metrics and the stock-release callback"""
+        codigo = self.db.criar_pedido(self.cons_id, self.oferta_id)['codigo_retirada']
+        self._envelhecer([codigo], '-2 days')
+
+        liberadas = []
+        executou = threading.Event()
+        def ao_liberar(ofertas):
+            liberadas.extend(ofertas)
+            executou.set()
+
+        varredor = VarredorReservas(self.db, intervalo_s=60, ao_liberar=ao_liberar)
+        varredor.iniciar()
+        self.assertTrue(executou.wait(10))
+        varredor.parar(timeout=10)
+
+        stats = varredor.estatisticas()
+        self.assertEqual(stats['execucoes'], 1)
+        self.assertEqual(stats['pedidos'], 1)
+        self.assertEqual(stats['ultima_execucao']['unidades_devolvidas'], 1)
+        self.assertEqual(liberadas, [self.oferta_id])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import os
+import json
+from database import Database
+from perfilador import PerfiladorConsultas, normalizar_sql
+
+class TestPerfiladorConsultas(unittest.TestCase):
+    def setUp(self):
+        """Set up a database with the profiler enabled and a slow-query log file"""
+        self.test_db = 'test_perfilador.db'
+        self.log = 'test_consultas_lentas.log'
+        self.perfilador = PerfiladorConsultas(limite_lento_ms=0, arquivo_lento=self.log)
+        self.db = Database(self.test_db, perfilador=self.perfilador)
+        # Descarta o que foi registrado pelo init_database
+        self.perfilador.limpar()
+        os.remove(self.log)
+
+    def tearDown(self):
+        """Clean up the temporary database and log"""
+        self.db.close()
+        for arquivo in (self.test_db, self.test_db + '-wal', self.test_db + '-shm', self.log):
+            if os.path.exists(arquivo):
+                os.remove(arquivo)
+
+    def test_normalizar_sql(self):
+        """Test that literals and IN lists collapse to the same query shape"""
+        self.assertEqual(
+            normalizar_sql("SELECT *  FROM t\n WHERE id IN (?, ?, ?) AND nome = 'x' AND n > 10"),
+            normalizar_sql("SELECT * FROM t WHERE id IN (?,?) AND nome = 'outro' AND n > 3"),
+        )
+
+    def test_registra_metodo_plano_e_lentas(self):
+        """Test timing, calling method, query plan and slow log for Database calls"""
+        user_id = self.db.criar_usuario("Loja", "loja@email.com", "123", "estabelecimento")
+        est_id = self.db.criar_estabelecimento(user_id, "Loja", "1", "Rua", -23.55, -46.63)
+        self.db.criar_oferta(est_id, "Pão", "", "Padaria", 20.0, 10.0, 5, "18:00", "19:00")
+        self.db.listar_ofertas_ativas()
+        self.db.listar_ofertas_ativas()   # Segunda chamada vem do cache, sem SQL da listagem
+
+        relatorio = self.perfilador.relatorio(limite=None)
+        por_metodo = {}
+        for linha in relatorio:
+            for metodo in linha['metodos']:
+                por_metodo.setdefault(metodo, []).append(linha)
+
+        listagem = [l for l in por_metodo['listar_ofertas_ativas'] if 'FROM ofertas o' in l['forma']]
+        self.assertEqual(len(listagem), 1)
+        self.assertEqual(listagem[0]['chamadas'], 1)
+        self.assertAlmostEqual(listagem[0]['linhas_media'], 1)
+        self.assertTrue(any('idx_ofertas_ativas_recentes' in passo for passo in listagem[0]['plano']))
+        self.assertFalse(listagem[0]['scan_completo'])
+        self.assertIn('criar_oferta', por_metodo)
+
+        # Consulta sem índice é marcada como scan completo
+        conn = self.db.get_connection()
+        conn.execute("SELECT id FROM usuarios WHERE nome = ?", ("Loja",)).fetchall()
+        conn.close()
+        scan = [l for l in self.perfilador.relatorio(limite=None) if 'WHERE nome' in l['forma']]
+        self.assertTrue(scan[0]['scan_completo'])
+
+        # Limite 0: tudo vai para o log de consultas lentas
+        with open(self.log, encoding='utf-8') as arquivo:
+            registros = [json.loads(linha) for linha in arquivo]
+        self.assertEqual(len(registros), len(self.perfilador.consultas_lentas()))
+        self.assertIn('criar_usuario', {r['metodo'] for r in registros})
+
+    def test_escrita_agrupada_atribui_metodo(self):
+        """Test that writes applied on the group-commit thread are attributed to the calling method"""
+        self.db.close()
+        self.db = Database(self.test_db, perfilador=self.perfilador, escrita_agrupada=True)
+        self.perfilador.limpar()
+
+        self.db.criar_usuario("Cons", "cons@email.com", "123", "consumidor")
+
+        insercao = [l for l in self.perfilador.relatorio(limite=None) if l['forma'].startswith('INSERT INTO usuarios')]
+        self.assertEqual(set(insercao[0]['metodos']), {'criar_usuario'})
+
+if __name__ == '__main__':
+    unittest.main()
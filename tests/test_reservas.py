@@ -0,0 +1,107 @@
+import unittest
+import os
+import threading
+from database import Database
+from reservas import MotorReservas
+from senhas import HasherSenhas
+
+class TestMotorReservas(unittest.TestCase):
+    def setUp(self):
+        """Set up a temporary database with one hot offer"""
+        self.test_db = 'test_reservas.db'
+        # KDF barato: o teste cria 51 usuários
+        self.db = Database(self.test_db, senhas=HasherSenhas(custo=1000))
+        user_id = self.db.criar_usuario("Padaria", "padaria@email.com", "123", "estabelecimento")
+        est_id = self.db.criar_estabelecimento(user_id, "Padaria", "1", "Rua", -23.55, -46.63)
+        self.oferta_id = self.db.criar_oferta(est_id, "Pão", "", "Padaria", 20.0, 5.0, 10, "18:00", "19:00")
+        self.consumidores = [
+            self.db.criar_usuario(f"C{i}", f"c{i}@email.com", "123", "consumidor") for i in range(50)
+        ]
+        self.motor = MotorReservas(self.db)
+
+    def tearDown(self):
+        """Clean up the temporary database"""
+        self.db.close()
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db + sufixo):
+                os.remove(self.test_db + sufixo)
+
+    def _estoque_banco(self):
+        conn = self.db.get_connection()
+        estoque = conn.execute('SELECT estoque_atual FROM ofertas WHERE id = ?', (self.oferta_id,)).fetchone()[0]
+        conn.close()
+        return estoque
+
+    def test_concorrencia_sem_overselling(self):
+        """Test that 50 concurrent clicks on 10 boxes produce exactly 10 orders"""
+        barreira = threading.Barrier(len(self.consumidores))
+        pedidos = []
+
+        def clicar(consumidor_id):
+            barreira.wait()
+            pedido = self.motor.reservar(consumidor_id, self.oferta_id)
+            if pedido:
+                pedidos.append(pedido)
+
+        threads = [threading.Thread(target=clicar, args=(c,)) for c in self.consumidores]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(pedidos), 10)
+        self.assertEqual(self._estoque_banco(), 0)
+        self.assertEqual(self.motor.disponivel(self.oferta_id), 0)
+        stats = self.motor.estatisticas()
+        self.assertEqual(stats['persistidas'], 10)
+        self.assertEqual(stats['recusadas'], 40)
+
+    def test_esgotada_recusa_sem_tocar_banco(self):
+        """Test that sold-out requests are rejected from memory"""
+        self.assertIsNotNone(self.motor.reservar(self.consumidores[0], self.oferta_id, 10))
+
+        antes = self.db.estatisticas_pool()['hits']
+        self.assertIsNone(self.motor.reservar(self.consumidores[1], self.oferta_id))
+        self.assertEqual(self.db.estatisticas_pool()['hits'], antes)
+
+    def test_cancelamento_devolve_token(self):
+        """Test that cancelling through the engine reconciles the counter"""
+        pedido = self.motor.reservar(self.consumidores[0], self.oferta_id, 10)
+        self.assertEqual(self.motor.disponivel(self.oferta_id), 0)
+
+        resultado = self.motor.cancelar_pedido(pedido['id'])
+        self.assertTrue(resultado['sucesso'])
+        self.assertEqual(self.motor.disponivel(self.oferta_id), 10)
+        self.assertIsNotNone(self.motor.reservar(self.consumidores[1], self.oferta_id))
+
+    def test_sincronizar_durante_reservas_nao_deriva(self):
+        """Test that a resync between a reservation's commit and its token release does not count it twice"""
+        criar_pedido = self.db.criar_pedido
+
+        def criar_e_sincronizar(*args):
+            pedido = criar_pedido(*args)
+            self.motor.sincronizar([self.oferta_id])   # commit já feito, token ainda pendente
+            return pedido
+
+        self.db.criar_pedido = criar_e_sincronizar
+        self.assertIsNotNone(self.motor.reservar(self.consumidores[0], self.oferta_id))
+        self.db.criar_pedido = criar_pedido
+
+        self.assertEqual(self._estoque_banco(), 9)
+        self.assertEqual(self.motor.disponivel(self.oferta_id), 9)
+
+    def test_lote_passa_pelo_motor(self):
+        """Test that batch orders take tokens and sold-out batches are rejected from memory"""
+        resultado = self.motor.reservar_lote(self.consumidores[0], [(self.oferta_id, 3), (self.oferta_id, 4)])
+        self.assertTrue(resultado['sucesso'])
+        self.assertEqual(self.motor.disponivel(self.oferta_id), 3)
+        self.assertEqual(self._estoque_banco(), 3)
+
+        antes = self.db.estatisticas_pool()['hits']
+        resultado = self.motor.reservar_lote(self.consumidores[1], [(self.oferta_id, 4)])
+        self.assertFalse(resultado['sucesso'])
+        self.assertEqual(resultado['itens'][0]['mensagem'], 'Estoque insuficiente')
+        self.assertEqual(self.db.estatisticas_pool()['hits'], antes)
+
+if __name__ == '__main__':
+    unittest.main()